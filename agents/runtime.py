@@ -0,0 +1,249 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import threading
+import time
+import pandas as pd
+from ops.instrumentation import increment, observe
+
+# Defaults for the process-wide scheduler; override with AGENT_MEMORY_BUDGET_MB / AGENT_MAX_BATCH_SIZE /
+# AGENT_MAX_LATENCY_MS before the first agent runs
+DEFAULT_MEMORY_BUDGET_MB = 2048
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_LATENCY_MS = 20.0
+
+class Agent:
+    """A model-backed feature producer: run(df) -> feature frame.
+
+    Subclasses describe their model and how to score a list of inputs; the scheduler owns loading, batching
+    and residency. Agents whose model_key is equal share one resident model and are coalesced into the same
+    micro-batches, so they must load and predict the same way (e.g. two FinbertSentimentAgents on one
+    checkpoint, one per pipeline).
+    """
+
+    model_key: str = ''
+
+    def __init__(self, scheduler: Optional['ModelScheduler'] = None):
+        self._scheduler = scheduler
+
+    @property
+    def scheduler(self) -> 'ModelScheduler':
+        return self._scheduler or get_scheduler()
+
+    def load_model(self) -> Any:
+        """Loads the model (called by the scheduler, at most once while it stays resident)."""
+        raise NotImplementedError
+
+    def model_bytes(self, model: Any) -> int:
+        """Resident size used against the memory budget; torch modules (or tuples holding one) are measured."""
+        parts = model if isinstance(model, tuple) else (model,)
+        total = 0
+        for part in parts:
+            if hasattr(part, 'parameters'):
+                total += sum(p.numel() * p.element_size() for p in part.parameters())
+                total += sum(b.numel() * b.element_size() for b in part.buffers())
+        return total
+
+    def predict(self, model: Any, items: List[Any]) -> List[Any]:
+        """Scores one micro-batch; returns one output per item, in order."""
+        raise NotImplementedError
+
+    def inputs(self, df: pd.DataFrame) -> List[Any]:
+        """The items to score for df, one per output row."""
+        raise NotImplementedError
+
+    def to_frame(self, df: pd.DataFrame, outputs: List[Any]) -> pd.DataFrame:
+        """Assembles the feature frame from df and the per-item outputs."""
+        raise NotImplementedError
+
+    def run(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Scores df through the shared scheduler, blocking until its last micro-batch is done."""
+        items = self.inputs(df) if not df.empty else []
+        outputs = self.scheduler.submit(self, items).result() if items else []
+        return self.to_frame(df, outputs)
+
+class _Request:
+    __slots__ = ('agent', 'items', 'outputs', 'next_item', 'remaining', 'future', 'enqueued_at')
+
+    def __init__(self, agent: Agent, items: List[Any]):
+        self.agent = agent
+        self.items = items
+        self.outputs: List[Any] = [None] * len(items)
+        self.next_item = 0              # first item not yet taken into a batch
+        self.remaining = len(items)     # items without an output yet
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+class ModelCache:
+    """Resident models keyed by model_key, evicted least-recently-used first to stay under budget_bytes.
+
+    The model being loaded is always admitted, even alone over budget, so one oversized model still runs.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._models: 'OrderedDict[str, Tuple[Any, int]]' = OrderedDict()
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(nbytes for _, nbytes in self._models.values())
+
+    def keys(self) -> List[str]:
+        """Resident model keys, least recently used first."""
+        return list(self._models)
+
+    def get(self, agent: Agent) -> Any:
+        key = agent.model_key
+        if key in self._models:
+            self._models.move_to_end(key)
+            return self._models[key][0]
+
+        model = agent.load_model()
+        nbytes = agent.model_bytes(model)
+        increment("agents.model_loads")
+        while self._models and self.resident_bytes + nbytes > self.budget_bytes:
+            self._models.popitem(last=False)
+            increment("agents.model_evictions")
+        self._models[key] = (model, nbytes)
+        return model
+
+class ModelScheduler:
+    """Shared in-process inference scheduler.
+
+    Any thread may submit (agent, items); requests are queued per model_key and a single worker coalesces
+    them into micro-batches of up to max_batch_size items. A full batch runs at once; a partial one waits
+    until its oldest item has been queued for max_latency_ms, so lone requests still finish promptly. Each
+    batch is split evenly across the requests queued for that model, so a small daily request rides along
+    with a backfill instead of waiting behind it, and ready models take turns. Models are loaded on first use
+    and kept resident under memory_budget_bytes by ModelCache.
+    """
+
+    def __init__(self, memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_MB * 2**20,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, max_latency_ms: float = DEFAULT_MAX_LATENCY_MS):
+        self.max_batch_size = max_batch_size
+        self.max_latency_s = max_latency_ms / 1000.0
+        self.models = ModelCache(memory_budget_bytes)
+        self._queues: Dict[str, List[_Request]] = {}
+        self._served: Dict[str, float] = {}     # when each model last got a batch, for round-robin
+        self._cond = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(target=self._loop, name="agent-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, agent: Agent, items: List[Any]) -> Future:
+        """Queues items for agent's model; the future resolves to their outputs, in order."""
+        request = _Request(agent, list(items))
+        if not request.items:
+            request.future.set_result([])
+            return request.future
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("ModelScheduler is closed")
+            self._queues.setdefault(agent.model_key, []).append(request)
+            self._cond.notify()
+        return request.future
+
+    def close(self) -> None:
+        """Finishes the queued work, then stops the worker."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._worker.join()
+
+    def _pending(self, queue: List[_Request]) -> int:
+        return sum(len(request.items) - request.next_item for request in queue)
+
+    def _next_batch(self) -> Optional[Tuple[str, List[Tuple[_Request, int, int]]]]:
+        """Blocks until some model has a batch ready; returns (model_key, [(request, start, stop), ...])."""
+        with self._cond:
+            while True:
+                now = time.perf_counter()
+                ready, wait = [], None
+                for key, queue in self._queues.items():
+                    if not queue:
+                        continue
+                    deadline = min(request.enqueued_at for request in queue) + self.max_latency_s
+                    if self._closed or self._pending(queue) >= self.max_batch_size or deadline <= now:
+                        ready.append(key)
+                    else:
+                        wait = deadline - now if wait is None else min(wait, deadline - now)
+                if ready:
+                    key = min(ready, key=lambda k: self._served.get(k, 0.0))
+                    self._served[key] = now
+                    return key, self._take(self._queues[key])
+                if self._closed:
+                    return None
+                self._cond.wait(timeout=wait)
+
+    def _take(self, queue: List[_Request]) -> List[Tuple[_Request, int, int]]:
+        """Fills one batch from a model's queue, splitting it evenly across the queued requests."""
+        taken: Dict[int, Tuple[_Request, int, int]] = {}
+        size = 0
+        while size < self.max_batch_size:
+            active = [request for request in queue if request.next_item < len(request.items)]
+            if not active:
+                break
+            share = max(1, (self.max_batch_size - size) // len(active))
+            for request in active:
+                start = request.next_item
+                stop = min(len(request.items), start + share, start + self.max_batch_size - size)
+                if stop == start:
+                    break
+                request.next_item = stop
+                first = taken.get(id(request), (request, start, start))[1]
+                taken[id(request)] = (request, first, stop)
+                size += stop - start
+        queue[:] = [request for request in queue if request.next_item < len(request.items)]
+        return list(taken.values())
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            key, slices = batch
+            agent = slices[0][0].agent
+            items = [item for request, start, stop in slices for item in request.items[start:stop]]
+            now = time.perf_counter()
+            observe("agents.batch_size", len(items))
+            observe("agents.queue_ms", (now - min(request.enqueued_at for request, _, _ in slices)) * 1000.0)
+            try:
+                outputs = agent.predict(self.models.get(agent), items)
+                if len(outputs) != len(items):
+                    raise ValueError(f"{key}: predict returned {len(outputs)} outputs for {len(items)} items")
+            except Exception as exc:
+                for request, _, _ in slices:
+                    self._fail(request, exc)
+                continue
+
+            offset = 0
+            for request, start, stop in slices:
+                request.outputs[start:stop] = outputs[offset:offset + stop - start]
+                offset += stop - start
+                request.remaining -= stop - start
+                if request.remaining == 0 and not request.future.done():
+                    request.future.set_result(request.outputs)
+
+    def _fail(self, request: _Request, exc: Exception) -> None:
+        """Fails the whole request and drops its unscheduled items."""
+        with self._cond:
+            queue = self._queues.get(request.agent.model_key, [])
+            if request in queue:
+                queue.remove(request)
+        if not request.future.done():
+            request.future.set_exception(exc)
+
+_SCHEDULER: Optional[ModelScheduler] = None
+_SCHEDULER_LOCK = threading.Lock()
+
+def get_scheduler() -> ModelScheduler:
+    """The process-wide scheduler every agent uses unless given its own, created on first use."""
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = ModelScheduler(
+                memory_budget_bytes=int(float(os.environ.get('AGENT_MEMORY_BUDGET_MB', DEFAULT_MEMORY_BUDGET_MB)) * 2**20),
+                max_batch_size=int(os.environ.get('AGENT_MAX_BATCH_SIZE', DEFAULT_MAX_BATCH_SIZE)),
+                max_latency_ms=float(os.environ.get('AGENT_MAX_LATENCY_MS', DEFAULT_MAX_LATENCY_MS)))
+        return _SCHEDULER
@@ -1,57 +1,64 @@
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
 import pandas as pd
-from typing import List
+from typing import List, Optional
 import os
 import duckdb
+from ops.instrumentation import instrument, observe, increment
+from agents.runtime import Agent, ModelScheduler
 
-class FinbertSentimentAgent:
-    def __init__(self, model_name="ProsusAI/finbert"):
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
+class FinbertSentimentAgent(Agent):
+    """Headline sentiment (news_sent in [-1, 1], news_conf in [0, 1]) from a FinBERT-style 3-label classifier.
+
+    The tokenizer and model are loaded by the shared scheduler on first use and stay resident for every agent on
+    the same checkpoint, so backfill and daily runs in one process share the model and its micro-batches.
+    """
+
+    def __init__(self, model_name="ProsusAI/finbert", scheduler: Optional[ModelScheduler] = None):
+        super().__init__(scheduler)
+        self.model_name = model_name
+        self.model_key = f"finbert:{model_name}"
         self.sentiment_labels = ["negative", "neutral", "positive"]
 
-    def run_sentiment(self, df_news: pd.DataFrame) -> pd.DataFrame:
-        """Applies FinBERT sentiment analysis to news headlines and returns sentiment scores and confidence."""
-        if df_news.empty:
-            return pd.DataFrame(columns=['ts', 'symbol', 'news_sent', 'news_conf'])
+    def load_model(self):
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
+        model.eval()
+        return tokenizer, model
 
-        texts = df_news['title'].tolist() # Using title for sentiment as per Module-Data-Engineering.md
-        
-        # Tokenize and predict in batches to handle large dataframes efficiently
-        batch_size = 32
-        all_sentiment_scores = []
-        all_confidence_scores = []
+    def predict(self, model, items: List[str]) -> List[tuple]:
+        tokenizer, classifier = model
+        inputs = tokenizer(items, padding=True, truncation=True, return_tensors='pt')
+        with torch.no_grad():
+            outputs = classifier(**inputs)
+        observe("run_sentiment.batch_size", len(items))
 
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i+batch_size]
-            inputs = self.tokenizer(batch_texts, padding=True, truncation=True, return_tensors='pt')
-            
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-            
-            probabilities = torch.softmax(outputs.logits, dim=1)
-            
-            # Map probabilities to sentiment score [-1, 1] and confidence [0, 1]
-            # Assuming sentiment_labels are ordered: negative, neutral, positive
-            for probs in probabilities:
-                neg_score = probs[self.sentiment_labels.index("negative")]
-                neu_score = probs[self.sentiment_labels.index("neutral")]
-                pos_score = probs[self.sentiment_labels.index("positive")]
-                
-                sentiment_score = pos_score.item() - neg_score.item()
-                # Confidence can be thought of as the max probability or 1 - neutral_probability
-                confidence = (pos_score + neg_score).item() # Confidence in being non-neutral
-                
-                all_sentiment_scores.append(sentiment_score)
-                all_confidence_scores.append(confidence)
+        # Map probabilities to sentiment score [-1, 1] and confidence [0, 1]
+        # Assuming sentiment_labels are ordered: negative, neutral, positive
+        probabilities = torch.softmax(outputs.logits, dim=1)
+        neg_score = probabilities[:, self.sentiment_labels.index("negative")]
+        pos_score = probabilities[:, self.sentiment_labels.index("positive")]
+        # Confidence can be thought of as the max probability or 1 - neutral_probability
+        # Confidence in being non-neutral
+        return list(zip((pos_score - neg_score).tolist(), (pos_score + neg_score).tolist()))
 
-        df_sentiment = df_news.copy()
-        df_sentiment['news_sent'] = all_sentiment_scores
-        df_sentiment['news_conf'] = all_confidence_scores
+    def inputs(self, df_news: pd.DataFrame) -> List[str]:
+        return df_news['title'].astype(str).tolist() # Using title for sentiment as per Module-Data-Engineering.md
 
-        # Select and return required columns
-        return df_sentiment[['ts', 'symbol', 'news_sent', 'news_conf']]
+    def to_frame(self, df_news: pd.DataFrame, outputs: List[tuple]) -> pd.DataFrame:
+        if df_news.empty:
+            return pd.DataFrame(columns=['ts', 'symbol', 'news_sent', 'news_conf'])
+        df_sentiment = df_news[['ts', 'symbol']].copy()
+        df_sentiment['news_sent'] = [sent for sent, _ in outputs]
+        df_sentiment['news_conf'] = [conf for _, conf in outputs]
+        return df_sentiment
+
+    @instrument("run_sentiment")
+    def run_sentiment(self, df_news: pd.DataFrame) -> pd.DataFrame:
+        """Applies FinBERT sentiment analysis to news headlines and returns sentiment scores and confidence."""
+        df_sentiment = self.run(df_news)
+        increment("run_sentiment.rows", len(df_sentiment))
+        return df_sentiment
 
 if __name__ == "__main__":
     # Example Usage:
@@ -0,0 +1,51 @@
+"""Benchmark suite over a deterministic synthetic lake.
+
+Run (from the repo root):
+    pytest benchmarks --benchmark-autosave --benchmark-storage=benchmarks/results
+Scale with BENCH_SYMBOLS / BENCH_YEARS (e.g. 5000 / 20) and compare two saved runs offline with:
+    pytest-benchmark --storage benchmarks/results compare 0001 0002 --group-by=name
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pandas as pd
+
+from benchmarks.synthetic_data import build_tiny_sentiment_model, generate_synthetic_lake, write_synthetic_intraday
+
+BENCH_SCALE = {
+    'symbols': int(os.environ.get('BENCH_SYMBOLS', 200)),
+    'years': float(os.environ.get('BENCH_YEARS', 2)),
+    'articles_per_symbol_day': float(os.environ.get('BENCH_NEWS_RATE', 0.1)),
+    'backtest_symbols': int(os.environ.get('BENCH_BACKTEST_SYMBOLS', 5)),
+    'sentiment_headlines': int(os.environ.get('BENCH_SENTIMENT_HEADLINES', 2000)),
+    'intraday_days': int(os.environ.get('BENCH_INTRADAY_DAYS', 5)),
+}
+
+@pytest.fixture(scope="session")
+def synthetic_lake(tmp_path_factory):
+    """Generates the lake once per session and runs every benchmark from its workspace (modules use relative data/ paths)."""
+    workspace = tmp_path_factory.mktemp("bench_workspace")
+    original_cwd = os.getcwd()
+    os.chdir(workspace)
+    counts = generate_synthetic_lake('data', n_symbols=BENCH_SCALE['symbols'], n_years=BENCH_SCALE['years'],
+                                     articles_per_symbol_day=BENCH_SCALE['articles_per_symbol_day'])
+    yield {'workspace': str(workspace), 'counts': counts, **BENCH_SCALE}
+    os.chdir(original_cwd)
+
+@pytest.fixture(scope="session")
+def synthetic_intraday(synthetic_lake):
+    """Minute bars for the last BENCH_INTRADAY_DAYS sessions of the synthetic lake (390 bars per symbol-day)."""
+    sessions = pd.to_datetime(sorted(os.listdir('data/lake/ohlcv')))[-BENCH_SCALE['intraday_days']:]
+    rows = write_synthetic_intraday('data', BENCH_SCALE['symbols'], sessions)
+    return {'rows': rows, 'sessions': sessions}
+
+@pytest.fixture(scope="session")
+def tiny_sentiment_model(tmp_path_factory):
+    return build_tiny_sentiment_model(str(tmp_path_factory.mktemp("tiny_finbert")))
+
+def pytest_benchmark_update_json(config, benchmarks, output_json):
+    # Saved results carry the data scale, so runs at different scales are not compared by accident
+    output_json['scale'] = BENCH_SCALE
@@ -0,0 +1,264 @@
+import os
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Words the synthetic headline templates draw from, so sentiment models see a mix of tones
+POSITIVE_WORDS = ["beats", "surges", "upgrade", "record", "strong", "raises guidance"]
+NEGATIVE_WORDS = ["misses", "plunges", "downgrade", "probe", "weak", "cuts guidance"]
+NEUTRAL_WORDS = ["announces", "schedules", "files", "reports", "hosts", "updates"]
+SOURCES = ["Reuters", "Bloomberg", "AP", "WSJ", "CNBC", "MarketWatch"]
+
+def synthetic_symbols(n_symbols: int) -> list:
+    return [f"S{i:05d}" for i in range(n_symbols)]
+
+def make_synthetic_universe(n_symbols: int, n_days: int, seed: int = 0) -> tuple:
+    """In-memory random-walk OHLCV tables (load_ohlcv_arrow's layout) plus a random alpha panel for n_symbols.
+
+    Returns (tables, signals) in the shapes build_portfolio_cerebro takes, without touching the lake.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2020-01-01', periods=n_days)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, size=(n_days, n_symbols)), axis=0))
+    symbols = [f'SYM{i:04d}' for i in range(n_symbols)]
+
+    tables = {}
+    for j, symbol in enumerate(symbols):
+        close = closes[:, j]
+        tables[symbol] = pa.table({
+            'date': pa.array(dates.values.astype('datetime64[D]'), pa.date32()),
+            'open': close * (1 + rng.normal(0, 0.002, n_days)),
+            'high': close * 1.01,
+            'low': close * 0.99,
+            'close': close,
+            'volume': rng.integers(100_000, 1_000_000, n_days),
+        })
+
+    alpha = rng.normal(0, 0.6, size=(n_days, n_symbols))
+    signals = pd.DataFrame({
+        'date': np.repeat(dates, n_symbols),
+        'symbol': np.tile(symbols, n_days),
+        'alpha': alpha.ravel(),
+    })
+    return tables, signals
+
+def write_synthetic_ohlcv(data_dir: str, n_symbols: int, dates: pd.DatetimeIndex, seed: int = 0,
+                          per_symbol_files: bool = False, block_days: int = 252) -> int:
+    """Writes geometric-random-walk OHLCV under {data_dir}/lake/ohlcv/{date}/.
+
+    The default writes one cross-section file per date, which keeps the {date}/ partitioning that
+    parquet_scan('data/lake/ohlcv/**/*.parquet') reads while staying tractable at 5k symbols x 20 years.
+    per_symbol_files=True reproduces ingest_market's exact {date}/{symbol}.parquet layout for small scales.
+    Prices are generated a block of days at a time so memory stays bounded. Returns rows written.
+    """
+    rng = np.random.default_rng(seed)
+    symbols = np.array(synthetic_symbols(n_symbols))
+    last_close = rng.uniform(20, 500, n_symbols)
+    rows = 0
+
+    for block_start in range(0, len(dates), block_days):
+        block = dates[block_start:block_start + block_days]
+        log_returns = rng.normal(0.0003, 0.02, size=(len(block), n_symbols))
+        closes = last_close * np.exp(np.cumsum(log_returns, axis=0))
+        opens = np.vstack([last_close, closes[:-1]]) * np.exp(rng.normal(0, 0.005, size=closes.shape))
+        highs = np.maximum(opens, closes) * (1 + np.abs(rng.normal(0, 0.01, size=closes.shape)))
+        lows = np.minimum(opens, closes) * (1 - np.abs(rng.normal(0, 0.01, size=closes.shape)))
+        volumes = rng.integers(100_000, 10_000_000, size=closes.shape)
+        last_close = closes[-1]
+
+        for i, day in enumerate(block):
+            date_str = day.strftime('%Y-%m-%d')
+            date_path = os.path.join(data_dir, 'lake', 'ohlcv', date_str)
+            os.makedirs(date_path, exist_ok=True)
+            df = pd.DataFrame({
+                'date': date_str, 'symbol': symbols,
+                'open': opens[i], 'high': highs[i], 'low': lows[i], 'close': closes[i], 'volume': volumes[i],
+            })
+            if per_symbol_files:
+                for j, symbol in enumerate(symbols):
+                    df.iloc[j:j + 1].to_parquet(os.path.join(date_path, f'{symbol}.parquet'), index=False)
+            else:
+                df.to_parquet(os.path.join(date_path, 'part-0.parquet'), index=False)
+            rows += len(df)
+    return rows
+
+def write_synthetic_news(data_dir: str, n_symbols: int, dates: pd.DatetimeIndex, articles_per_symbol_day: float = 0.1,
+                         seed: int = 1) -> int:
+    """Writes {data_dir}/lake/news_raw/news_raw.parquet in ingest_news' schema, with a few exact duplicates
+    so normalize_text's dedup has work to do. Timestamps are spread over the full UTC day, so some land after the close.
+    """
+    rng = np.random.default_rng(seed)
+    symbols = np.array(synthetic_symbols(n_symbols))
+    n_articles = rng.poisson(articles_per_symbol_day * n_symbols * len(dates))
+
+    day = rng.integers(0, len(dates), n_articles)
+    ts = dates.values[day] + rng.integers(0, 86_400, n_articles).astype('timedelta64[s]')
+    symbol = symbols[rng.integers(0, n_symbols, n_articles)]
+    tone = rng.integers(0, 3, n_articles)
+    words = np.where(tone == 0, rng.choice(NEGATIVE_WORDS, n_articles),
+                     np.where(tone == 1, rng.choice(NEUTRAL_WORDS, n_articles), rng.choice(POSITIVE_WORDS, n_articles)))
+    title = pd.Series(symbol).str.cat(pd.Series(words), sep=' ') + ' in quarterly update'
+    url = 'https://news.example.com/' + pd.Series(np.arange(n_articles)).astype(str)
+
+    df = pd.DataFrame({
+        'ts': pd.to_datetime(ts).tz_localize('UTC').map(pd.Timestamp.isoformat),
+        'symbol': symbol,
+        'source': rng.choice(SOURCES, n_articles),
+        'title': title,
+        'description': title + '. See https://example.com for details.',
+        'url': url,
+        'content': title + ' - ' + pd.Series(rng.choice(NEUTRAL_WORDS, n_articles)) + ' more at www.example.com',
+    })
+    # ~1% syndicated duplicates (same ts/source/title)
+    df = pd.concat([df, df.sample(frac=0.01, random_state=seed)], ignore_index=True)
+
+    output_path = os.path.join(data_dir, 'lake', 'news_raw')
+    os.makedirs(output_path, exist_ok=True)
+    df.to_parquet(os.path.join(output_path, 'news_raw.parquet'), index=False)
+    return len(df)
+
+def write_synthetic_news_sentiment(data_dir: str, seed: int = 4) -> int:
+    """Scores {data_dir}/lake/news_raw with random sentiment/confidence and writes it in the news_sentiment layout.
+
+    Stands in for a FinBERT pass over the whole history, which is benchmarked separately on a sample.
+    """
+    from features.news_sentiment import write_news_sentiment
+
+    rng = np.random.default_rng(seed)
+    df = pd.read_parquet(os.path.join(data_dir, 'lake', 'news_raw', 'news_raw.parquet'), columns=['ts', 'symbol'])
+    df['news_sent'] = rng.uniform(-1, 1, len(df))
+    df['news_conf'] = rng.uniform(0, 1, len(df))
+    return write_news_sentiment(df, output_path=os.path.join(data_dir, 'lake', 'news_sentiment'))
+
+def write_synthetic_fundamentals(data_dir: str, n_symbols: int, dates: pd.DatetimeIndex, seed: int = 2) -> int:
+    """Writes quarterly statements in the point-in-time fundamentals schema to {data_dir}/lake/fundamentals/fundamentals.parquet.
+
+    Filings are accepted 20-44 days after the period end at a random time of day, with ~5% later restatements.
+    """
+    from ingestion.ingest_fundamentals import normalize_statements
+
+    rng = np.random.default_rng(seed)
+    # Quarter ends via periods: the 'QE' offset alias needs pandas >= 2.2 and 'Q' is gone in 3.0
+    quarters = pd.period_range(dates[0], dates[-1], freq='Q').to_timestamp(how='end').normalize()
+    quarters = quarters[quarters <= dates[-1]]
+    symbols = synthetic_symbols(n_symbols)
+    n = len(quarters) * n_symbols
+
+    revenue = rng.lognormal(20, 1.5, n)
+    period_end = pd.DatetimeIndex(np.tile(quarters.values, n_symbols))
+    accepted = period_end + pd.to_timedelta(rng.integers(20, 45, n), unit='D') + pd.to_timedelta(rng.integers(0, 86_400, n), unit='s')
+    df = pd.DataFrame({
+        'symbol': np.repeat(symbols, len(quarters)),
+        'date': period_end.strftime('%Y-%m-%d'),
+        'fillingDate': accepted.strftime('%Y-%m-%d'),
+        'acceptedDate': accepted.strftime('%Y-%m-%d %H:%M:%S'),
+        'revenue': revenue,
+        'netIncome': revenue * rng.normal(0.1, 0.08, n),
+        'eps': rng.normal(1.5, 1.0, n),
+        'totalAssets': revenue * rng.uniform(1, 5, n),
+        'totalLiabilities': revenue * rng.uniform(0.5, 3, n),
+        'cashFlowFromOperatingActivities': revenue * rng.normal(0.15, 0.05, n),
+    })
+    restated = df.sample(frac=0.05, random_state=seed).copy()
+    restated['acceptedDate'] = (pd.to_datetime(restated['acceptedDate']) + pd.Timedelta(days=90)).dt.strftime('%Y-%m-%d %H:%M:%S')
+    restated['eps'] *= 0.9
+
+    # Original filings and restatements arrive in separate pulls, as they would from FMP over time
+    df_pit = pd.concat([normalize_statements(*[pull.to_dict(orient='records')] * 3) for pull in (df, restated)], ignore_index=True)
+    df_pit = df_pit.sort_values(by=['symbol', 'date', 'available_at']).reset_index(drop=True)
+
+    output_path = os.path.join(data_dir, 'lake', 'fundamentals')
+    os.makedirs(output_path, exist_ok=True)
+    df_pit.to_parquet(os.path.join(output_path, 'fundamentals.parquet'), index=False)
+    return len(df_pit)
+
+def write_synthetic_intraday(data_dir: str, n_symbols: int, sessions: pd.DatetimeIndex, seed: int = 5) -> int:
+    """Writes 390 regular-session minute bars per symbol and session in the bucketed ohlcv_1m layout."""
+    from ingestion.ingest_intraday import write_intraday_bars
+
+    rng = np.random.default_rng(seed)
+    symbols = np.array(synthetic_symbols(n_symbols))
+    last_close = rng.uniform(20, 500, n_symbols)
+    rows = 0
+    for session in sessions:
+        minutes = pd.date_range(f"{session.strftime('%Y-%m-%d')} 09:30", periods=390, freq='min',
+                                tz='America/New_York').tz_convert('UTC')
+        closes = last_close * np.exp(np.cumsum(rng.normal(0, 0.001, size=(len(minutes), n_symbols)), axis=0))
+        opens = np.vstack([last_close, closes[:-1]])
+        last_close = closes[-1]
+        df = pd.DataFrame({
+            'ts': np.tile(minutes.values, n_symbols), 'symbol': np.repeat(symbols, len(minutes)),
+            'open': opens.T.ravel(), 'high': np.maximum(opens, closes).T.ravel() * 1.0005,
+            'low': np.minimum(opens, closes).T.ravel() * 0.9995, 'close': closes.T.ravel(),
+            'volume': rng.integers(100, 10_000, len(minutes) * n_symbols),
+        })
+        df['ts'] = pd.to_datetime(df['ts'], utc=True)
+        rows += write_intraday_bars(df, output_dir=os.path.join(data_dir, 'lake', 'ohlcv_1m'))
+    return rows
+
+def write_synthetic_features(data_dir: str, n_symbols: int, dates: pd.DatetimeIndex, seed: int = 3) -> int:
+    """Writes features_daily with r20/rsi14 and sentiment columns, the input aggregate_signals expects."""
+    rng = np.random.default_rng(seed)
+    n = len(dates) * n_symbols
+    df = pd.DataFrame({
+        'date': np.repeat(dates.values, n_symbols),
+        'symbol': np.tile(synthetic_symbols(n_symbols), len(dates)),
+        'r20': rng.normal(0, 0.3, n),
+        'rsi14': rng.uniform(0, 100, n),
+        'news_sent': np.where(rng.random(n) < 0.3, rng.uniform(-1, 1, n), np.nan),
+        'news_conf': rng.uniform(0, 1, n),
+    })
+    output_path = os.path.join(data_dir, 'lake', 'features', 'daily')
+    os.makedirs(output_path, exist_ok=True)
+    df.to_parquet(os.path.join(output_path, 'features_daily.parquet'), index=False)
+    return len(df)
+
+def register_synthetic_views(data_dir: str) -> None:
+    """Registers the same DuckDB views ingestion would, in {data_dir}/trading.duckdb."""
+    conn = duckdb.connect(database=os.path.join(data_dir, 'trading.duckdb'), read_only=False)
+    conn.execute(f"CREATE OR REPLACE VIEW ohlcv_daily AS SELECT * FROM parquet_scan('{data_dir}/lake/ohlcv/**/*.parquet');")
+    conn.execute(f"CREATE OR REPLACE VIEW fundamentals AS SELECT * FROM parquet_scan('{data_dir}/lake/fundamentals/*.parquet');")
+    conn.close()
+
+def generate_synthetic_lake(data_dir: str = 'data', n_symbols: int = 500, n_years: float = 2.0,
+                            start_date: str = '2004-01-01', articles_per_symbol_day: float = 0.1,
+                            seed: int = 0, per_symbol_files: bool = False) -> dict:
+    """Deterministically writes OHLCV, news_raw, news_sentiment and fundamentals in the lake layout and registers DuckDB views.
+
+    Scale is n_symbols x n_years of business days (e.g. 5000 x 20 for a full-universe run).
+    Returns row counts per dataset.
+    """
+    dates = pd.bdate_range(start_date, periods=int(round(252 * n_years)))
+    counts = {
+        'ohlcv': write_synthetic_ohlcv(data_dir, n_symbols, dates, seed=seed, per_symbol_files=per_symbol_files),
+        'news_raw': write_synthetic_news(data_dir, n_symbols, dates, articles_per_symbol_day, seed=seed + 1),
+        'fundamentals': write_synthetic_fundamentals(data_dir, n_symbols, dates, seed=seed + 2),
+    }
+    counts['news_sentiment'] = write_synthetic_news_sentiment(data_dir, seed=seed + 4)
+    register_synthetic_views(data_dir)
+    print(f"Synthetic lake in {data_dir}: {counts}")
+    return counts
+
+def build_tiny_sentiment_model(path: str, seed: int = 0) -> str:
+    """Saves a randomly initialized 2-layer BERT classifier (3 labels) plus a word-level tokenizer to path.
+
+    It loads through AutoTokenizer/AutoModelForSequenceClassification like ProsusAI/finbert, so
+    FinbertSentimentAgent(model_name=path) can be benchmarked offline. Scores are meaningless.
+    """
+    import torch
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+    os.makedirs(path, exist_ok=True)
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + sorted(
+        {w for phrase in POSITIVE_WORDS + NEGATIVE_WORDS + NEUTRAL_WORDS for w in phrase.split()}
+        | {"in", "quarterly", "update", "stock", "shares"})
+    with open(os.path.join(path, 'vocab.txt'), 'w') as f:
+        f.write("\n".join(vocab))
+    BertTokenizerFast(vocab_file=os.path.join(path, 'vocab.txt')).save_pretrained(path)
+
+    torch.manual_seed(seed)
+    config = BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                        intermediate_size=64, max_position_embeddings=128, num_labels=3)
+    BertForSequenceClassification(config).save_pretrained(path)
+    return path
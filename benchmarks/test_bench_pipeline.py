@@ -0,0 +1,372 @@
+import asyncio
+import glob
+import os
+import sys
+import threading
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.synthetic_data import make_synthetic_universe, synthetic_symbols, write_synthetic_features
+from ingestion.normalize_text import normalize_text
+from features.daily import calculate_daily_features
+from features.fundamentals_pit import load_features_with_fundamentals
+from features.news_sentiment import calculate_news_features
+from decision.aggregator_v0 import aggregate_signals, compute_alpha
+from decision.meta_labeling import train_meta_model
+from ingestion.ingest_intraday import load_intraday_bars, resample_intraday_to_daily
+from ingestion.price_panel import build_price_panel, open_price_panel
+from ingestion.writers import write_parquet, write_partitions
+from exec.backtester import build_portfolio_cerebro, run_backtest, run_portfolio_backtest
+from exec.feeds import ArrayFeed, load_ohlcv_arrow
+from exec.alpaca_client import AlpacaClient
+from exec.live_trading import LiveTradingService, ReplaySource
+from eval.metrics import calculate_metrics
+from ops.data_quality import validate_new_partitions
+from rl.portfolio_env import BatchedPortfolioEnv, PortfolioData, PortfolioEnv
+
+def _backtest_window(lake):
+    conn = duckdb.connect(database='./data/trading.duckdb', read_only=True)
+    start, end = conn.execute("SELECT min(date), max(date) FROM ohlcv_daily").fetchone()
+    conn.close()
+    # Last ~year of the synthetic range
+    return str((pd.Timestamp(end) - pd.Timedelta(days=365)).date()), str(end)
+
+def test_bench_normalize_text(benchmark, synthetic_lake):
+    benchmark.extra_info['rows'] = synthetic_lake['counts']['news_raw']
+    benchmark.pedantic(normalize_text, rounds=3, iterations=1)
+
+def test_bench_calculate_daily_features(benchmark, synthetic_lake):
+    benchmark.extra_info['rows'] = synthetic_lake['counts']['ohlcv']
+    benchmark.pedantic(calculate_daily_features, rounds=3, iterations=1)
+
+def test_bench_calculate_news_features(benchmark, synthetic_lake):
+    benchmark.extra_info['rows'] = synthetic_lake['counts']['news_sentiment']
+    benchmark.pedantic(calculate_news_features, rounds=3, iterations=1)
+
+def test_bench_aggregate_signals(benchmark, synthetic_lake):
+    dates = pd.to_datetime(sorted(os.listdir('data/lake/ohlcv')))
+    benchmark.extra_info['rows'] = write_synthetic_features('data', synthetic_lake['symbols'], dates)
+    benchmark.pedantic(aggregate_signals, rounds=3, iterations=1)
+
+def test_bench_train_meta_model(benchmark, synthetic_lake, tmp_path):
+    dates = pd.to_datetime(sorted(os.listdir('data/lake/ohlcv')))
+    benchmark.extra_info['rows'] = write_synthetic_features('data', synthetic_lake['symbols'], dates)
+    # A fresh model directory per round, so every round labels and fits instead of hitting the version cache
+    rounds = iter(range(1000))
+    benchmark.pedantic(lambda: train_meta_model(model_dir=str(tmp_path / f'm{next(rounds)}')), rounds=3, iterations=1)
+
+def test_bench_meta_score_universe_day(benchmark, synthetic_lake, tmp_path):
+    # The per-day cost in the daily and event-driven paths: one date's cross-section through a trained model
+    dates = pd.to_datetime(sorted(os.listdir('data/lake/ohlcv')))
+    write_synthetic_features('data', synthetic_lake['symbols'], dates)
+    model = train_meta_model(model_dir=str(tmp_path / 'model'))
+    df_day = pd.read_parquet('data/lake/features/daily/features_daily.parquet')
+    df_day = df_day[df_day['date'] == df_day['date'].max()].copy()
+    df_day['alpha'] = compute_alpha(df_day)
+    benchmark.extra_info['rows'] = len(df_day)
+    benchmark(model.score, df_day)
+
+def test_bench_load_features_with_fundamentals(benchmark, synthetic_lake):
+    dates = pd.to_datetime(sorted(os.listdir('data/lake/ohlcv')))
+    benchmark.extra_info['rows'] = write_synthetic_features('data', synthetic_lake['symbols'], dates)
+    benchmark.pedantic(load_features_with_fundamentals, rounds=3, iterations=1)
+
+def test_bench_run_sentiment(benchmark, synthetic_lake, tiny_sentiment_model):
+    from agents.sentiment.finbert_agent import FinbertSentimentAgent
+
+    agent = FinbertSentimentAgent(model_name=tiny_sentiment_model)
+    df_news = pd.read_parquet('data/lake/news_raw/news_raw.parquet').head(synthetic_lake['sentiment_headlines'])
+    benchmark.extra_info['rows'] = len(df_news)
+    benchmark.pedantic(agent.run_sentiment, args=(df_news,), rounds=3, iterations=1)
+
+def _backfill_and_daily(model_path, headlines, shared):
+    """A backfill over every headline and a daily job scoring small chunks, on two threads at once.
+
+    shared=True runs both pipelines' agents on one ModelScheduler (one resident model, coalesced batches);
+    otherwise each pipeline has its own scheduler, i.e. its own model copy and batching.
+    """
+    from agents.runtime import ModelScheduler
+    from agents.sentiment.finbert_agent import FinbertSentimentAgent
+
+    schedulers = [ModelScheduler()] if shared else [ModelScheduler(), ModelScheduler()]
+    backfill = FinbertSentimentAgent(model_path, scheduler=schedulers[0])
+    daily = FinbertSentimentAgent(model_path, scheduler=schedulers[-1])
+
+    def run_daily():
+        for start in range(0, len(headlines) // 4, 25):
+            daily.run(headlines.iloc[start:start + 25])
+
+    thread = threading.Thread(target=run_daily)
+    thread.start()
+    backfill.run(headlines)
+    thread.join()
+    for scheduler in schedulers:
+        scheduler.close()
+
+@pytest.mark.parametrize('shared', [False, True], ids=['separate', 'shared'])
+def test_bench_agents_backfill_and_daily(benchmark, synthetic_lake, tiny_sentiment_model, shared):
+    headlines = pd.read_parquet('data/lake/news_raw/news_raw.parquet').head(synthetic_lake['sentiment_headlines'])
+    benchmark.group = 'agents_backfill_and_daily'
+    benchmark.extra_info['rows'] = len(headlines) + len(headlines) // 4
+    benchmark.pedantic(_backfill_and_daily, args=(tiny_sentiment_model, headlines, shared), rounds=3, iterations=1)
+
+def test_bench_build_price_panel(benchmark, synthetic_lake):
+    benchmark.extra_info['rows'] = synthetic_lake['counts']['ohlcv']
+    benchmark.pedantic(build_price_panel, kwargs={'full': True}, rounds=1, iterations=1)
+
+def test_bench_scan_close_panel(benchmark, synthetic_lake):
+    # Baseline for test_bench_open_price_panel: the parquet_scan + pivot every consumer used to do
+    def scan_and_pivot():
+        conn = duckdb.connect(database='./data/trading.duckdb', read_only=True)
+        df = conn.execute("SELECT date, symbol, close FROM ohlcv_daily").fetchdf()
+        conn.close()
+        return df.pivot(index='date', columns='symbol', values='close')
+
+    benchmark.extra_info['rows'] = synthetic_lake['counts']['ohlcv']
+    benchmark.pedantic(scan_and_pivot, rounds=3, iterations=1)
+
+def test_bench_open_price_panel(benchmark, synthetic_lake):
+    build_price_panel()
+
+    def open_and_read_close():
+        panel = open_price_panel()
+        return float(np.nansum(panel['close'][-1]))
+
+    benchmark.extra_info['shape'] = open_price_panel().shape
+    benchmark(open_and_read_close)
+
+def test_bench_load_intraday_symbol(benchmark, synthetic_lake, synthetic_intraday):
+    # One symbol across every session: touches one bucket file per day and skips non-matching row groups
+    benchmark.extra_info['rows'] = synthetic_intraday['rows']
+    benchmark(load_intraday_bars, [synthetic_symbols(1)[0]])
+
+def test_bench_resample_intraday_to_daily(benchmark, synthetic_lake, synthetic_intraday):
+    benchmark.extra_info['rows'] = synthetic_intraday['rows']
+    benchmark.pedantic(resample_intraday_to_daily, kwargs={'output_dir': 'data/lake/ohlcv_resampled', 'register': False},
+                       rounds=3, iterations=1)
+
+class _PaperOrder:
+    def __init__(self, order_id):
+        self.id = order_id
+
+    def model_dump(self):
+        return {"id": self.id}
+
+class _PaperBroker:
+    """Acknowledges every order immediately, so the live benchmark measures the service, not the network."""
+
+    def __init__(self):
+        self.orders = 0
+
+    def get_account(self):
+        return {"cash": "1000000", "equity": "1000000"}
+
+    def get_all_positions(self):
+        return []
+
+    def submit_order(self, request):
+        self.orders += 1
+        return _PaperOrder(str(self.orders))
+
+def test_bench_live_replay_session(benchmark, synthetic_lake, synthetic_intraday, monkeypatch):
+    # One session of minute bars for the whole universe through features, scoring, sizing and order dispatch
+    monkeypatch.setenv("ALPACA_API_KEY", "bench")
+    monkeypatch.setenv("ALPACA_SECRET_KEY", "bench")
+    symbols = synthetic_symbols(synthetic_lake['symbols'])
+    session = synthetic_intraday['sessions'][-1]
+    df_bars = load_intraday_bars(symbols, str(session.date()), str((session + pd.Timedelta(days=1)).date()),
+                                 columns=['ts', 'symbol', 'close'])
+
+    def replay():
+        service = LiveTradingService(AlpacaClient(state_ttl=3600.0, trading_client=_PaperBroker()), symbols,
+                                     sentiment_fn=lambda titles: (np.zeros(len(titles)), np.ones(len(titles))),
+                                     min_alpha_buy=0.0)
+        service.warm_start(as_of=str(session.date()))
+        asyncio.run(service.run(ReplaySource(df_bars)))
+        return service
+
+    benchmark.extra_info['events'] = len(df_bars)
+    service = benchmark.pedantic(replay, rounds=1, iterations=1)
+    benchmark.extra_info['orders'] = len(service.orders)
+    benchmark.extra_info['signal_to_order_ms'] = service.latency_summary()
+
+def test_bench_validate_ohlcv(benchmark, synthetic_lake, tmp_path):
+    # Every date partition is new to a fresh quality table: the cost of a full backfill validation
+    rounds = iter(range(1000))
+    benchmark.extra_info['rows'] = synthetic_lake['counts']['ohlcv']
+    benchmark.pedantic(lambda: validate_new_partitions(['ohlcv_daily'], quality_dir=str(tmp_path / f'q{next(rounds)}')),
+                       rounds=3, iterations=1)
+
+def _lake_layout(layout):
+    """Paths of the OHLCV lake rewritten in one layout.
+
+    'default' is one file as writers used to write it: ingestion (date-major) order, VARCHAR dates, snappy and
+    pyarrow's row groups. 'sorted' is one file through ingestion.writers. 'partitioned' is the lake's own
+    {date}/ layout through write_partitions, where every file's date statistics cover a single session.
+    """
+    root = os.path.join('data', 'bench_layouts', layout)
+    if not os.path.exists(root):
+        conn = duckdb.connect()
+        df = conn.execute("SELECT * FROM read_parquet('data/lake/ohlcv/*/*.parquet') ORDER BY date, symbol").fetchdf()
+        conn.close()
+        if layout == 'default':
+            os.makedirs(root)
+            df['date'] = df['date'].astype(str).str[:10]
+            df.to_parquet(os.path.join(root, 'ohlcv.parquet'), index=False)
+        elif layout == 'sorted':
+            write_parquet(df, os.path.join(root, 'ohlcv.parquet'), 'ohlcv')
+        else:
+            write_partitions(df, root, 'ohlcv', filename='part-0.parquet', append=False)
+    return sorted(glob.glob(os.path.join(root, '**', '*.parquet'), recursive=True))
+
+def _row_groups_matching(paths, column, low, high):
+    """(row groups whose min/max statistics overlap [low, high], total row groups): the first are the ones a
+    reader cannot skip."""
+    matching = total = 0
+    for path in paths:
+        metadata = pq.ParquetFile(path).metadata
+        index = metadata.schema.names.index(column)
+        for i in range(metadata.num_row_groups):
+            stats = metadata.row_group(i).column(index).statistics
+            total += 1
+            matching += not stats.has_min_max or (str(stats.min) <= high and str(stats.max) >= low)
+    return matching, total
+
+@pytest.mark.parametrize('filter_on,layout', [('symbol', 'default'), ('symbol', 'sorted'),
+                                              ('date', 'default'), ('date', 'partitioned')])
+def test_bench_scan_filtered(benchmark, synthetic_lake, filter_on, layout):
+    # Typical reads: one symbol's full history, or the whole universe over the last month of sessions
+    paths = _lake_layout(layout)
+    if filter_on == 'symbol':
+        low = high = synthetic_symbols(synthetic_lake['symbols'])[synthetic_lake['symbols'] // 2]
+    else:
+        sessions = sorted(os.listdir('data/lake/ohlcv'))
+        low, high = sessions[-21], sessions[-1]
+    query = f"SELECT date, symbol, close FROM read_parquet(?) WHERE {filter_on} BETWEEN ? AND ?"
+
+    def scan():
+        conn = duckdb.connect()
+        df = conn.execute(query, [paths, low, high]).fetchdf()
+        conn.close()
+        return df
+
+    benchmark.group = f'scan_filtered[{filter_on}]'
+    benchmark.extra_info['files'] = len(paths)
+    benchmark.extra_info['mb'] = sum(os.path.getsize(path) for path in paths) / 1e6
+    benchmark.extra_info['row_groups_read'], benchmark.extra_info['row_groups'] = _row_groups_matching(paths, filter_on, low, high)
+    benchmark.extra_info['rows'] = len(benchmark(scan))
+
+def _portfolio_env_data(lake):
+    dates = pd.to_datetime(sorted(os.listdir('data/lake/ohlcv')))
+    write_synthetic_features('data', lake['symbols'], dates)
+    conn = duckdb.connect(database='./data/trading.duckdb', read_only=False)
+    conn.execute("CREATE OR REPLACE VIEW features_daily AS SELECT * FROM parquet_scan('data/lake/features/daily/*.parquet');")
+    conn.close()
+    return PortfolioData.from_lake(synthetic_symbols(lake['symbols']), str(dates[0].date()), str(dates[-1].date()),
+                                   feature_columns=['r20', 'rsi14', 'news_sent', 'news_conf'])
+
+def test_bench_portfolio_env_batched_steps(benchmark, synthetic_lake):
+    # Env steps/sec for PPO rollouts: 64 portfolios per NumPy step
+    data, n_envs, n_steps = _portfolio_env_data(synthetic_lake), 64, 200
+    env = BatchedPortfolioEnv(data, n_envs=n_envs, episode_length=126, seed=0)
+    actions = np.random.default_rng(0).uniform(-1, 1, (n_envs, len(data.symbols))).astype(np.float32)
+    env.reset()
+
+    def rollout():
+        for _ in range(n_steps):
+            env.step(actions)
+
+    benchmark.pedantic(rollout, rounds=3, iterations=1)
+    if benchmark.stats:
+        benchmark.extra_info['env_steps_per_sec'] = n_envs * n_steps / benchmark.stats.stats.mean
+
+def test_bench_portfolio_env_single_steps(benchmark, synthetic_lake):
+    data, n_steps = _portfolio_env_data(synthetic_lake), 1000
+    env = PortfolioEnv(data, episode_length=None)
+    action = np.random.default_rng(0).uniform(-1, 1, len(data.symbols)).astype(np.float32)
+
+    def rollout():
+        env.reset(seed=0)
+        for _ in range(min(n_steps, env.episode_length)):
+            env.step(action)
+
+    benchmark.pedantic(rollout, rounds=3, iterations=1)
+    if benchmark.stats:
+        benchmark.extra_info['env_steps_per_sec'] = min(n_steps, env.episode_length) / benchmark.stats.stats.mean
+
+def _per_symbol_feeds(symbols, start_date, end_date):
+    # What run_backtest used to do: one interpolated query, DataFrame reshaping and PandasData per symbol
+    import backtrader as bt
+    conn = duckdb.connect(database='./data/trading.duckdb', read_only=True)
+    feeds = []
+    for symbol in symbols:
+        df = conn.execute(f"SELECT date, open, high, low, close, volume FROM ohlcv_daily WHERE symbol = '{symbol}' "
+                          f"AND date >= '{start_date}' AND date <= '{end_date}' ORDER BY date").fetchdf()
+        df['date'] = pd.to_datetime(df['date'])
+        df = df.set_index('date')
+        df.columns = [col.capitalize() for col in df.columns]
+        feeds.append(bt.feeds.PandasData(dataname=df, name=symbol))
+    conn.close()
+    return feeds
+
+def _bulk_feeds(symbols, start_date, end_date):
+    tables = load_ohlcv_arrow(symbols, start_date, end_date)
+    return [ArrayFeed(dataname=tables[symbol], name=symbol) for symbol in tables]
+
+@pytest.mark.parametrize('loader', [_per_symbol_feeds, _bulk_feeds], ids=['per_symbol', 'bulk'])
+def test_bench_backtest_feed_setup(benchmark, synthetic_lake, loader):
+    # Feed construction plus a Cerebro run of a no-op strategy (preload of every bar), for up to 200 symbols
+    import backtrader as bt
+    symbols = synthetic_symbols(min(synthetic_lake['symbols'], 200))
+    start_date, end_date = _backtest_window(synthetic_lake)
+
+    def setup_and_preload():
+        cerebro = bt.Cerebro(stdstats=False)
+        for feed in loader(symbols, start_date, end_date):
+            cerebro.adddata(feed)
+        cerebro.addstrategy(bt.Strategy)
+        return cerebro.run()
+
+    benchmark.group = 'backtest_feed_setup'
+    benchmark.extra_info['feeds'] = len(symbols)
+    benchmark.pedantic(setup_and_preload, rounds=3, iterations=1)
+
+def test_bench_run_backtest(benchmark, synthetic_lake):
+    # SimpleStrategy queries DuckDB per bar, so this runs on a small slice of the universe
+    symbols = synthetic_symbols(synthetic_lake['backtest_symbols'])
+    start_date, end_date = _backtest_window(synthetic_lake)
+    benchmark.extra_info['feeds'] = len(symbols)
+    benchmark.pedantic(run_backtest, args=(symbols, start_date, end_date), rounds=1, iterations=1)
+
+def test_bench_run_portfolio_backtest(benchmark, synthetic_lake):
+    symbols = synthetic_symbols(min(synthetic_lake['symbols'], 50))
+    start_date, end_date = _backtest_window(synthetic_lake)
+    benchmark.extra_info['feeds'] = len(symbols)
+    benchmark.pedantic(run_portfolio_backtest, args=(symbols, start_date, end_date), kwargs={'max_weight': 0.05},
+                       rounds=1, iterations=1)
+
+@pytest.mark.parametrize('n_symbols', [10, 100, 500])
+def test_bench_portfolio_cerebro_run(benchmark, n_symbols):
+    # In-memory tables, so only Backtrader's per-bar work is timed; Cerebro setup runs outside the measurement
+    n_days = 252
+    tables, signals = make_synthetic_universe(n_symbols, n_days)
+
+    def setup():
+        return (build_portfolio_cerebro(tables, signals, cash=1_000_000.0, max_weight=0.05),), {}
+
+    benchmark.group = 'portfolio_cerebro_run'
+    benchmark.extra_info['feeds'] = n_symbols
+    benchmark.pedantic(lambda cerebro: cerebro.run(), setup=setup, rounds=1, iterations=1)
+    if benchmark.stats:
+        benchmark.extra_info['bars_per_sec'] = n_symbols * n_days / benchmark.stats.stats.mean
+
+def test_bench_calculate_metrics(benchmark):
+    rng = np.random.default_rng(0)
+    equity = pd.Series(1e6 * np.exp(np.cumsum(rng.normal(0.0003, 0.01, 252 * 20))),
+                       index=pd.bdate_range('2004-01-01', periods=252 * 20))
+    benchmark(calculate_metrics, equity)
@@ -1,7 +1,23 @@
+import numpy as np
 import pandas as pd
 import duckdb
 import os
-
+from ops.instrumentation import instrument, span, increment
+from ingestion.security_master import encode_symbols
+from ingestion.writers import write_parquet
+from decision.meta_labeling import load_meta_model
+
+def compute_alpha(df_features: pd.DataFrame) -> pd.Series:
+    """Threshold-independent alpha score: (news_sent + r20) / 2, treating missing inputs as neutral.
+
+    Also accepts a mapping of scalars, which is how the live trading service scores one symbol per event.
+    """
+    news_sent, r20 = df_features['news_sent'], df_features['r20']
+    if isinstance(news_sent, pd.Series):
+        return (news_sent.fillna(0) + r20.fillna(0)) / 2
+    return (np.nan_to_num(news_sent, nan=0.0) + np.nan_to_num(r20, nan=0.0)) / 2
+
+@instrument("aggregate_signals")
 def aggregate_signals(min_alpha_buy: float = 0.5, max_alpha_sell: float = -0.5) -> pd.DataFrame:
     """Combines sentiment and momentum to generate an alpha score and trading signals."""
 
@@ -12,7 +28,7 @@ def aggregate_signals(min_alpha_buy: float = 0.5, max_alpha_sell: float = -0.5)
 
     # Load features. For MVP, we assume news_sent and news_conf are already in features_daily
     # In a full pipeline, sentiment agent would write to features_daily as well.
-    df_features = conn.execute("SELECT date, symbol, r20, news_sent, news_conf FROM features_daily ORDER BY date, symbol").fetchdf()
+    df_features = conn.execute("SELECT date, symbol, r20, rsi14, news_sent, news_conf FROM features_daily ORDER BY date, symbol").fetchdf()
 
     if df_features.empty:
         print("No features data available for aggregation.")
@@ -23,7 +39,7 @@ def aggregate_signals(min_alpha_buy: float = 0.5, max_alpha_sell: float = -0.5)
     df_features['news_sent'] = df_features['news_sent'].fillna(0) # Assume neutral if no sentiment
     df_features['r20'] = df_features['r20'].fillna(0) # Assume no momentum if no data
 
-    df_features['alpha'] = (df_features['news_sent'] + df_features['r20']) / 2
+    df_features['alpha'] = compute_alpha(df_features)
 
     # Apply rules to generate signals and rationale
     def generate_signal_and_rationale(row):
@@ -38,17 +54,26 @@ def aggregate_signals(min_alpha_buy: float = 0.5, max_alpha_sell: float = -0.5)
             return "HOLD", reason
 
     df_features[['side', 'reason']] = df_features.apply(lambda row: generate_signal_and_rationale(row), axis=1, result_type='expand')
-    df_aggregated_signal = df_features[['date', 'symbol', 'alpha', 'reason', 'side']]
-
-    # Placeholder for confidence. For MVP, we can derive it simply from alpha magnitude or a fixed value.
-    df_aggregated_signal['conf'] = df_aggregated_signal['alpha'].abs()
 
-    # Create a directory for aggregated signals
-    output_dir = 'data/lake/aggregated_signals'
-    os.makedirs(output_dir, exist_ok=True)
+    # conf is the meta-labeling model's P(success) for every row, scored in one vectorized pass;
+    # alpha magnitude stands in until a model has been trained. Rows the model was trained on (up to its
+    # metrics['trained_through'] date) take their out-of-fold score, so backtests over them stay honest.
+    meta_model = load_meta_model()
+    if meta_model is not None:
+        with span("aggregate_signals.meta_score", rows=len(df_features)):
+            df_features['conf'] = meta_model.score_history(df_features)
+        df_features['meta_version'] = meta_model.version
+    else:
+        df_features['conf'] = df_features['alpha'].abs()
+        df_features['meta_version'] = None
+    df_aggregated_signal = df_features[['date', 'symbol', 'alpha', 'reason', 'side', 'conf', 'meta_version']]
+
+    increment("aggregate_signals.rows", len(df_aggregated_signal))
 
     # Write aggregated signals to Parquet
-    df_aggregated_signal.to_parquet(os.path.join(output_dir, 'aggregated_signals.parquet'), index=False)
+    output_dir = 'data/lake/aggregated_signals'
+    write_parquet(encode_symbols(df_aggregated_signal), os.path.join(output_dir, 'aggregated_signals.parquet'),
+                  'aggregated_signals')
     print(f"Successfully generated aggregated signals and saved to {output_dir}/aggregated_signals.parquet")
 
     # Register in DuckDB
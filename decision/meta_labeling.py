@@ -0,0 +1,353 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+import duckdb
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+from ops.instrumentation import instrument, span, increment
+from ingestion.price_panel import load_ohlcv_frames, open_price_panel
+
+META_MODEL_DIR = 'data/models/meta_label'
+LATEST = 'LATEST'
+
+# Context the classifier sees for each signal. side is the primary model's direction (sign of alpha);
+# alpha_dispersion is the cross-sectional std of alpha on the signal's date, a cheap regime measure.
+META_FEATURE_COLUMNS = ['side', 'alpha', 'abs_alpha', 'alpha_dispersion', 'r20', 'rsi14', 'news_sent', 'news_conf']
+
+# Layout: {model_dir}/{version}/model.npz (standardization + coefficients) and model.json (feature columns,
+# labeling/training params, holdout metrics) plus oof.parquet, the out-of-fold score of every training row.
+# {model_dir}/LATEST names the version scoring uses and is
+# switched atomically. The version is a hash of the training rows and params, so retraining on unchanged
+# inputs is a directory lookup.
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 0.5 * (1.0 + np.tanh(0.5 * z))
+
+def meta_features(df: pd.DataFrame) -> np.ndarray:
+    """(rows x META_FEATURE_COLUMNS) float64 matrix from rows with date, alpha, r20, rsi14, news_sent, news_conf.
+
+    Missing inputs are 0, as compute_alpha treats them as neutral. RSI is rescaled to [0, 1].
+    """
+    alpha = df['alpha'].to_numpy(dtype=np.float64)
+    dispersion = df.groupby('date', sort=False)['alpha'].transform('std').to_numpy(dtype=np.float64)
+    X = np.column_stack([
+        np.sign(alpha), alpha, np.abs(alpha), dispersion,
+        df['r20'].to_numpy(dtype=np.float64), df['rsi14'].to_numpy(dtype=np.float64) / 100.0,
+        df['news_sent'].to_numpy(dtype=np.float64), df['news_conf'].to_numpy(dtype=np.float64),
+    ])
+    return np.nan_to_num(X, nan=0.0, posinf=0.0, neginf=0.0)
+
+def triple_barrier_labels(opens: np.ndarray, closes: np.ndarray, side: np.ndarray, horizon: int = 10,
+                          profit_take: float = 2.0, stop_loss: float = 1.0, vol_span: int = 20) -> np.ndarray:
+    """1/0 outcome of a bet in direction side taken on each (date, symbol) of dense (dates x symbols) arrays.
+
+    The bet is entered at the next session's open, as the backtester fills. The upper and lower barriers
+    sit at profit_take and stop_loss times the symbol's EWM daily volatility scaled to the horizon; the label
+    is 1 if the side-adjusted close path reaches the upper barrier first, 0 if the lower one, and otherwise
+    the sign of the side-adjusted return at the horizon. NaN where there is no side, entry or full horizon.
+    """
+    n_dates = closes.shape[0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_returns = np.log(closes[1:] / closes[:-1])
+    vol = pd.DataFrame(log_returns).ewm(span=vol_span, min_periods=vol_span // 2).std().to_numpy()
+    vol = np.vstack([np.full((1, closes.shape[1]), np.nan), vol]) * np.sqrt(horizon)
+
+    entry = np.full_like(closes, np.nan)
+    entry[:-1] = opens[1:]
+    upper, lower = profit_take * vol, -stop_loss * vol
+
+    labels = np.full(closes.shape, np.nan)
+    for k in range(1, horizon + 1):
+        path = np.full_like(closes, np.nan)
+        path[:n_dates - k] = closes[k:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ret = side * (path / entry - 1)
+        undecided = np.isnan(labels)
+        labels[undecided & (ret >= upper)] = 1.0
+        labels[undecided & (ret <= lower)] = 0.0
+        if k == horizon:
+            vertical = np.isnan(labels) & np.isfinite(ret)
+            labels[vertical] = (ret[vertical] > 0).astype(np.float64)
+
+    valid = (side != 0) & np.isfinite(entry) & np.isfinite(vol)
+    valid[n_dates - horizon:] = False
+    return np.where(valid, labels, np.nan)
+
+def _auc(y: np.ndarray, p: np.ndarray) -> float:
+    """ROC AUC from ranks (Mann-Whitney U); NaN if only one class is present."""
+    n_pos = y.sum()
+    n_neg = len(y) - n_pos
+    if n_pos == 0 or n_neg == 0:
+        return float('nan')
+    ranks = pd.Series(p).rank().to_numpy()
+    return float((ranks[y == 1].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg))
+
+class MetaLabelModel:
+    """L2-regularized logistic regression P(signal succeeds | context) over standardized META_FEATURE_COLUMNS.
+
+    Scoring is one (rows x features) matrix-vector product, so a universe-day is microseconds. oof_scores
+    holds (date, symbol, conf) for the rows the model was trained on, each scored by a fold model that
+    never saw it; score_history uses them so historical conf is not in-sample.
+    """
+
+    def __init__(self, coef: np.ndarray, intercept: float, mean: np.ndarray, std: np.ndarray,
+                 feature_columns: List[str] = META_FEATURE_COLUMNS, version: Optional[str] = None,
+                 params: Optional[dict] = None, metrics: Optional[dict] = None,
+                 oof_scores: Optional[pd.DataFrame] = None):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.std = np.asarray(std, dtype=np.float64)
+        self.feature_columns = list(feature_columns)
+        self.version = version
+        self.params = params or {}
+        self.metrics = metrics or {}
+        self.oof_scores = oof_scores
+
+    @classmethod
+    def fit(cls, X: np.ndarray, y: np.ndarray, l2: float = 1.0, max_iter: int = 50, tol: float = 1e-8,
+            **kwargs) -> 'MetaLabelModel':
+        """Newton-Raphson (IRLS) fit; the intercept is not penalized."""
+        mean, std = X.mean(axis=0), X.std(axis=0)
+        std = np.where(std > 0, std, 1.0)
+        Xs = np.column_stack([np.ones(len(X)), (X - mean) / std])
+        penalty = np.full(Xs.shape[1], l2)
+        penalty[0] = 0.0
+
+        w = np.zeros(Xs.shape[1])
+        for _ in range(max_iter):
+            p = _sigmoid(Xs @ w)
+            grad = Xs.T @ (p - y) + penalty * w
+            hessian = (Xs * (p * (1 - p))[:, None]).T @ Xs + np.diag(penalty) + 1e-9 * np.eye(len(w))
+            step = np.linalg.solve(hessian, grad)
+            w -= step
+            if np.abs(step).max() < tol:
+                break
+        return cls(w[1:], w[0], mean, std, **kwargs)
+
+    def predict_proba(self, X: np.ndarray, batch_size: int = 1 << 20) -> np.ndarray:
+        """P(success) per row, in row batches so huge frames never materialize a second full matrix."""
+        out = np.empty(len(X))
+        for start in range(0, len(X), batch_size):
+            batch = X[start:start + batch_size]
+            out[start:start + batch_size] = _sigmoid((batch - self.mean) / self.std @ self.coef + self.intercept)
+        return out
+
+    def score(self, df: pd.DataFrame) -> np.ndarray:
+        """P(success) for signal rows (date, alpha, r20, rsi14, news_sent, news_conf)."""
+        return self.predict_proba(meta_features(df))
+
+    def score_history(self, df: pd.DataFrame) -> np.ndarray:
+        """score(), with the out-of-fold score in place of the final model's on rows it was trained on."""
+        conf = self.score(df)
+        if self.oof_scores is None or df.empty:
+            return conf
+        keys = pd.MultiIndex.from_arrays([pd.to_datetime(df['date']), df['symbol'].astype(str)])
+        oof = self.oof_scores.set_index(['date', 'symbol'])['conf'].reindex(keys).to_numpy(dtype=np.float64)
+        return np.where(np.isfinite(oof), oof, conf)
+
+    def save(self, model_dir: str = META_MODEL_DIR) -> str:
+        """Writes the model under its version directory (atomically) and returns that directory."""
+        version_dir = os.path.join(model_dir, self.version)
+        tmp_dir = os.path.join(model_dir, f'.{self.version}.{uuid.uuid4().hex}')
+        os.makedirs(tmp_dir)
+        np.savez(os.path.join(tmp_dir, 'model.npz'), coef=self.coef, intercept=self.intercept, mean=self.mean, std=self.std)
+        with open(os.path.join(tmp_dir, 'model.json'), 'w') as f:
+            json.dump({'version': self.version, 'feature_columns': self.feature_columns, 'params': self.params,
+                       'metrics': self.metrics, 'trained_at': pd.Timestamp.now(tz='UTC').isoformat()}, f, indent=2)
+        if self.oof_scores is not None:
+            self.oof_scores.to_parquet(os.path.join(tmp_dir, 'oof.parquet'), index=False)
+        if os.path.exists(version_dir):
+            # Same version means same training rows and params; keep the existing copy
+            shutil.rmtree(tmp_dir)
+        else:
+            os.replace(tmp_dir, version_dir)
+        return version_dir
+
+    @classmethod
+    def load(cls, version_dir: str) -> 'MetaLabelModel':
+        arrays = np.load(os.path.join(version_dir, 'model.npz'))
+        with open(os.path.join(version_dir, 'model.json')) as f:
+            meta = json.load(f)
+        oof_path = os.path.join(version_dir, 'oof.parquet')
+        oof_scores = pd.read_parquet(oof_path) if os.path.exists(oof_path) else None
+        return cls(arrays['coef'], float(arrays['intercept']), arrays['mean'], arrays['std'],
+                   feature_columns=meta['feature_columns'], version=meta['version'], params=meta['params'],
+                   metrics=meta['metrics'], oof_scores=oof_scores)
+
+# Loaded models by version directory; versions are immutable, so entries never go stale
+_LOADED: Dict[str, MetaLabelModel] = {}
+
+def _set_latest(model_dir: str, version: str) -> None:
+    tmp_path = os.path.join(model_dir, f'.{LATEST}.{uuid.uuid4().hex}')
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(model_dir, LATEST))
+
+def load_meta_model(version: Optional[str] = None, model_dir: str = META_MODEL_DIR) -> Optional[MetaLabelModel]:
+    """The given version (default: LATEST), from the in-process cache after the first load; None if none is trained."""
+    if version is None:
+        latest_path = os.path.join(model_dir, LATEST)
+        if not os.path.exists(latest_path):
+            return None
+        with open(latest_path) as f:
+            version = f.read().strip()
+    version_dir = os.path.abspath(os.path.join(model_dir, version))
+    if version_dir not in _LOADED:
+        _LOADED[version_dir] = MetaLabelModel.load(version_dir)
+    return _LOADED[version_dir]
+
+def _price_arrays(symbols: List[str], dates: pd.DatetimeIndex,
+                  end_date: str) -> Tuple[pd.DatetimeIndex, np.ndarray, np.ndarray]:
+    """Dense (dates x symbols) opens and closes on the feature dates plus later sessions up to end_date, with their index."""
+    start_date = str(dates[0].date())
+    panel = open_price_panel()
+    if panel is not None:
+        opens = panel.frame('open', symbols, start_date, end_date)
+        closes = panel.frame('close', symbols, start_date, end_date)
+    else:
+        frames = load_ohlcv_frames(symbols, start_date, end_date)
+        opens = pd.DataFrame({s: f['Open'] for s, f in frames.items()}).reindex(columns=symbols).sort_index()
+        closes = pd.DataFrame({s: f['Close'] for s, f in frames.items()}).reindex(columns=symbols).sort_index()
+    index = dates.union(closes.index)
+    return index, opens.reindex(index).to_numpy(dtype=np.float64), closes.reindex(index).to_numpy(dtype=np.float64)
+
+def build_meta_labels(df_features: pd.DataFrame, horizon: int = 10, profit_take: float = 2.0,
+                      stop_loss: float = 1.0, vol_span: int = 20) -> pd.DataFrame:
+    """Adds alpha and a triple-barrier label to feature rows; rows that cannot be labeled are dropped."""
+    # Imported here: the aggregator imports this module to score signals
+    from decision.aggregator_v0 import compute_alpha
+
+    df = df_features.copy()
+    df['date'] = pd.to_datetime(df['date'])
+    df['symbol'] = df['symbol'].astype(str)
+    df['alpha'] = compute_alpha(df)
+
+    symbols = sorted(df['symbol'].unique())
+    dates = pd.DatetimeIndex(sorted(df['date'].unique()))
+    # Calendar slack so the last feature dates still get horizon sessions of prices
+    end_date = str((dates[-1] + pd.Timedelta(days=2 * horizon + 7)).date())
+    with span("build_meta_labels.prices", symbols=len(symbols)):
+        index, opens, closes = _price_arrays(symbols, dates, end_date)
+    rows = index.get_indexer(df['date'])
+    columns = pd.Index(symbols).get_indexer(df['symbol'])
+
+    side = np.zeros_like(closes)
+    side[rows, columns] = np.sign(df['alpha'].to_numpy())
+    labels = triple_barrier_labels(opens, closes, side, horizon, profit_take, stop_loss, vol_span)
+    df['label'] = labels[rows, columns]
+    return df.dropna(subset=['label']).reset_index(drop=True)
+
+def out_of_fold_scores(df: pd.DataFrame, X: np.ndarray, y: np.ndarray, horizon: int, n_folds: int = 5,
+                       l2: float = 1.0) -> np.ndarray:
+    """P(success) for each labeled row from a model fit without its block of dates (purged k-fold).
+
+    Dates are split into n_folds contiguous blocks. Each block is scored by a fit on the other rows, minus
+    `horizon` dates on either side of the block, whose labels share prices with it. NaN where the remaining
+    rows hold a single class.
+    """
+    dates = np.sort(df['date'].unique())
+    position = pd.Index(dates).get_indexer(df['date'])
+    scores = np.full(len(df), np.nan)
+    for block in np.array_split(np.arange(len(dates)), n_folds):
+        if not len(block):
+            continue
+        scored = (position >= block[0]) & (position <= block[-1])
+        train = (position < block[0] - horizon) | (position > block[-1] + horizon)
+        if np.unique(y[train]).size < 2:
+            continue
+        scores[scored] = MetaLabelModel.fit(X[train], y[train], l2=l2).predict_proba(X[scored])
+    return scores
+
+def _training_version(df: pd.DataFrame, params: dict) -> str:
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(df[['date', 'symbol', 'alpha', 'r20', 'rsi14', 'news_sent', 'news_conf', 'label']],
+                                             index=False).to_numpy().tobytes())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+@instrument("train_meta_model")
+def train_meta_model(start_date: Optional[str] = None, end_date: Optional[str] = None, horizon: int = 10,
+                     profit_take: float = 2.0, stop_loss: float = 1.0, l2: float = 1.0, holdout: float = 0.2,
+                     n_folds: int = 5, model_dir: str = META_MODEL_DIR) -> Optional[MetaLabelModel]:
+    """Labels features_daily signals with triple barriers, fits the meta-labeling model and makes it LATEST.
+
+    The last `holdout` fraction of dates is held out for metrics, with `horizon` sessions purged before it so
+    no training label overlaps the holdout's prices; the saved model is then refit on all labeled rows.
+    Its own scores for dates up to metrics['trained_through'] would be in-sample, so each training row also
+    gets an out-of-fold score (out_of_fold_scores, n_folds) saved with the model. If the same rows and params
+    were trained before, that version is reused instead of refitting. Returns None if there are no
+    labelable signals.
+    """
+    conn = duckdb.connect(database='./data/trading.duckdb', read_only=False)
+    conn.execute("CREATE OR REPLACE VIEW features_daily AS SELECT * FROM parquet_scan('data/lake/features/daily/*.parquet');")
+    df_features = conn.execute(
+        "SELECT date, symbol, r20, rsi14, news_sent, news_conf FROM features_daily "
+        "WHERE (? IS NULL OR date >= ?) AND (? IS NULL OR date <= ?) ORDER BY date, symbol",
+        [start_date, start_date, end_date, end_date]
+    ).fetchdf()
+    conn.close()
+    if df_features.empty:
+        print("No features to train the meta-labeling model on.")
+        return None
+
+    params = {'horizon': horizon, 'profit_take': profit_take, 'stop_loss': stop_loss, 'l2': l2, 'holdout': holdout,
+              'n_folds': n_folds}
+    df = build_meta_labels(df_features, horizon, profit_take, stop_loss)
+    if df.empty or df['label'].nunique() < 2:
+        print("Not enough labeled signals to train the meta-labeling model.")
+        return None
+
+    version = _training_version(df, params)
+    os.makedirs(model_dir, exist_ok=True)
+    if os.path.exists(os.path.join(model_dir, version)):
+        print(f"Meta-labeling model {version} is up to date.")
+        _set_latest(model_dir, version)
+        return load_meta_model(version, model_dir)
+
+    dates = np.sort(df['date'].unique())
+    split = dates[int(len(dates) * (1 - holdout))] if holdout > 0 else None
+    purge_end = dates[max(int(len(dates) * (1 - holdout)) - horizon, 0)] if holdout > 0 else None
+    train = df[df['date'] < purge_end] if holdout > 0 else df
+    test = df[df['date'] >= split] if holdout > 0 else df.iloc[:0]
+    if train['label'].nunique() < 2:
+        train, test = df, df.iloc[:0]
+
+    X_train, y_train = meta_features(train), train['label'].to_numpy()
+    X_all, y_all = meta_features(df), df['label'].to_numpy()
+    metrics = {'train_rows': int(len(df)), 'holdout_rows': int(len(test)), 'base_rate': float(y_all.mean()),
+               'trained_through': str(pd.Timestamp(dates[-1]).date())}
+    if len(test):
+        # Out-of-sample metrics come from a fit that never saw the holdout (or the purged gap before it)
+        with span("train_meta_model.fit_holdout", rows=len(train)):
+            holdout_model = MetaLabelModel.fit(X_train, y_train, l2=l2, version=version, params=params)
+        y_test, p_test = test['label'].to_numpy(), holdout_model.score(test)
+        metrics['holdout_auc'] = _auc(y_test, p_test)
+        metrics['holdout_logloss'] = float(-np.mean(y_test * np.log(np.clip(p_test, 1e-12, 1))
+                                                    + (1 - y_test) * np.log(np.clip(1 - p_test, 1e-12, 1))))
+    # The saved model is refit on every labeled row, so the most recent signals inform live scoring
+    with span("train_meta_model.fit", rows=len(df)):
+        model = MetaLabelModel.fit(X_all, y_all, l2=l2, version=version, params=params)
+    metrics['train_auc'] = _auc(y_all, model.predict_proba(X_all))
+    with span("train_meta_model.out_of_fold", folds=n_folds):
+        oof = out_of_fold_scores(df, X_all, y_all, horizon, n_folds, l2)
+    scored = np.isfinite(oof)
+    metrics['oof_auc'] = _auc(y_all[scored], oof[scored]) if scored.any() else float('nan')
+    model.oof_scores = pd.DataFrame({'date': df['date'][scored].to_numpy(), 'symbol': df['symbol'][scored].to_numpy(),
+                                     'conf': oof[scored]})
+    model.metrics = metrics
+    _LOADED[os.path.abspath(model.save(model_dir))] = model
+    _set_latest(model_dir, version)
+    increment("train_meta_model.rows", len(df))
+    print(f"Trained meta-labeling model {version}: {metrics}")
+    return model
+
+if __name__ == "__main__":
+    # Example Usage:
+    # Requires features_daily and the price panel (or ohlcv_daily)
+    model = train_meta_model(horizon=10)
+    if model is not None:
+        print(model.metrics)
@@ -0,0 +1,163 @@
+import os
+import itertools
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import duckdb
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from decision.aggregator_v0 import compute_alpha
+from exec.backtester import build_portfolio_cerebro
+from exec.feeds import load_ohlcv_arrow, slice_dates, trading_calendar
+from ingestion.writers import write_parquet
+from eval.metrics import calculate_metrics
+
+# Data shared by every fold. Set once per worker process by _init_worker (or directly when running in-process),
+# so each fold only slices it instead of re-querying DuckDB or re-pickling the tables per task.
+_SHARED: Dict[str, object] = {}
+
+def make_folds(dates: Sequence, train_size: int, test_size: int, step: Optional[int] = None,
+               expanding: bool = False) -> List[Tuple[pd.Timestamp, pd.Timestamp, pd.Timestamp, pd.Timestamp]]:
+    """Splits a sorted trading-date index into (train_start, train_end, test_start, test_end) folds.
+
+    Sizes are in trading days. Rolling folds keep a fixed train_size window; expanding folds always
+    start at the first date. step defaults to test_size so test windows tile the range without overlap.
+    """
+    dates = pd.DatetimeIndex(sorted(pd.to_datetime(pd.Index(dates).unique())))
+    step = step or test_size
+    folds = []
+    train_end = train_size
+    while train_end + test_size <= len(dates):
+        train_start = 0 if expanding else train_end - train_size
+        folds.append((dates[train_start], dates[train_end - 1], dates[train_end], dates[train_end + test_size - 1]))
+        train_end += step
+    return folds
+
+def load_walk_forward_data(symbols: List[str], start_date: str, end_date: str) -> Tuple[Dict[str, pa.Table], pd.DataFrame]:
+    """Loads per-symbol Arrow OHLCV tables (load_ohlcv_arrow) and alpha for the whole range."""
+    tables = load_ohlcv_arrow(symbols, start_date, end_date)
+
+    conn = duckdb.connect(database='./data/trading.duckdb', read_only=True)
+    df_features = conn.execute(
+        "SELECT * FROM features_daily WHERE symbol IN (SELECT UNNEST(?)) AND date >= ? AND date <= ?",
+        [symbols, start_date, end_date]
+    ).fetchdf()
+    conn.close()
+
+    df_features = df_features.reindex(columns=sorted(set(df_features.columns) | {'news_sent', 'r20'}))
+    signals = pd.DataFrame({
+        'date': pd.to_datetime(df_features['date']),
+        'symbol': df_features['symbol'],
+        'alpha': compute_alpha(df_features),
+    })
+    return tables, signals
+
+def _init_worker(tables: Dict[str, pa.Table], signals: pd.DataFrame, backtest_params: dict) -> None:
+    _SHARED['tables'] = tables
+    _SHARED['signals'] = signals
+    _SHARED['backtest_params'] = backtest_params
+
+def _run_window(start: pd.Timestamp, end: pd.Timestamp, min_alpha_buy: float, max_alpha_sell: float) -> pd.Series:
+    """Backtests the shared data sliced to [start, end] and returns the equity curve."""
+    tables = {symbol: slice_dates(table, start, end) for symbol, table in _SHARED['tables'].items()}
+    tables = {symbol: table for symbol, table in tables.items() if table.num_rows}
+    signals = _SHARED['signals']
+    signals = signals[(signals['date'] >= start) & (signals['date'] <= end)]
+    if not tables:
+        return pd.Series(dtype=float)
+
+    cerebro = build_portfolio_cerebro(tables, signals, min_alpha_buy=min_alpha_buy, max_alpha_sell=max_alpha_sell,
+                                      **_SHARED['backtest_params'])
+    strategy = cerebro.run()[0]
+    dates, values = zip(*strategy.equity) if strategy.equity else ((), ())
+    return pd.Series(values, index=pd.to_datetime(list(dates)), name='portfolio_value')
+
+def _run_fold(fold_id: int, fold: Tuple[pd.Timestamp, ...], param_grid: List[Tuple[float, float]],
+              objective: str) -> Tuple[dict, pd.Series]:
+    """Grid-searches thresholds on the train window, then evaluates the best pair on the test window."""
+    train_start, train_end, test_start, test_end = fold
+
+    best_params, best_score = param_grid[0], -np.inf
+    for min_alpha_buy, max_alpha_sell in param_grid:
+        score = calculate_metrics(_run_window(train_start, train_end, min_alpha_buy, max_alpha_sell))[objective]
+        if score > best_score:
+            best_params, best_score = (min_alpha_buy, max_alpha_sell), score
+
+    test_equity = _run_window(test_start, test_end, *best_params)
+    fold_metrics = {
+        'fold': fold_id,
+        'train_start': train_start, 'train_end': train_end,
+        'test_start': test_start, 'test_end': test_end,
+        'min_alpha_buy': best_params[0], 'max_alpha_sell': best_params[1],
+        'objective': objective, 'train_score': best_score,
+        **{f'test_{name}': value for name, value in calculate_metrics(test_equity).items()},
+    }
+    return fold_metrics, test_equity
+
+def stitch_equity_curves(curves: List[pd.Series], initial_value: float) -> pd.Series:
+    """Chains per-fold test equity curves by compounding their returns into one out-of-sample curve."""
+    returns = [curve.pct_change().fillna(0.0) for curve in curves if not curve.empty]
+    if not returns:
+        return pd.Series(dtype=float, name='portfolio_value')
+    stitched = pd.concat(returns).sort_index()
+    stitched = stitched[~stitched.index.duplicated(keep='first')]
+    return (initial_value * (1 + stitched).cumprod()).rename('portfolio_value')
+
+def run_walk_forward(symbols: List[str], start_date: str, end_date: str,
+                     train_size: int = 252, test_size: int = 63, step: Optional[int] = None, expanding: bool = False,
+                     min_alpha_buy_grid: Sequence[float] = (0.3, 0.5, 0.7),
+                     max_alpha_sell_grid: Sequence[float] = (-0.3, -0.5, -0.7),
+                     objective: str = 'sharpe_ratio', max_workers: Optional[int] = None,
+                     cash: float = 100000.0, commission: float = 0.001,
+                     output_dir: str = 'data/lake/walk_forward', **strategy_params) -> Tuple[pd.Series, pd.DataFrame]:
+    """Walk-forward validation of aggregator thresholds with folds run in parallel processes.
+
+    Writes the stitched out-of-sample equity curve and per-fold metrics to output_dir and returns both.
+    max_alpha_sell_grid is only searched with allow_short=True. max_workers=1 runs the folds in-process (useful for debugging and tests).
+    """
+    tables, signals = load_walk_forward_data(symbols, start_date, end_date)
+    if not tables:
+        print("No OHLCV data found for walk-forward range. Exiting.")
+        return pd.Series(dtype=float), pd.DataFrame()
+
+    calendar = pd.DatetimeIndex(trading_calendar(tables))
+    folds = make_folds(calendar, train_size, test_size, step=step, expanding=expanding)
+    if not folds:
+        print(f"Date range has {len(calendar)} trading days, fewer than train_size + test_size. Exiting.")
+        return pd.Series(dtype=float), pd.DataFrame()
+
+    if not strategy_params.get('allow_short', False):
+        # Long-only sizing never reads max_alpha_sell, so searching over it would only repeat identical
+        # backtests; folds report it as NaN instead of an arbitrary "fitted" value
+        max_alpha_sell_grid = (np.nan,)
+    param_grid = list(itertools.product(min_alpha_buy_grid, max_alpha_sell_grid))
+    backtest_params = {'cash': cash, 'commission': commission, **strategy_params}
+    print(f"Running {len(folds)} walk-forward folds x {len(param_grid)} threshold pairs")
+
+    if max_workers == 1:
+        _init_worker(tables, signals, backtest_params)
+        results = [_run_fold(i, fold, param_grid, objective) for i, fold in enumerate(folds)]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(tables, signals, backtest_params)) as executor:
+            futures = [executor.submit(_run_fold, i, fold, param_grid, objective) for i, fold in enumerate(folds)]
+            results = [future.result() for future in futures]
+
+    fold_metrics = pd.DataFrame([metrics for metrics, _ in results])
+    oos_equity = stitch_equity_curves([equity for _, equity in results], initial_value=cash)
+
+    write_parquet(oos_equity.rename_axis('date').reset_index(), os.path.join(output_dir, 'oos_equity.parquet'),
+                  'walk_forward_equity')
+    write_parquet(fold_metrics, os.path.join(output_dir, 'fold_metrics.parquet'), 'walk_forward_folds')
+    print(f"Walk-forward results written to {output_dir}")
+    print("Out-of-sample metrics:", calculate_metrics(oos_equity))
+
+    return oos_equity, fold_metrics
+
+if __name__ == "__main__":
+    # Example Usage:
+    # Requires ohlcv_daily and features_daily to be populated in data/trading.duckdb
+    oos_equity, fold_metrics = run_walk_forward(symbols=["AAPL", "MSFT"], start_date="2021-01-01", end_date="2023-12-31",
+                                                train_size=252, test_size=63)
+    print(fold_metrics)
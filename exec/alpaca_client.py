@@ -1,12 +1,55 @@
 import os
+import threading
+import time
 from alpaca.trading.client import TradingClient
 from alpaca.trading.requests import MarketOrderRequest
 from alpaca.trading.enums import OrderSide, TimeInForce
 import pandas as pd
-from typing import List
+from typing import Any, Callable, Dict, List, Optional
+from ops.instrumentation import instrument, span
+
+# Refresh fetches that raced a fill are retried this many times before the (fill-patched) cache is kept as is
+REFRESH_ATTEMPTS = 3
+
+# Trade-update events that change the position book. Everything else (new, canceled, ...) is ignored by the cache.
+FILL_EVENTS = ("fill", "partial_fill")
+
+def _to_dict(model: Any) -> dict:
+    """Converts an alpaca-py pydantic model (v1 or v2) to a plain dict once, at refresh time."""
+    if isinstance(model, dict):
+        return dict(model)
+    if hasattr(model, "model_dump"):
+        return model.model_dump()
+    return model.dict()
+
+def _field(obj: Any, name: str, default: Any = None) -> Any:
+    """Reads a field from either a dict-style event (local stream) or an alpaca-py model."""
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+def _as_float(value: Any) -> float:
+    return float(value) if value is not None else 0.0
+
+def _as_str(value: Any) -> str:
+    # alpaca-py enums are str subclasses; .value gives the raw wire string ("buy", "fill", ...)
+    return str(getattr(value, "value", value)).lower()
+
+class LocalTradingStream:
+    """In-process stand-in for alpaca's TradingStream. Tests and replays push events with publish()."""
 
-class AlpacaClient:
     def __init__(self):
+        self._handlers: List[Callable] = []
+
+    def subscribe_trade_updates(self, handler: Callable) -> None:
+        self._handlers.append(handler)
+
+    def publish(self, event: Any) -> None:
+        for handler in self._handlers:
+            handler(event)
+
+class AlpacaClient:
+    def __init__(self, state_ttl: float = 30.0, trading_client: Optional[TradingClient] = None):
         self.api_key = os.environ.get("ALPACA_API_KEY")
         self.secret_key = os.environ.get("ALPACA_SECRET_KEY")
         self.paper = True # Always use paper trading for this MVP
@@ -14,10 +57,27 @@ class AlpacaClient:
         if not self.api_key or not self.secret_key:
             raise ValueError("ALPACA_API_KEY and ALPACA_SECRET_KEY environment variables must be set.")
 
-        self.trading_client = TradingClient(self.api_key, self.secret_key, paper=self.paper)
+        self.trading_client = trading_client or TradingClient(self.api_key, self.secret_key, paper=self.paper)
 
-    def place_market_order(self, symbol: str, qty: float, side: str) -> dict:
-        """Places a market order for a given symbol, quantity, and side (BUY/SELL)."""
+        # Account/position cache. Refreshed from the API when older than state_ttl seconds,
+        # and patched locally from fills in between so per-symbol lookups never hit the network.
+        self.state_ttl = state_ttl
+        self._state_lock = threading.RLock()
+        self._account: dict = {}
+        self._positions: Dict[str, dict] = {}
+        self._last_refresh: Optional[float] = None
+        # Bumped by every locally applied fill; a refresh whose fetch straddled a bump is stale and discarded
+        self._state_version = 0
+        # Without a trade stream nothing patches the cache after an order, so submits invalidate it instead
+        self._stream_attached = False
+
+    @instrument("alpaca.place_market_order")
+    def place_market_order(self, symbol: str, qty: float, side: str, client_order_id: Optional[str] = None) -> dict:
+        """Places a market order for a given symbol, quantity, and side (BUY/SELL).
+
+        client_order_id, if given, is echoed on the order's trade updates, so callers can track an order
+        before the broker has returned its id.
+        """
         if side.upper() == "BUY":
             order_side = OrderSide.BUY
         elif side.upper() == "SELL":
@@ -29,35 +89,194 @@ class AlpacaClient:
             symbol=symbol,
             qty=qty,
             side=order_side,
-            time_in_force=TimeInForce.DAY # Orders are good for the day
+            time_in_force=TimeInForce.DAY, # Orders are good for the day
+            client_order_id=client_order_id
         )
 
         try:
             order = self.trading_client.submit_order(market_order_data)
             print(f"Placed {side} order for {qty} shares of {symbol}. Order ID: {order.id}")
-            return order.dict()
+            if not self._stream_attached:
+                self.invalidate_state()
+            return _to_dict(order)
         except Exception as e:
             print(f"Error placing order for {symbol}: {e}")
             return {"error": str(e)}
 
+    def is_state_stale(self) -> bool:
+        """True if the cached account/positions are older than state_ttl (or were never loaded)."""
+        with self._state_lock:
+            return self._last_refresh is None or (time.monotonic() - self._last_refresh) > self.state_ttl
+
+    def invalidate_state(self) -> None:
+        """Forces the next read to go back to the API."""
+        with self._state_lock:
+            self._last_refresh = None
+
+    def refresh_state(self, force: bool = False) -> None:
+        """Reloads account and positions in two API calls if the cache is stale (or force=True).
+
+        The fetch runs outside the lock, so a fill applied meanwhile would be overwritten by the older
+        snapshot. Such a snapshot is discarded and fetched again; if fills keep racing, the fill-patched
+        cache is kept and stays stale, so the next read retries.
+        """
+        if not force and not self.is_state_stale():
+            return
+
+        for _ in range(REFRESH_ATTEMPTS):
+            with self._state_lock:
+                version = self._state_version
+
+            with span("alpaca.refresh_state"):
+                account = self.trading_client.get_account()
+                positions = self.trading_client.get_all_positions()
+
+            with self._state_lock:
+                if self._state_version != version:
+                    continue
+                self._account = _to_dict(account)
+                self._positions = {}
+                for p in positions:
+                    position = _to_dict(p)
+                    # Keep quantities/prices numeric in the cache so fills can be applied arithmetically
+                    for key in ("qty", "avg_entry_price", "market_value", "current_price"):
+                        if key in position:
+                            position[key] = _as_float(position[key])
+                    self._positions[position["symbol"]] = position
+                self._last_refresh = time.monotonic()
+                return
+
     def get_account_information(self) -> dict:
-        """Retrieves account information."""
+        """Retrieves account information (served from the state cache)."""
         try:
-            account = self.trading_client.get_account()
-            return account.dict()
+            self.refresh_state()
+            with self._state_lock:
+                return dict(self._account)
         except Exception as e:
             print(f"Error fetching account information: {e}")
             return {"error": str(e)}
 
     def get_open_positions(self) -> List[dict]:
-        """Retrieves all open positions."""
+        """Retrieves all open positions (served from the state cache)."""
         try:
-            positions = self.trading_client.get_all_positions()
-            return [p.dict() for p in positions]
+            self.refresh_state()
+            with self._state_lock:
+                return [dict(p) for p in self._positions.values()]
         except Exception as e:
             print(f"Error fetching open positions: {e}")
             return {"error": str(e)}
 
+    def get_position(self, symbol: str) -> Optional[dict]:
+        """O(1) lookup of the cached position for one symbol; None if flat."""
+        try:
+            self.refresh_state()
+            with self._state_lock:
+                position = self._positions.get(symbol)
+                return dict(position) if position is not None else None
+        except Exception as e:
+            print(f"Error fetching position for {symbol}: {e}")
+            return {"error": str(e)}
+
+    def get_position_qty(self, symbol: str) -> float:
+        """Signed share count for a symbol from the cache (0.0 if flat).
+
+        Raises RuntimeError if the positions could not be loaded, rather than reporting the symbol as flat.
+        """
+        position = self.get_position(symbol)
+        if position and "error" in position:
+            raise RuntimeError(f"Position for {symbol} unavailable: {position['error']}")
+        return position["qty"] if position else 0.0
+
+    def get_state_snapshot(self, refresh: bool = True) -> dict:
+        """Single consistent view of the whole book: account, positions keyed by symbol, and cache age in seconds.
+
+        refresh=False reads the cache as it stands, without a network round trip even if it is stale.
+        """
+        try:
+            if refresh:
+                self.refresh_state()
+            with self._state_lock:
+                return {
+                    "account": dict(self._account),
+                    "positions": {symbol: dict(p) for symbol, p in self._positions.items()},
+                    "age_seconds": time.monotonic() - self._last_refresh if self._last_refresh is not None else None,
+                }
+        except Exception as e:
+            print(f"Error fetching account state: {e}")
+            return {"error": str(e)}
+
+    def get_positions_frame(self) -> pd.DataFrame:
+        """Cached positions as a DataFrame indexed by symbol, for vectorized sizing/risk checks."""
+        snapshot = self.get_state_snapshot()
+        if "error" in snapshot:
+            raise RuntimeError(f"Positions unavailable: {snapshot['error']}")
+        if not snapshot["positions"]:
+            return pd.DataFrame(columns=["qty", "avg_entry_price", "market_value"]).rename_axis("symbol")
+        return pd.DataFrame.from_dict(snapshot["positions"], orient="index").rename_axis("symbol")
+
+    def apply_fill(self, symbol: str, side: str, qty: float, price: float, position_qty: Optional[float] = None) -> None:
+        """Updates the cached position and cash for a (partial) fill without an API round trip.
+
+        If the broker reports the resulting position_qty it is used as-is; otherwise the
+        quantity is accumulated locally. Average entry price is updated on position increases.
+        """
+        signed_qty = qty if side.upper() == "BUY" else -qty
+        with self._state_lock:
+            self._state_version += 1
+            position = self._positions.get(symbol, {"symbol": symbol, "qty": 0.0, "avg_entry_price": 0.0})
+            old_qty = position["qty"]
+            new_qty = position_qty if position_qty is not None else old_qty + signed_qty
+
+            if new_qty == 0:
+                self._positions.pop(symbol, None)
+            else:
+                if abs(new_qty) > abs(old_qty) and (old_qty == 0 or (old_qty > 0) == (new_qty > 0)):
+                    added = abs(new_qty) - abs(old_qty)
+                    position["avg_entry_price"] = (abs(old_qty) * position["avg_entry_price"] + added * price) / abs(new_qty)
+                elif (old_qty > 0) != (new_qty > 0):
+                    # Position flipped sides; the remainder was opened at this fill's price
+                    position["avg_entry_price"] = price
+                position["qty"] = new_qty
+                position["current_price"] = price
+                position["market_value"] = new_qty * price
+                self._positions[symbol] = position
+
+            if "cash" in self._account:
+                self._account["cash"] = _as_float(self._account["cash"]) - signed_qty * price
+
+    def handle_trade_update(self, update: Any) -> None:
+        """Applies an alpaca trade-update event (model or dict) to the state cache; non-fill events are ignored."""
+        event = _as_str(_field(update, "event"))
+        if event not in FILL_EVENTS:
+            return
+        order = _field(update, "order")
+        position_qty = _field(update, "position_qty")
+        self.apply_fill(
+            symbol=_field(order, "symbol"),
+            side=_as_str(_field(order, "side")),
+            qty=_as_float(_field(update, "qty")),
+            price=_as_float(_field(update, "price")),
+            position_qty=_as_float(position_qty) if position_qty is not None else None,
+        )
+
+    def attach_trade_stream(self, stream: Any, subscribe: bool = True) -> None:
+        """Subscribes the state cache to a trade-update stream (alpaca TradingStream or LocalTradingStream).
+
+        subscribe=False is for callers that forward every update to handle_trade_update themselves,
+        so the fill lands in the cache on their thread rather than the stream's.
+        """
+        self._stream_attached = True
+        if not subscribe:
+            return
+        if isinstance(stream, LocalTradingStream):
+            stream.subscribe_trade_updates(self.handle_trade_update)
+            return
+
+        async def _on_trade_update(update):
+            self.handle_trade_update(update)
+
+        stream.subscribe_trade_updates(_on_trade_update)
+
 if __name__ == "__main__":
     # Example Usage:
     # Set ALPACA_API_KEY and ALPACA_SECRET_KEY environment variables before running
@@ -83,6 +302,16 @@ if __name__ == "__main__":
         # open_positions = alpaca_client.get_open_positions()
         # print("Open Positions:", open_positions)
 
+        # Per-symbol lookups and the full-book snapshot are served from the state cache
+        # print("AAPL qty:", alpaca_client.get_position_qty("AAPL"))
+        # print("Snapshot:", alpaca_client.get_state_snapshot())
+
+        # Keep the cache in sync with fills from the live trade-update stream
+        # from alpaca.trading.stream import TradingStream
+        # stream = TradingStream(alpaca_client.api_key, alpaca_client.secret_key, paper=True)
+        # alpaca_client.attach_trade_stream(stream)
+        # stream.run()
+
     except ValueError as e:
         print(f"Configuration Error: {e}")
     except Exception as e:
@@ -1,8 +1,13 @@
 import backtrader as bt
 import pandas as pd
+import numpy as np
+import pyarrow as pa
 import duckdb
 import os
-from typing import List
+from typing import Dict, List, Optional
+from ops.instrumentation import instrument, span
+from exec.feeds import ArrayFeed, load_ohlcv_arrow, trading_calendar
+from ingestion.security_master import SecurityMaster
 
 class CustomSizer(bt.Sizer): # Simple sizer for MVP
     params = (('stake', 1),)
@@ -54,10 +59,11 @@ class SimpleStrategy(bt.Strategy):
         current_symbol = self.data._name
 
         # Fetch alpha for current symbol and date from DuckDB view
-        conn = duckdb.connect(database='./data/trading.duckdb', read_only=True)
-        query = f"SELECT alpha, side FROM aggregated_signals WHERE date = '{current_date_str}' AND symbol = '{current_symbol}'"
-        result = conn.execute(query).fetchdf()
-        conn.close()
+        with span("SimpleStrategy.signal_lookup"):
+            conn = duckdb.connect(database='./data/trading.duckdb', read_only=True)
+            result = conn.execute("SELECT alpha, side FROM aggregated_signals WHERE date = ? AND symbol = ?",
+                                  [current_date_str, current_symbol]).fetchdf()
+            conn.close()
 
         if not result.empty:
             alpha_score = result['alpha'].iloc[0]
@@ -74,6 +80,113 @@ class SimpleStrategy(bt.Strategy):
             # If no signal for the day, remain in position or do nothing
             pass
 
+def target_weights(alpha: np.ndarray, min_alpha_buy: float = 0.5, max_alpha_sell: float = -0.5,
+                   gross_limit: float = 1.0, max_weight: float = 0.1, allow_short: bool = False) -> np.ndarray:
+    """Turns one cross-section of alpha into target weights.
+
+    Names with alpha above min_alpha_buy are longs; with allow_short, names below max_alpha_sell are shorts.
+    Every other name, and NaN alpha, gets zero weight, which exits any position it has: there is no HOLD
+    band that keeps an existing holding. Long-only (the default), max_alpha_sell is not used at all. The
+    selected alphas are scaled so that gross exposure equals gross_limit, then clipped to +/- max_weight
+    per name. Clipping is not redistributed, so gross exposure can end up below the limit but never above it.
+    """
+    alpha = np.nan_to_num(np.asarray(alpha, dtype=np.float64), nan=0.0)
+    raw = np.where(alpha > min_alpha_buy, alpha, 0.0)
+    if allow_short:
+        raw = np.where(alpha < max_alpha_sell, alpha, raw)
+
+    gross = np.abs(raw).sum()
+    if gross == 0:
+        return np.zeros_like(raw)
+    return np.clip(raw * (gross_limit / gross), -max_weight, max_weight)
+
+def target_shares(weights: np.ndarray, equity: float, prices: np.ndarray, current: np.ndarray) -> np.ndarray:
+    """Whole-share targets for target weights at the given prices.
+
+    Names without a usable price (no bar, NaN, non-positive) keep their current holding.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    tradable = np.isfinite(prices) & (prices > 0)
+    target = np.array(current, dtype=np.float64)
+    target[tradable] = np.trunc(np.asarray(weights)[tradable] * equity / prices[tradable])
+    return target
+
+class PortfolioStrategy(bt.Strategy):
+    """Cross-sectional target-weight strategy over all feeds.
+
+    Signals and closes are passed in as dense (dates x feeds) arrays aligned with the order of
+    cerebro.datas, so a rebalance is a handful of vectorized operations plus one order per name
+    whose share count actually changes.
+    """
+    params = (('signal_panel', None),    # np.ndarray (dates x feeds) of alpha
+              ('close_panel', None),     # np.ndarray (dates x feeds) of close prices
+              ('dates', None),           # sequence of datetime.date, row labels of both panels
+              ('member_panel', None),    # optional bool (dates x feeds): universe membership as of each date
+              ('min_alpha_buy', 0.5),
+              ('max_alpha_sell', -0.5),  # short threshold; unused unless allow_short
+              ('gross_limit', 1.0),
+              ('max_weight', 0.1),
+              ('allow_short', False),
+              ('rebalance_every', 1),    # bars between rebalances
+              ('min_trade_shares', 1))
+
+    def __init__(self):
+        self.date_index = {d: i for i, d in enumerate(self.p.dates)}
+        self.feed_index = {id(d): i for i, d in enumerate(self.datas)}
+        self.shares = np.zeros(len(self.datas), dtype=np.float64)
+        self.pending = 0
+        self.bar_count = 0
+        self.equity = []
+
+    def notify_order(self, order):
+        if order.status in [order.Submitted, order.Accepted]:
+            return
+        if order.status in [order.Completed]:
+            self.shares[self.feed_index[id(order.data)]] += order.executed.size
+        if order.status in [order.Completed, order.Canceled, order.Margin, order.Rejected]:
+            self.pending -= 1
+
+    def prenext(self):
+        # Backtrader holds next() back until every feed has a bar; a late listing or a name that joins the
+        # universe mid-range must not stop the rest of the book from trading
+        self.next()
+
+    def next(self):
+        # Feeds that have not started, or whose last bar is older than today, cannot be traded this bar
+        bar_dates = [data.datetime.date(0) if len(data) else None for data in self.datas]
+        current_date = max(d for d in bar_dates if d is not None)
+        self.equity.append((current_date, self.broker.getvalue()))
+
+        self.bar_count += 1
+        if self.pending or (self.bar_count - 1) % self.p.rebalance_every:
+            return
+
+        row = self.date_index.get(current_date)
+        if row is None:
+            return
+
+        live = np.array([d == current_date for d in bar_dates])
+        prices = np.where(live, self.p.close_panel[row], np.nan)
+        alpha = self.p.signal_panel[row]
+        if self.p.member_panel is not None:
+            # Names outside the universe on this date get no signal, so they are not bought and are exited
+            alpha = np.where(self.p.member_panel[row], alpha, np.nan)
+        weights = target_weights(alpha, self.p.min_alpha_buy, self.p.max_alpha_sell,
+                                 self.p.gross_limit, self.p.max_weight, self.p.allow_short)
+
+        # Untradable names (no bar today) keep their current holding
+        delta = target_shares(weights, self.equity[-1][1], prices, self.shares) - self.shares
+
+        to_trade = np.flatnonzero(np.abs(delta) >= self.p.min_trade_shares)
+        # Sells first so their proceeds are available to the buys in the same pass
+        for i in to_trade[np.argsort(delta[to_trade] > 0, kind='stable')]:
+            if delta[i] > 0:
+                self.buy(data=self.datas[i], size=delta[i])
+            else:
+                self.sell(data=self.datas[i], size=-delta[i])
+            self.pending += 1
+
+@instrument("run_backtest")
 def run_backtest(symbols: List[str], start_date: str, end_date: str, 
                  cash: float = 100000.0, commission: float = 0.001,
                  min_alpha_buy: float = 0.5, max_alpha_sell: float = -0.5) -> None:
@@ -86,27 +199,14 @@ def run_backtest(symbols: List[str], start_date: str, end_date: str,
     cerebro.addstrategy(SimpleStrategy, long_threshold=min_alpha_buy, short_threshold=max_alpha_sell)
     cerebro.addsizer(CustomSizer) # Add custom sizer
 
-    # Add data feeds
-    conn = duckdb.connect(database='./data/trading.duckdb', read_only=True)
+    # Add data feeds: one query for every symbol, split into per-symbol Arrow slices
+    with span("run_backtest.load_feeds", symbols=len(symbols)):
+        tables = load_ohlcv_arrow(symbols, start_date, end_date)
     for symbol in symbols:
-        query = f"SELECT date, open, high, low, close, volume FROM ohlcv_daily WHERE symbol = '{symbol}' AND date >= '{start_date}' AND date <= '{end_date}' ORDER BY date"
-        df_ohlcv = conn.execute(query).fetchdf()
-        if df_ohlcv.empty:
+        if symbol not in tables:
             print(f"No OHLCV data found for {symbol} in the specified date range. Skipping.")
             continue
-
-        df_ohlcv['date'] = pd.to_datetime(df_ohlcv['date'])
-        df_ohlcv = df_ohlcv.set_index('date')
-        df_ohlcv.columns = [col.capitalize() for col in df_ohlcv.columns] # Backtrader expects capitalized columns
-
-        data = bt.feeds.PandasData(
-            dataname=df_ohlcv,
-            fromdate=pd.to_datetime(start_date),
-            todate=pd.to_datetime(end_date),
-            name=symbol
-        )
-        cerebro.adddata(data)
-    conn.close()
+        cerebro.adddata(ArrayFeed(dataname=tables[symbol], name=symbol))
 
     if not cerebro.datas: # Check if any data feeds were added
         print("No data feeds added. Exiting backtest.")
@@ -119,6 +219,96 @@ def run_backtest(symbols: List[str], start_date: str, end_date: str,
     # You can also get analysis from cerebro if needed
     # cerebro.plot()
 
+def build_portfolio_cerebro(tables: Dict[str, pa.Table], signals: pd.DataFrame,
+                            cash: float = 100000.0, commission: float = 0.001,
+                            membership: Optional[pd.DataFrame] = None, **strategy_params) -> bt.Cerebro:
+    """Builds a Cerebro with one ArrayFeed per symbol and a PortfolioStrategy over aligned signal/close panels.
+
+    tables maps symbol -> date-sorted Arrow OHLCV table (date32 date plus FEED_FIELDS), as load_ohlcv_arrow
+    returns; signals is a long frame with date, symbol and alpha columns. membership is an optional boolean
+    (dates x symbols) frame, e.g. SecurityMaster.membership_frame, restricting trading to the universe
+    as of each date.
+    """
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.broker.setcash(cash)
+    cerebro.broker.setcommission(commission=commission)
+
+    symbols = list(tables)
+    for symbol in symbols:
+        cerebro.adddata(ArrayFeed(dataname=tables[symbol], name=symbol))
+
+    # Align prices and signals on one calendar x feed grid, in cerebro.datas order, by position in NumPy
+    calendar = trading_calendar(tables)
+    close_panel = np.full((len(calendar), len(symbols)), np.nan)
+    for j, symbol in enumerate(symbols):
+        rows = np.searchsorted(calendar, tables[symbol].column('date').to_numpy())
+        close_panel[rows, j] = tables[symbol].column('close').to_numpy()
+    dates = calendar.astype(object).tolist()
+    index = pd.DatetimeIndex(calendar)
+    if signals.empty:
+        signal_panel = np.full(close_panel.shape, np.nan)
+    else:
+        signal_panel = (signals.assign(date=pd.to_datetime(signals['date']))
+                        .pivot_table(index='date', columns='symbol', values='alpha', aggfunc='last')
+                        .reindex(index=index, columns=symbols)
+                        .to_numpy(dtype=np.float64))
+
+    member_panel = None
+    if membership is not None:
+        member_panel = membership.reindex(index=index, columns=symbols).fillna(False).to_numpy(dtype=bool)
+
+    cerebro.addstrategy(PortfolioStrategy, signal_panel=signal_panel, close_panel=close_panel, dates=dates,
+                        member_panel=member_panel, **strategy_params)
+    return cerebro
+
+@instrument("run_portfolio_backtest")
+def run_portfolio_backtest(symbols: Optional[List[str]], start_date: str, end_date: str,
+                           cash: float = 100000.0, commission: float = 0.001,
+                           min_alpha_buy: float = 0.5, max_alpha_sell: float = -0.5,
+                           gross_limit: float = 1.0, max_weight: float = 0.1,
+                           allow_short: bool = False, rebalance_every: int = 1,
+                           universe: Optional[str] = None) -> pd.Series:
+    """Runs a target-weight portfolio backtest across all symbols and returns the daily equity curve.
+
+    Prices come from ohlcv_daily as per-symbol Arrow tables (load_ohlcv_arrow). With universe set, symbols may be None (every symbol that was a member during the range) and each
+    date only trades that date's members, per the security master.
+    """
+    master = SecurityMaster.load() if universe is not None else None
+    if symbols is None:
+        symbols = master.members_between(universe, start_date, end_date)
+    with span("run_portfolio_backtest.load_feeds", symbols=len(symbols)):
+        tables = load_ohlcv_arrow(symbols, start_date, end_date)
+    for symbol in symbols:
+        if symbol not in tables:
+            print(f"No OHLCV data found for {symbol} in the specified date range. Skipping.")
+
+    conn = duckdb.connect(database='./data/trading.duckdb', read_only=True)
+    signals = conn.execute(
+        "SELECT date, symbol, alpha FROM aggregated_signals WHERE date >= ? AND date <= ?",
+        [start_date, end_date]
+    ).fetchdf()
+    conn.close()
+
+    if not tables:
+        print("No data feeds added. Exiting backtest.")
+        return pd.Series(dtype=float)
+
+    membership = None
+    if master is not None:
+        membership = master.membership_frame(universe, trading_calendar(tables), list(tables))
+
+    cerebro = build_portfolio_cerebro(tables, signals, cash=cash, commission=commission, membership=membership,
+                                      min_alpha_buy=min_alpha_buy, max_alpha_sell=max_alpha_sell,
+                                      gross_limit=gross_limit, max_weight=max_weight,
+                                      allow_short=allow_short, rebalance_every=rebalance_every)
+
+    print(f'Starting Portfolio Value: {cerebro.broker.getvalue():.2f}')
+    strategy = cerebro.run()[0]
+    print(f'Final Portfolio Value: {cerebro.broker.getvalue():.2f}')
+
+    dates, values = zip(*strategy.equity) if strategy.equity else ((), ())
+    return pd.Series(values, index=pd.to_datetime(list(dates)), name='portfolio_value')
+
 if __name__ == "__main__":
     # Example Usage:
     # This assumes ingest_market.py and decision/aggregator_v0.py have been run
@@ -140,3 +330,6 @@ if __name__ == "__main__":
     # This part would typically be handled by a complete daily flow script.
 
     run_backtest(symbols=["AAPL"], start_date="2023-01-01", end_date="2023-01-07")
+
+    # Multi-asset target-weight rebalancing across every feed
+    # equity_curve = run_portfolio_backtest(symbols=["AAPL", "MSFT"], start_date="2023-01-01", end_date="2023-03-31", max_weight=0.5)
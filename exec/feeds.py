@@ -0,0 +1,82 @@
+import datetime
+from typing import Dict, List, Optional
+import backtrader as bt
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+FEED_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+# Backtrader's date2num is the proleptic ordinal (plus the time of day), so a date32 day count maps to it by an offset
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+def load_ohlcv_arrow(symbols: List[str], start_date: str, end_date: str,
+                     conn: Optional[duckdb.DuckDBPyConnection] = None) -> Dict[str, pa.Table]:
+    """Every symbol's OHLCV over [start_date, end_date] from ohlcv_daily, in one parameterized query.
+
+    The result is fetched as a single Arrow table sorted by (symbol, date) and split into per-symbol
+    zero-copy slices, in the order of symbols; symbols without rows are left out. date is date32.
+    """
+    close_conn = conn is None
+    conn = conn or duckdb.connect(database='./data/trading.duckdb', read_only=True)
+    try:
+        table = conn.execute(
+            f"SELECT symbol, CAST(date AS DATE) AS date, {', '.join(FEED_FIELDS)} FROM ohlcv_daily "
+            "WHERE symbol IN (SELECT UNNEST(?)) AND CAST(date AS DATE) BETWEEN CAST(? AS DATE) AND CAST(? AS DATE) "
+            "ORDER BY symbol, date",
+            [list(symbols), start_date, end_date]
+        ).to_arrow_table()
+    finally:
+        if close_conn:
+            conn.close()
+
+    if table.num_rows == 0:
+        return {}
+    # One chunk, so each slice's columns convert to NumPy without copying
+    table = table.combine_chunks()
+    runs = pc.run_end_encode(table.column('symbol').chunk(0))
+    slices, start = {}, 0
+    for symbol, end in zip(runs.values.to_pylist(), runs.run_ends.to_pylist()):
+        slices[symbol] = table.slice(start, end - start).drop_columns(['symbol'])
+        start = end
+    return {symbol: slices[symbol] for symbol in symbols if symbol in slices}
+
+def slice_dates(table: pa.Table, start_date, end_date) -> pa.Table:
+    """Zero-copy slice of a date-sorted OHLCV table (as load_ohlcv_arrow returns) to [start_date, end_date]."""
+    days = table.column('date').to_numpy()
+    start = np.searchsorted(days, np.datetime64(start_date, 'D'), side='left')
+    end = np.searchsorted(days, np.datetime64(end_date, 'D'), side='right')
+    return table.slice(start, end - start)
+
+def trading_calendar(tables: Dict[str, pa.Table]) -> np.ndarray:
+    """Sorted datetime64[D] union of the dates in per-symbol OHLCV tables."""
+    if not tables:
+        return np.array([], dtype='datetime64[D]')
+    return np.unique(np.concatenate([table.column('date').to_numpy() for table in tables.values()]))
+
+class ArrayFeed(bt.feed.DataBase):
+    """Backtrader feed over one symbol's Arrow OHLCV slice (date32 date plus FEED_FIELDS), e.g. from load_ohlcv_arrow.
+
+    Columns are turned into NumPy arrays once in start() and _load only indexes them, instead of PandasData's
+    per-cell iloc lookups and Timestamp conversions. Bars land on the same datetime numbers PandasData gives
+    a midnight-indexed daily frame.
+    """
+
+    def start(self):
+        super().start()
+        table = self.p.dataname
+        self._datetimes = (table.column('date').combine_chunks().cast(pa.int32()).to_numpy().astype(np.float64)
+                           + EPOCH_ORDINAL)
+        self._fields = [(getattr(self.lines, field), table.column(field).to_numpy().astype(np.float64, copy=False))
+                        for field in FEED_FIELDS]
+        self._idx = -1
+
+    def _load(self):
+        self._idx += 1
+        if self._idx >= len(self._datetimes):
+            return False
+        for line, values in self._fields:
+            line[0] = values[self._idx]
+        self.lines.openinterest[0] = 0.0
+        self.lines.datetime[0] = self._datetimes[self._idx]
+        return True
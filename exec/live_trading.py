@@ -0,0 +1,513 @@
+import argparse
+import asyncio
+import collections
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+import numpy as np
+import pandas as pd
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+from ops.instrumentation import observe, increment
+from decision.aggregator_v0 import compute_alpha
+from exec.backtester import target_weights, target_shares
+from exec.alpaca_client import AlpacaClient, LocalTradingStream, _as_float, _as_str, _field
+from features.news_sentiment import DEFAULT_CUTOFF, EXCHANGE_TZ
+from ingestion.price_panel import load_ohlcv_frames
+
+# Momentum lookback in sessions, matching r20 in features/daily.py (close / close 20 sessions ago - 1)
+R20_WINDOW = 20
+# Order events after which the broker will not fill the remaining quantity
+TERMINAL_EVENTS = ("canceled", "expired", "rejected")
+
+# Events carry received_at (time.perf_counter() when the event entered the process), so latency is measured
+# from arrival to order acknowledgement, independent of exchange timestamps and clock skew.
+class BarEvent:
+    __slots__ = ('symbol', 'ts', 'close', 'received_at')
+
+    def __init__(self, symbol: str, ts: pd.Timestamp, close: float, received_at: Optional[float] = None):
+        self.symbol = symbol
+        self.ts = ts
+        self.close = close
+        self.received_at = received_at if received_at is not None else time.perf_counter()
+
+class NewsEvent:
+    __slots__ = ('symbols', 'ts', 'title', 'received_at')
+
+    def __init__(self, symbols: Sequence[str], ts: pd.Timestamp, title: str, received_at: Optional[float] = None):
+        self.symbols = list(symbols)
+        self.ts = ts
+        self.title = title
+        self.received_at = received_at if received_at is not None else time.perf_counter()
+
+def _session_of(ts: pd.Timestamp, cutoff: Optional[str] = None) -> pd.Timestamp:
+    """Exchange-local session date of a UTC timestamp; with cutoff, times at or after it count toward the next day."""
+    local = pd.Timestamp(ts).tz_convert(EXCHANGE_TZ)
+    session = local.normalize().tz_localize(None)
+    if cutoff is not None and local.strftime('%H:%M:%S') >= cutoff:
+        session += pd.Timedelta(days=1)
+    return session
+
+class SymbolState:
+    """Incremental features for one symbol: prior session closes for r20 and the session's news sentiment."""
+
+    __slots__ = ('closes', 'session', 'last_price', 'conf_sent', 'conf', 'pending_news')
+
+    def __init__(self):
+        self.closes: Deque[float] = collections.deque(maxlen=R20_WINDOW)
+        self.session: Optional[pd.Timestamp] = None
+        self.last_price = np.nan
+        self.conf_sent = 0.0
+        self.conf = 0.0
+        # (news_date, sentiment, confidence) for articles that count toward a later session
+        self.pending_news: List[Tuple[pd.Timestamp, float, float]] = []
+
+    def roll(self, session: pd.Timestamp) -> None:
+        """Starts a new session: commits the previous session's last price as its close and resets news."""
+        if self.session is not None and np.isfinite(self.last_price):
+            self.closes.append(self.last_price)
+        self.session = session
+        self.conf_sent = self.conf = 0.0
+        due = [item for item in self.pending_news if item[0] <= session]
+        self.pending_news = [item for item in self.pending_news if item[0] > session]
+        for _, sentiment, confidence in due:
+            self.add_news(sentiment, confidence)
+
+    def add_news(self, sentiment: float, confidence: float) -> None:
+        self.conf_sent += confidence * sentiment
+        self.conf += confidence
+
+    @property
+    def r20(self) -> float:
+        if len(self.closes) < R20_WINDOW or not np.isfinite(self.last_price):
+            return np.nan
+        return self.last_price / self.closes[0] - 1
+
+    @property
+    def news_sent(self) -> float:
+        # Confidence-weighted mean, as news_sent in features/news_sentiment.py
+        return self.conf_sent / self.conf if self.conf > 0 else np.nan
+
+class ReplaySource:
+    """Replays stored minute bars and news headlines as events in timestamp order.
+
+    speed=0 replays as fast as the service consumes; speed=60 plays one market minute per wall-clock second.
+    Events are stamped as they are handed to the service, so at speed=0 latency includes time spent queued
+    behind the previous event.
+    """
+
+    def __init__(self, df_bars: Optional[pd.DataFrame] = None, df_news: Optional[pd.DataFrame] = None,
+                 speed: float = 0.0):
+        self.df_bars = df_bars if df_bars is not None else pd.DataFrame(columns=['ts', 'symbol', 'close'])
+        self.df_news = df_news if df_news is not None else pd.DataFrame(columns=['ts', 'symbol', 'title'])
+        self.speed = speed
+
+    @classmethod
+    def from_lake(cls, symbols: List[str], start_ts: str, end_ts: str, speed: float = 0.0) -> 'ReplaySource':
+        """Minute bars from the intraday lake and normalized news from data/lake/news_norm for [start_ts, end_ts)."""
+        import duckdb
+        from ingestion.ingest_intraday import load_intraday_bars
+        df_bars = load_intraday_bars(symbols, start_ts, end_ts, columns=['ts', 'symbol', 'close'])
+        conn = duckdb.connect()
+        conn.execute("SET TimeZone = 'UTC'")
+        try:
+            df_news = conn.execute(
+                "SELECT CAST(ts AS TIMESTAMPTZ) AS ts, symbol, title FROM parquet_scan('data/lake/news_norm/*.parquet') "
+                "WHERE symbol IN (SELECT UNNEST(?)) AND CAST(ts AS TIMESTAMPTZ) >= ? AND CAST(ts AS TIMESTAMPTZ) < ?",
+                [symbols, pd.Timestamp(start_ts, tz='UTC').to_pydatetime(), pd.Timestamp(end_ts, tz='UTC').to_pydatetime()]
+            ).fetchdf()
+        except duckdb.Error:
+            df_news = None
+        conn.close()
+        return cls(df_bars, df_news, speed=speed)
+
+    def _events(self) -> List[Tuple[pd.Timestamp, int, Any]]:
+        bars = self.df_bars
+        bar_ts = pd.to_datetime(bars['ts'], utc=True)
+        events = [(ts, 1, BarEvent(symbol, ts, float(close), received_at=0.0))
+                  for ts, symbol, close in zip(bar_ts, bars['symbol'], bars['close'])]
+        news = self.df_news
+        news_ts = pd.to_datetime(news['ts'], utc=True)
+        # News sorts ahead of a bar with the same timestamp, so that bar already reflects it
+        events.extend((ts, 0, NewsEvent([symbol], ts, title, received_at=0.0))
+                      for ts, symbol, title in zip(news_ts, news['symbol'], news['title']))
+        events.sort(key=lambda item: (item[0], item[1]))
+        return events
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        events = self._events()
+        start_wall, start_ts = time.perf_counter(), events[0][0] if events else None
+        for ts, _, event in events:
+            if self.speed > 0:
+                delay = (ts - start_ts).total_seconds() / self.speed - (time.perf_counter() - start_wall)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            event.received_at = time.perf_counter()
+            yield event
+
+class AlpacaStreamSource:
+    """Live minute bars and news from alpaca's market-data websockets.
+
+    The alpaca streams run their own event loop, so they are started on a daemon thread and hand events
+    to the service's loop with call_soon_threadsafe.
+    """
+
+    def __init__(self, api_key: str, secret_key: str, symbols: List[str], news: bool = True):
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.symbols = list(symbols)
+        self.news = news
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        from alpaca.data.live import StockDataStream, NewsDataStream
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def _on_bar(bar):
+            event = BarEvent(bar.symbol, pd.Timestamp(bar.timestamp).tz_convert('UTC'), float(bar.close))
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+        async def _on_news(news):
+            event = NewsEvent(news.symbols, pd.Timestamp(news.created_at).tz_convert('UTC'), news.headline)
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+        streams = [StockDataStream(self.api_key, self.secret_key)]
+        streams[0].subscribe_bars(_on_bar, *self.symbols)
+        if self.news:
+            streams.append(NewsDataStream(self.api_key, self.secret_key))
+            streams[1].subscribe_news(_on_news, *self.symbols)
+        for stream in streams:
+            threading.Thread(target=stream.run, daemon=True).start()
+
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            for stream in streams:
+                stream.stop()
+
+def finbert_sentiment_fn(model_name: str = "ProsusAI/finbert") -> Callable[[List[str]], Tuple[np.ndarray, np.ndarray]]:
+    """Headline scorer backed by FinbertSentimentAgent; the model is loaded on first use."""
+    agent = None
+
+    def score(titles: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        nonlocal agent
+        if agent is None:
+            from agents.sentiment.finbert_agent import FinbertSentimentAgent
+            agent = FinbertSentimentAgent(model_name)
+        df = agent.run_sentiment(pd.DataFrame({'ts': None, 'symbol': None, 'title': titles}))
+        return df['news_sent'].to_numpy(dtype=np.float64), df['news_conf'].to_numpy(dtype=np.float64)
+
+    return score
+
+class LiveTradingService:
+    """Event-driven paper/live trading loop.
+
+    Each bar or news event updates the incremental features of the symbols it names, re-scores them with
+    compute_alpha, sizes the whole cross-section with the backtester's target_weights/target_shares, and sends
+    an order for the affected symbol only when its whole-share target moved. Orders go through AlpacaClient
+    on the default executor, so a slow broker round trip never blocks the next event.
+    """
+
+    def __init__(self, client: AlpacaClient, symbols: List[str],
+                 sentiment_fn: Optional[Callable[[List[str]], Tuple[np.ndarray, np.ndarray]]] = None,
+                 min_alpha_buy: float = 0.5, max_alpha_sell: float = -0.5, gross_limit: float = 1.0,
+                 max_weight: float = 0.1, allow_short: bool = False, min_trade_shares: int = 1,
+                 cutoff: str = DEFAULT_CUTOFF, latency_window: int = 10_000):
+        self.client = client
+        self.symbols = list(symbols)
+        self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.states = [SymbolState() for _ in self.symbols]
+        self.alpha = np.full(len(self.symbols), np.nan)
+        self.sentiment_fn = sentiment_fn or finbert_sentiment_fn()
+        self.min_alpha_buy = min_alpha_buy
+        self.max_alpha_sell = max_alpha_sell
+        self.gross_limit = gross_limit
+        self.max_weight = max_weight
+        self.allow_short = allow_short
+        self.min_trade_shares = min_trade_shares
+        self.cutoff = cutoff
+        # Signed quantity sent to the broker but not yet filled, per symbol. Sizing counts it as held,
+        # so a burst of events cannot stack duplicate orders before the first one fills.
+        self.pending = np.zeros(len(self.symbols))
+        self._open_orders: Dict[str, Tuple[str, float]] = {}
+        self.latencies_ms: Deque[float] = collections.deque(maxlen=latency_window)
+        self.orders: List[dict] = []
+        self._order_tasks: set = set()
+        # The loop run() is consuming on, so trade-stream threads can hand fills to it
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def warm_start(self, as_of: Optional[str] = None) -> None:
+        """Seeds each symbol's prior session closes from the price panel / ohlcv_daily, up to as_of (default today)."""
+        end = pd.Timestamp(as_of or pd.Timestamp.now().date())
+        # Calendar slack so R20_WINDOW sessions are covered across weekends and holidays
+        start = end - pd.Timedelta(days=R20_WINDOW * 2 + 10)
+        frames = load_ohlcv_frames(self.symbols, start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+        for symbol, df in frames.items():
+            state = self.states[self._index[symbol]]
+            closes = df.loc[df.index < end, 'Close'].to_numpy()
+            state.closes.extend(closes[-R20_WINDOW:])
+            if len(closes):
+                state.last_price = closes[-1]
+        # A first bar of the as_of session rolls the state without re-committing the last warm close
+        for state in self.states:
+            state.session = None
+
+    def attach_trade_stream(self, stream: Any) -> None:
+        """Keeps both the client's position cache and the service's pending quantities in sync with fills.
+
+        The service is the stream's only subscriber and forwards each update to the client from
+        _apply_trade_update, so a fill moves the cached position and the pending quantity in one step.
+        """
+        self.client.attach_trade_stream(stream, subscribe=False)
+        if isinstance(stream, LocalTradingStream):
+            stream.subscribe_trade_updates(self.handle_trade_update)
+            return
+
+        async def _on_trade_update(update):
+            self.handle_trade_update(update)
+
+        stream.subscribe_trade_updates(_on_trade_update)
+
+    def handle_trade_update(self, update: Any) -> None:
+        """Applies a trade update to the position cache and pending quantities; safe to call from the stream's thread.
+
+        While run() is active the update is handed to the service's loop with call_soon_threadsafe, so it
+        never interleaves with sizing or order registration.
+        """
+        loop = self._loop
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if loop is not None and loop.is_running() and current is not loop:
+            loop.call_soon_threadsafe(self._apply_trade_update, update)
+        else:
+            self._apply_trade_update(update)
+
+    def _apply_trade_update(self, update: Any) -> None:
+        # Every fill reaches the position cache, including orders this service did not send
+        self.client.handle_trade_update(update)
+        event = _as_str(_field(update, "event"))
+        order = _field(update, "order")
+        # Orders are registered under their client_order_id before they are sent, so a fill that arrives
+        # ahead of the broker's acknowledgement still finds its order
+        order_id = str(_field(order, "client_order_id"))
+        if order_id not in self._open_orders:
+            return
+        symbol, remaining = self._open_orders[order_id]
+        i = self._index[symbol]
+        if event in ("fill", "partial_fill"):
+            filled = _as_float(_field(update, "qty"))
+            filled = filled if remaining > 0 else -filled
+            self.pending[i] -= filled
+            remaining -= filled
+        if event == "fill" or event in TERMINAL_EVENTS:
+            self.pending[i] -= remaining
+            del self._open_orders[order_id]
+        else:
+            self._open_orders[order_id] = (symbol, remaining)
+
+    def _on_bar(self, event: BarEvent) -> List[int]:
+        i = self._index.get(event.symbol)
+        if i is None:
+            return []
+        state = self.states[i]
+        session = _session_of(event.ts)
+        if state.session is None or session > state.session:
+            state.roll(session)
+        state.last_price = event.close
+        return [i]
+
+    async def _on_news(self, event: NewsEvent) -> List[int]:
+        affected = [self._index[symbol] for symbol in event.symbols if symbol in self._index]
+        if not affected:
+            return []
+        loop = asyncio.get_running_loop()
+        # Model inference is CPU-bound; keep it off the event loop
+        sentiment, confidence = await loop.run_in_executor(None, self.sentiment_fn, [event.title])
+        news_date = _session_of(event.ts, self.cutoff)
+        for i in affected:
+            state = self.states[i]
+            if state.session is not None and news_date <= state.session:
+                state.add_news(float(sentiment[0]), float(confidence[0]))
+            else:
+                state.pending_news.append((news_date, float(sentiment[0]), float(confidence[0])))
+        return affected
+
+    async def _rebalance(self, affected: List[int], received_at: float) -> None:
+        for i in affected:
+            state = self.states[i]
+            self.alpha[i] = compute_alpha({'news_sent': state.news_sent, 'r20': state.r20})
+        weights = target_weights(self.alpha, self.min_alpha_buy, self.max_alpha_sell,
+                                 self.gross_limit, self.max_weight, self.allow_short)
+        loop = asyncio.get_running_loop()
+        # A stale cache refreshes over the network; keep that round trip off the event loop. The book is
+        # then read back on the loop, where fills land, so positions and pending reflect the same fills.
+        try:
+            await loop.run_in_executor(None, self.client.refresh_state)
+            snapshot = self.client.get_state_snapshot(refresh=False)
+        except Exception as e:
+            print(f"Skipping rebalance: could not load account state: {e}")
+            increment("live.rebalance_skipped")
+            return
+        if "error" in snapshot:
+            print(f"Skipping rebalance: could not load account state: {snapshot['error']}")
+            increment("live.rebalance_skipped")
+            return
+        equity = snapshot["account"].get("equity")
+        # Sizing against a missing or zero equity would target zero shares and liquidate the book
+        if equity is None or _as_float(equity) <= 0:
+            print(f"Skipping rebalance: account equity is {equity!r}")
+            increment("live.rebalance_skipped")
+            return
+
+        idx = np.asarray(affected)
+        prices = np.array([self.states[i].last_price for i in affected])
+        positions = snapshot["positions"]
+        held = np.array([positions[self.symbols[i]]["qty"] if self.symbols[i] in positions else 0.0
+                         for i in affected]) + self.pending[idx]
+        delta = target_shares(weights[idx], _as_float(equity), prices, held) - held
+        for i, qty in zip(affected, delta):
+            if abs(qty) < self.min_trade_shares:
+                continue
+            self.pending[i] += qty
+            task = asyncio.ensure_future(self._submit(i, qty, received_at))
+            self._order_tasks.add(task)
+            task.add_done_callback(self._order_tasks.discard)
+
+    async def _submit(self, i: int, qty: float, received_at: float) -> None:
+        symbol, side = self.symbols[i], "BUY" if qty > 0 else "SELL"
+        client_order_id = uuid.uuid4().hex
+        self._open_orders[client_order_id] = (symbol, qty)
+        loop = asyncio.get_running_loop()
+        order = await loop.run_in_executor(None, self.client.place_market_order, symbol, abs(qty), side,
+                                           client_order_id)
+        latency_ms = (time.perf_counter() - received_at) * 1000
+        self.latencies_ms.append(latency_ms)
+        observe("live.signal_to_order_ms", latency_ms)
+        if "error" in order:
+            # A rejection on the trade stream may already have released the quantity
+            if self._open_orders.pop(client_order_id, None) is not None:
+                self.pending[i] -= qty
+            increment("live.order_errors")
+            return
+        increment("live.orders")
+        self.orders.append({"symbol": symbol, "qty": abs(qty), "side": side, "id": order.get("id"),
+                            "client_order_id": client_order_id, "latency_ms": latency_ms})
+
+    async def handle(self, event: Any) -> None:
+        """Processes one event end to end (features, score, sizing, order dispatch)."""
+        if isinstance(event, BarEvent):
+            affected = self._on_bar(event)
+        else:
+            affected = await self._on_news(event)
+        increment("live.events")
+        if affected:
+            await self._rebalance(affected, event.received_at)
+
+    async def run(self, *sources: Any, until: Optional[pd.Timestamp] = None) -> None:
+        """Consumes events from all sources until they are exhausted (or until, wall-clock UTC), then drains orders.
+
+        Events are handled one at a time in arrival order, so per-symbol state never races.
+        """
+        # Bounded, so a fast replay is paced by the consumer instead of buffering the whole day
+        self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=len(sources))
+        done = object()
+
+        async def _pump(source):
+            try:
+                async for event in source:
+                    await queue.put(event)
+            finally:
+                await queue.put(done)
+
+        pumps = [asyncio.ensure_future(_pump(source)) for source in sources]
+        remaining = len(pumps)
+        try:
+            while remaining:
+                timeout = None
+                if until is not None:
+                    timeout = (until - pd.Timestamp.now(tz='UTC')).total_seconds()
+                    if timeout <= 0:
+                        break
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if event is done:
+                    remaining -= 1
+                    continue
+                await self.handle(event)
+        finally:
+            for pump in pumps:
+                pump.cancel()
+            if self._order_tasks:
+                await asyncio.gather(*self._order_tasks)
+            # Let fills marshalled while the last orders were in flight land before the loop goes away
+            await asyncio.sleep(0)
+            self._loop = None
+
+    def latency_summary(self) -> Dict[str, float]:
+        """count/p50/p95/p99/max of event-arrival-to-order-acknowledged latency, in milliseconds."""
+        if not self.latencies_ms:
+            return {"count": 0, "p50": np.nan, "p95": np.nan, "p99": np.nan, "max": np.nan}
+        values = np.fromiter(self.latencies_ms, dtype=np.float64)
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return {"count": len(values), "p50": p50, "p95": p95, "p99": p99, "max": values.max()}
+
+def run_live_trading(symbols: List[str], until: Optional[pd.Timestamp] = None, replay: Optional[ReplaySource] = None,
+                     client: Optional[AlpacaClient] = None, **service_kwargs) -> LiveTradingService:
+    """Warm-starts a LiveTradingService and runs it on alpaca's live streams (or a replay) until `until`."""
+    client = client or AlpacaClient()
+    service = LiveTradingService(client, symbols, **service_kwargs)
+    service.warm_start()
+    if replay is not None:
+        sources = [replay]
+    else:
+        from alpaca.trading.stream import TradingStream
+        trade_stream = TradingStream(client.api_key, client.secret_key, paper=client.paper)
+        service.attach_trade_stream(trade_stream)
+        threading.Thread(target=trade_stream.run, daemon=True).start()
+        sources = [AlpacaStreamSource(client.api_key, client.secret_key, symbols)]
+    asyncio.run(service.run(*sources, until=until))
+    print(f"Live trading stopped after {len(service.orders)} orders; signal-to-order latency: {service.latency_summary()}")
+    return service
+
+def session_close() -> pd.Timestamp:
+    """Today's 16:00 exchange close, in UTC."""
+    close = pd.Timestamp.now(tz=EXCHANGE_TZ).normalize() + pd.Timedelta(hours=16)
+    return close.tz_convert('UTC')
+
+def start_live_trading(symbols: List[str], until: Optional[pd.Timestamp] = None,
+                       log_path: Optional[str] = None) -> subprocess.Popen:
+    """Starts run_live_trading in its own detached process (this module's entry point) and returns at once.
+
+    The service runs until `until` (default today's close) independently of the caller, so a scheduler
+    flow can hand off to it without holding a worker for the whole session. Output goes to log_path
+    (default logs/live_trading_<date>.log).
+    """
+    until = until if until is not None else session_close()
+    log_path = log_path or os.path.join('logs', f"live_trading_{until.strftime('%Y-%m-%d')}.log")
+    os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+    with open(log_path, 'ab') as log:
+        return subprocess.Popen([sys.executable, '-m', 'exec.live_trading', '--until', until.isoformat(), *symbols],
+                                stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if __name__ == "__main__":
+    # Set ALPACA_API_KEY and ALPACA_SECRET_KEY, then paper trade until today's close:
+    #   python -m exec.live_trading AAPL MSFT
+    parser = argparse.ArgumentParser(description="Event-driven paper trading on alpaca's live streams.")
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--until', help="UTC stop time (ISO 8601); default today's 16:00 New York close")
+    args = parser.parse_args()
+    run_live_trading(args.symbols, until=pd.Timestamp(args.until) if args.until else session_close())
+
+    # Replay yesterday's stored minute bars and news through the same path
+    # replay = ReplaySource.from_lake(["AAPL", "MSFT"], "2024-01-02", "2024-01-03")
+    # run_live_trading(["AAPL", "MSFT"], replay=replay)
@@ -1,15 +1,19 @@
 import pandas as pd
 import duckdb
 import os
+from ops.instrumentation import instrument, span, increment
+from features.news_sentiment import calculate_news_features
+from ingestion.security_master import encode_symbols
+from ingestion.writers import write_parquet
 
+@instrument("calculate_daily_features")
 def calculate_daily_features() -> None:
-    """Calculate daily features like RSI14 and 20-day return, and write to data/lake/features/daily."""
+    """Calculate daily features like RSI14 and 20-day return, join news sentiment features, and write to data/lake/features/daily."""
 
     conn = duckdb.connect(database='./data/trading.duckdb', read_only=False)
 
-    # Ensure ohlcv_daily and news_norm views are registered
+    # Ensure the ohlcv_daily view is registered; news comes in already scored via calculate_news_features
     conn.execute("CREATE OR REPLACE VIEW ohlcv_daily AS SELECT * FROM parquet_scan('data/lake/ohlcv/**/*.parquet');")
-    conn.execute("CREATE OR REPLACE VIEW news_norm AS SELECT * FROM parquet_scan('data/lake/news_norm/*.parquet');")
 
     # Calculate 20-day return (r20)
     # Using SQL for simplicity and leveraging DuckDB's window functions
@@ -28,7 +32,8 @@ def calculate_daily_features() -> None:
     FROM r20_calc
     WHERE r20 IS NOT NULL
     """
-    df_r20 = conn.execute(r20_query).fetchdf()
+    with span("calculate_daily_features.r20_query"):
+        df_r20 = conn.execute(r20_query).fetchdf()
 
     # Calculate RSI14
     # RSI calculation is more complex in SQL, often easier in Python/Pandas
@@ -48,25 +53,31 @@ def calculate_daily_features() -> None:
         rsi = 100 - (100 / (1 + rs))
         return rsi
 
-    df_rsi = ohlcv_data.groupby(level='symbol')['close'].apply(lambda x: calculate_rsi(x, 14)).reset_index()
-    df_rsi.rename(columns={0: 'rsi14'}, inplace=True)
+    with span("calculate_daily_features.rsi14", rows=len(ohlcv_data)):
+        # group_keys=False keeps the (symbol, date) index instead of prepending a second symbol level
+        df_rsi = ohlcv_data.groupby(level='symbol', group_keys=False)['close'].apply(lambda x: calculate_rsi(x, 14))
+    df_rsi = df_rsi.rename('rsi14').reset_index()
 
     # Merge r20 and rsi14
     df_features = pd.merge(df_r20, df_rsi, on=['date', 'symbol'], how='left')
 
-    # Placeholder for news sentiment, which will be joined later
-    # For now, let's assume news_sent and news_conf are not yet available from an agent
-    # We'll join with news_norm if we want to include news features directly here for testing
-
-    # Create the output directory if it doesn't exist
-    output_dir = 'data/lake/features/daily'
-    os.makedirs(output_dir, exist_ok=True)
+    # Join session-aligned news sentiment (news_sent, news_conf, news_count, news_sent_decay)
+    conn.close()
+    df_news = calculate_news_features()
+    df_news['date'] = pd.to_datetime(df_news['date'])
+    df_features = pd.merge(df_features, df_news, on=['date', 'symbol'], how='left')
+    df_features['news_count'] = df_features['news_count'].fillna(0).astype('int64')
 
     # Write to Parquet
-    df_features.to_parquet(os.path.join(output_dir, 'features_daily.parquet'), index=False)
+    output_dir = 'data/lake/features/daily'
+    with span("calculate_daily_features.write_parquet", rows=len(df_features)):
+        # symbol is stored dictionary-encoded next to its int32 symbol_id from the security master
+        write_parquet(encode_symbols(df_features), os.path.join(output_dir, 'features_daily.parquet'), 'features_daily')
+    increment("calculate_daily_features.rows", len(df_features))
     print(f"Successfully calculated daily features and saved to {output_dir}/features_daily.parquet")
 
     # Register in DuckDB
+    conn = duckdb.connect(database='./data/trading.duckdb', read_only=False)
     conn.execute("CREATE OR REPLACE VIEW features_daily AS SELECT * FROM parquet_scan('data/lake/features/daily/*.parquet');")
     conn.close()
 
@@ -0,0 +1,86 @@
+import pandas as pd
+import duckdb
+from typing import List, Optional
+from ops.instrumentation import instrument, increment
+
+FUNDAMENTAL_COLUMNS = ['revenue', 'netIncome', 'eps', 'totalAssets', 'totalLiabilities', 'cashFlowFromOperatingActivities']
+
+# Filings accepted up to the close of a session count as known for that session's features
+DEFAULT_CUTOFF = '16:00:00'
+
+def _asof_query(columns: List[str], where: str = "") -> str:
+    # timeline has one row per (symbol, moment a filing became available) holding what was known best at that
+    # moment: the latest fiscal period available by then, in its most recent restatement. A late restatement of
+    # an older quarter is a timeline event too, but it does not displace a newer quarter already known.
+    timeline_columns = ", ".join(f"c.{col}" for col in columns)
+    selected = ", ".join(f"fu.{col}" for col in columns)
+    return f"""
+    WITH timeline AS (
+      SELECT e.symbol, e.available_at AS known_at, c.date, c.available_at, {timeline_columns}
+      FROM (SELECT DISTINCT symbol, available_at FROM fundamentals) e
+      JOIN fundamentals c
+        ON c.symbol = e.symbol
+       AND c.available_at <= e.available_at
+      QUALIFY row_number() OVER (PARTITION BY e.symbol, e.available_at ORDER BY c.date DESC, c.available_at DESC) = 1
+    )
+    SELECT
+      f.*,
+      {selected},
+      fu.date AS fundamentals_period_end,
+      fu.available_at AS fundamentals_available_at
+    FROM features_daily f
+    ASOF LEFT JOIN timeline fu
+      ON f.symbol = fu.symbol
+     AND CAST(f.date AS TIMESTAMP) + CAST(? AS INTERVAL) >= fu.known_at
+    {where}
+    ORDER BY f.date, f.symbol
+    """
+
+@instrument("load_features_with_fundamentals")
+def load_features_with_fundamentals(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                                    columns: Optional[List[str]] = None, cutoff: str = DEFAULT_CUTOFF) -> pd.DataFrame:
+    """Attaches the latest fundamentals known as of each (date, symbol) in features_daily, without look-ahead.
+
+    Among filings whose available_at is at or before date + cutoff, a row gets the latest fiscal period, in that
+    period's most recent restatement; a restated older quarter never replaces a newer one. Filings are first
+    collapsed into a per-symbol timeline of what was known when, which one DuckDB ASOF JOIN then matches to
+    every feature row. Rows with no filing known yet keep NULL fundamentals.
+    """
+    columns = columns or FUNDAMENTAL_COLUMNS
+
+    conn = duckdb.connect(database='./data/trading.duckdb', read_only=False)
+    conn.execute("CREATE OR REPLACE VIEW features_daily AS SELECT * FROM parquet_scan('data/lake/features/daily/*.parquet');")
+    conn.execute("CREATE OR REPLACE VIEW fundamentals AS SELECT * FROM parquet_scan('data/lake/fundamentals/*.parquet');")
+
+    params: list = [cutoff]
+    conditions = []
+    if start_date is not None:
+        conditions.append("f.date >= CAST(? AS DATE)")
+        params.append(start_date)
+    if end_date is not None:
+        conditions.append("f.date <= CAST(? AS DATE)")
+        params.append(end_date)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    df = conn.execute(_asof_query(columns, where), params).fetchdf()
+    conn.close()
+
+    increment("load_features_with_fundamentals.rows", len(df))
+    return df
+
+def register_features_fundamentals_view(cutoff: str = DEFAULT_CUTOFF) -> None:
+    """Registers features_fundamentals_pit in DuckDB: features_daily with point-in-time fundamentals attached."""
+    conn = duckdb.connect(database='./data/trading.duckdb', read_only=False)
+    conn.execute("CREATE OR REPLACE VIEW features_daily AS SELECT * FROM parquet_scan('data/lake/features/daily/*.parquet');")
+    conn.execute("CREATE OR REPLACE VIEW fundamentals AS SELECT * FROM parquet_scan('data/lake/fundamentals/*.parquet');")
+    # Views cannot take parameters, so the cutoff is inlined after validating it parses as a time
+    cutoff = pd.Timestamp(f"2000-01-01 {cutoff}").strftime('%H:%M:%S')
+    query = _asof_query(FUNDAMENTAL_COLUMNS).replace("CAST(? AS INTERVAL)", f"INTERVAL '{cutoff}'")
+    conn.execute(f"CREATE OR REPLACE VIEW features_fundamentals_pit AS {query}")
+    conn.close()
+
+if __name__ == "__main__":
+    # Example Usage:
+    # Requires features/daily.py and ingestion/ingest_fundamentals.py to have populated the lake
+    df = load_features_with_fundamentals(start_date="2023-01-01")
+    print(df.head())
@@ -0,0 +1,104 @@
+import glob
+import os
+import duckdb
+import pandas as pd
+from ops.instrumentation import instrument, span, increment
+from ingestion.writers import write_parquet
+
+NEWS_SENTIMENT_DIR = 'data/lake/news_sentiment'
+NEWS_FEATURE_COLUMNS = ['news_sent', 'news_conf', 'news_count', 'news_sent_decay']
+
+# News stamped at or after the close counts toward the next session (exchange-local time)
+DEFAULT_CUTOFF = '16:00:00'
+EXCHANGE_TZ = 'America/New_York'
+
+def write_news_sentiment(df_sentiment: pd.DataFrame, output_path: str = NEWS_SENTIMENT_DIR) -> int:
+    """Writes article-level sentiment (ts, symbol, news_sent, news_conf) as one partition per UTC date.
+
+    Partitions for the dates present in df_sentiment are replaced, so re-scoring a day is idempotent.
+    Returns rows written.
+    """
+    if df_sentiment.empty:
+        return 0
+
+    df = df_sentiment[['ts', 'symbol', 'news_sent', 'news_conf']].copy()
+    df['ts'] = pd.to_datetime(df['ts'], utc=True)
+    for day, df_day in df.groupby(df['ts'].dt.strftime('%Y-%m-%d')):
+        write_parquet(df_day, os.path.join(output_path, day, 'sentiment.parquet'), 'news_sentiment')
+    return len(df)
+
+def _news_features_query(decay_sessions: int, half_life: float) -> str:
+    # Exponential weights over the last decay_sessions sessions, unrolled into LAG terms of one window
+    weights = [0.5 ** (k / half_life) for k in range(decay_sessions)]
+    window = "OVER (PARTITION BY symbol ORDER BY date)"
+    decayed_sum = " + ".join(f"{w!r} * COALESCE(LAG(conf_sent, {k}) {window}, 0)" for k, w in enumerate(weights))
+    decayed_conf = " + ".join(f"{w!r} * COALESCE(LAG(conf, {k}) {window}, 0)" for k, w in enumerate(weights))
+    return f"""
+    WITH sessions AS (
+      SELECT DISTINCT symbol, CAST(date AS DATE) AS date FROM ohlcv_daily
+    ),
+    articles AS (
+      SELECT symbol, news_sent, news_conf, timezone(?, CAST(ts AS TIMESTAMPTZ)) AS local_ts
+      FROM news_sentiment
+    ),
+    tagged AS (
+      SELECT
+        symbol, news_sent, news_conf,
+        CAST(local_ts AS DATE) + CASE WHEN CAST(local_ts AS TIME) >= CAST(? AS TIME) THEN 1 ELSE 0 END AS news_date
+      FROM articles
+    ),
+    assigned AS (
+      -- Weekend, holiday and after-close news lands on the next session the symbol trades
+      SELECT t.symbol, t.news_sent, t.news_conf, s.date
+      FROM tagged t
+      ASOF JOIN sessions s ON t.symbol = s.symbol AND t.news_date <= s.date
+    ),
+    daily AS (
+      SELECT symbol, date, SUM(news_conf * news_sent) AS conf_sent, SUM(news_conf) AS conf, COUNT(*) AS news_count
+      FROM assigned
+      GROUP BY symbol, date
+    ),
+    grid AS (
+      SELECT s.date, s.symbol, d.conf_sent, d.conf, d.news_count
+      FROM sessions s LEFT JOIN daily d ON s.symbol = d.symbol AND s.date = d.date
+    )
+    SELECT
+      date,
+      symbol,
+      conf_sent / NULLIF(conf, 0) AS news_sent,
+      conf / news_count AS news_conf,
+      COALESCE(news_count, 0) AS news_count,
+      ({decayed_sum}) / NULLIF({decayed_conf}, 0) AS news_sent_decay
+    FROM grid
+    ORDER BY date, symbol
+    """
+
+@instrument("calculate_news_features")
+def calculate_news_features(cutoff: str = DEFAULT_CUTOFF, exchange_tz: str = EXCHANGE_TZ, decay_sessions: int = 5,
+                            half_life: float = 2.0) -> pd.DataFrame:
+    """Aggregates article sentiment into (date, symbol) features in one DuckDB query.
+
+    Each article is assigned to a session by its exchange-local timestamp and the close cutoff, then
+    ASOF-joined to the next date the symbol trades in ohlcv_daily. Per session: news_sent is the
+    confidence-weighted mean sentiment, news_conf the mean confidence and news_count the article count.
+    news_sent_decay is the confidence-weighted sentiment over the last decay_sessions sessions, with
+    weights halving every half_life sessions; it is NULL when no news falls in the window.
+    """
+    if not glob.glob(os.path.join(NEWS_SENTIMENT_DIR, '**', '*.parquet'), recursive=True):
+        print(f"No news sentiment found in {NEWS_SENTIMENT_DIR}. Skipping news features.")
+        return pd.DataFrame(columns=['date', 'symbol', *NEWS_FEATURE_COLUMNS])
+
+    conn = duckdb.connect(database='./data/trading.duckdb', read_only=False)
+    conn.execute("CREATE OR REPLACE VIEW ohlcv_daily AS SELECT * FROM parquet_scan('data/lake/ohlcv/**/*.parquet');")
+    conn.execute(f"CREATE OR REPLACE VIEW news_sentiment AS SELECT * FROM parquet_scan('{NEWS_SENTIMENT_DIR}/**/*.parquet');")
+    with span("calculate_news_features.query"):
+        df = conn.execute(_news_features_query(decay_sessions, half_life), [exchange_tz, cutoff]).fetchdf()
+    conn.close()
+
+    increment("calculate_news_features.rows", len(df))
+    return df
+
+if __name__ == "__main__":
+    # Example Usage:
+    # Requires ingest_market.py output and scored news in data/lake/news_sentiment
+    print(calculate_news_features().dropna(subset=['news_sent_decay']).head())
@@ -1,58 +1,181 @@
-from prefect import flow, task
+from prefect import flow, task, unmapped
 from datetime import date, timedelta
-from typing import List
+from typing import List, Optional
+import glob
 import os
+import pandas as pd
 
 # Import the functions from our modules
-from ingestion.ingest_market import ingest_market
-from ingestion.ingest_fundamentals import ingest_fundamentals
+from ingestion.ingest_market import ingest_market, register_ohlcv_view
+from ingestion.price_panel import build_price_panel
+from ingestion.security_master import SecurityMaster, register_security_master_views, resolve_universe
+from ingestion.ingest_fundamentals import ingest_fundamentals, merge_fundamentals_parts
 from ingestion.ingest_news import ingest_news
+from ingestion.ingest_intraday import group_by_bucket, ingest_intraday, resample_intraday_to_daily
 from ingestion.normalize_text import normalize_text
 from features.daily import calculate_daily_features
+from features.news_sentiment import NEWS_SENTIMENT_DIR, write_news_sentiment
 from agents.sentiment.finbert_agent import FinbertSentimentAgent # Assuming direct use for now
 from decision.aggregator_v0 import aggregate_signals
+from decision.meta_labeling import train_meta_model
 from exec.backtester import run_backtest # For backtesting mode
 from exec.alpaca_client import AlpacaClient # For paper trading mode
+from exec.live_trading import start_live_trading
 from eval.metrics import calculate_metrics, log_metrics_to_mlflow
+from flows.stage_cache import StageTimer, cached_stage, count_partition_rows, map_stage
+from flows.fanout import chunk_symbols, make_task_runner, merge_parts
+from ops.instrumentation import export_trace, log_trace_to_mlflow
+from ops.data_quality import validate_new_partitions
 
-# Placeholder for a universe of symbols. In a real system, this would be loaded from config.
+# Fallback universe when the requested one has not been loaded into the security master
 DEFAULT_SYMBOLS = ["AAPL", "MSFT"]
 
+# Lake partitions each stage reads/writes. Stage cache keys fingerprint the inputs, and a stage
+# only counts as cached while its outputs still exist.
+OHLCV_DIR = 'data/lake/ohlcv'
+OHLCV_GLOB = f'{OHLCV_DIR}/**/*.parquet'
+NEWS_NORM_GLOB = 'data/lake/news_norm/*.parquet'
+NEWS_SENTIMENT_GLOB = f'{NEWS_SENTIMENT_DIR}/**/*.parquet'
+FEATURES_GLOB = 'data/lake/features/daily/*.parquet'
+SIGNALS_GLOB = 'data/lake/aggregated_signals/*.parquet'
+
+# Per-symbol-chunk subtasks. None of them touch DuckDB, so chunks can run in parallel threads or processes;
+# view registration and the merge of single-file datasets happen once the chunks are done.
+def ohlcv_chunk_written(parameters: dict) -> bool:
+    """True if every symbol of an ingest_market_chunk call has a bar file dated inside its [start, end) range.
+
+    yfinance turns network errors into empty frames, so a chunk can finish without writing anything; its
+    cached result must not be reused then. Ranges without a trading day count as not written and simply re-run.
+    """
+    start, end = parameters['start_date_str'], parameters['end_date_str']
+    written = set()
+    if os.path.isdir(OHLCV_DIR):
+        for name in os.listdir(OHLCV_DIR):
+            if start <= name < end and os.path.isdir(os.path.join(OHLCV_DIR, name)):
+                written.update(os.path.splitext(f)[0] for f in os.listdir(os.path.join(OHLCV_DIR, name)))
+    return set(parameters['symbols']) <= written
+
+# Bars for a past range do not change, but vendors restate recent ones; a day-old entry is pulled again
+@cached_stage("ingest_market", output_globs=[OHLCV_GLOB], outputs_written=ohlcv_chunk_written,
+              cache_expiration=timedelta(days=1))
+def ingest_market_chunk(symbols: List[str], start_date_str: str, end_date_str: str):
+    rows = ingest_market(symbols=symbols, start_date=start_date_str, end_date=end_date_str, register=False)
+    if not rows:
+        print(f"No market data written for {symbols} from {start_date_str} to {end_date_str}; it is retried next run")
+
 @task
-def run_ingestion(symbols: List[str], start_date_str: str, end_date_str: str):
-    print(f"Running ingestion for {symbols} from {start_date_str} to {end_date_str}")
-    ingest_market(symbols=symbols, start_date=start_date_str, end_date=end_date_str)
-    ingest_fundamentals(symbols=symbols) # Fundamentals are usually less frequent, but included for completeness
-    ingest_news(symbols=symbols, start_ts=f"{start_date_str}T00:00:00Z", end_ts=f"{end_date_str}T23:59:59Z")
+def ingest_fundamentals_chunk(symbols: List[str], part: str):
+    ingest_fundamentals(symbols=symbols, part=part)
+
+@task
+def ingest_news_chunk(symbols: List[str], part: str, start_date_str: str, end_date_str: str):
+    ingest_news(symbols=symbols, start_ts=f"{start_date_str}T00:00:00Z", end_ts=f"{end_date_str}T23:59:59Z", part=part)
+
+@task
+def ingest_intraday_chunk(symbols: List[str], start_date_str: str, end_date_str: str):
+    ingest_intraday(symbols=symbols, start_date=start_date_str, end_date=end_date_str)
+
+@task
+def resample_intraday(start_date_str: str, end_date_str: str):
+    # Only the sessions this run ingested; registration happens once in register_market_data
+    resample_intraday_to_daily(start_date=start_date_str, end_date=end_date_str, register=False)
+
+@task
+def register_market_data(symbols: List[str]):
+    register_ohlcv_view()
+    # Appends only the date partitions that changed, so backtests map prices instead of scanning the lake
+    build_price_panel()
+    # Give newly ingested symbols their int32 ids before features and signals encode them
+    master = SecurityMaster.load()
+    if master.assign(symbols):
+        master.save()
+    register_security_master_views()
+
+@task
+def merge_fundamentals():
+    # Point-in-time upsert rather than a plain concat, so earlier filings survive the merge
+    return merge_fundamentals_parts()
+
+@task
+def merge_news():
+    return merge_parts('data/lake/news_raw', 'news_raw.parquet', dataset='news_raw')
+
+@task
+def normalize_news():
     normalize_text()
+
+@flow(name="Ingestion")
+def run_ingestion(symbols: List[str], start_date_str: str, end_date_str: str, chunk_size: Optional[int] = None,
+                  n_chunks: int = 1, intraday: bool = False):
+    print(f"Running ingestion for {symbols} from {start_date_str} to {end_date_str}")
+    chunks = chunk_symbols(symbols, chunk_size=chunk_size, n_chunks=n_chunks)
+    parts = [f"chunk-{i:04d}" for i in range(len(chunks))]
+
+    # Market, fundamentals and news are independent: all chunks of all three are submitted at once. Market
+    # chunks bypass StageTimer.run, so map_stage applies the missing-outputs refresh to each chunk on its own.
+    market = map_stage("ingest_market", ingest_market_chunk, "symbols", chunks, start_date_str=start_date_str,
+                       end_date_str=end_date_str)
+    fundamentals = ingest_fundamentals_chunk.map(chunks, parts) # Fundamentals are usually less frequent, but included for completeness
+    news = ingest_news_chunk.map(chunks, parts, start_date_str=unmapped(start_date_str), end_date_str=unmapped(end_date_str))
+
+    # Minute bars are chunked by symbol bucket so no two chunks write the same partition file. Daily bars
+    # resampled from them replace the per-symbol daily files, so resampling waits for the daily pulls too.
+    if intraday:
+        bars = ingest_intraday_chunk.map(group_by_bucket(symbols), start_date_str=unmapped(start_date_str),
+                                         end_date_str=unmapped(end_date_str))
+        market = [*market, resample_intraday.submit(start_date_str, end_date_str, wait_for=[*bars, *market])]
+
+    # DuckDB writers are chained so only one holds the database file at a time, even with process workers
+    registered = register_market_data.submit(symbols, wait_for=market)
+    merged_fundamentals = merge_fundamentals.submit(wait_for=[*fundamentals, registered])
+    merged_news = merge_news.submit(wait_for=news)
+    normalize_news.submit(wait_for=[merged_news, merged_fundamentals]).result()
+
     print("Ingestion complete.")
+    return {"rows": count_partition_rows([OHLCV_GLOB, NEWS_NORM_GLOB])}
 
+# Not cached: each run only scans partitions whose fingerprint has not passed before, and a failure must
+# stop the flow every time until the data is fixed
 @task
+def validate_data(datasets: List[str]):
+    print(f"Validating new partitions of {datasets}...")
+    df_results = validate_new_partitions(datasets)
+    return {"rows": df_results['partition'].nunique() if not df_results.empty else 0}
+
+@cached_stage("sentiment", input_globs=[NEWS_NORM_GLOB], output_globs=[NEWS_SENTIMENT_GLOB])
+def run_sentiment_analysis(model_name: str = "ProsusAI/finbert"):
+    print("Running sentiment analysis...")
+    if not glob.glob(NEWS_NORM_GLOB):
+        print("No normalized news to score.")
+        return {"rows": 0}
+
+    # Article-level scores go to data/lake/news_sentiment; the features stage aggregates them per session
+    df_news = pd.read_parquet('data/lake/news_norm')
+    df_sentiment = FinbertSentimentAgent(model_name=model_name).run_sentiment(df_news)
+    rows = write_news_sentiment(df_sentiment)
+    print("Sentiment analysis complete.")
+    return {"rows": rows}
+
+@cached_stage("features", input_globs=[OHLCV_GLOB, NEWS_SENTIMENT_GLOB], output_globs=[FEATURES_GLOB])
 def run_feature_engineering():
     print("Calculating daily features...")
     calculate_daily_features()
     print("Feature engineering complete.")
+    return {"rows": count_partition_rows([FEATURES_GLOB])}
 
-@task
-def run_sentiment_analysis(target_date: date):
-    print("Running sentiment analysis...")
-    # In a full pipeline, this task would fetch news_norm data for the target_date
-    # and write sentiment scores back to the features store.
-    # For this MVP, let's assume news_norm is loaded internally by the agent example or features join it.
-    # As per Module-Data-Engineering, sentiment agent output goes to features_daily.
-    
-    # For direct usage within the flow, we might need to load and pass data explicitly.
-    # Since the current `finbert_agent.py` example directly loads from `news_norm.parquet`
-    # and `features/daily.py` expects it to be joined, we'll simplify this task for the flow.
-    print("Sentiment analysis task is a placeholder. FinBERT agent runs as part of feature building pipeline conceptually.")
-
-@task
+@cached_stage("decision", input_globs=[FEATURES_GLOB, OHLCV_GLOB], output_globs=[SIGNALS_GLOB])
 def run_decision_making():
+    # Meta-labeling model versions are keyed by their training rows, so unchanged features reuse the last fit
+    print("Training meta-labeling model...")
+    train_meta_model()
     print("Aggregating signals and making decisions...")
-    aggregate_signals()
+    df_signals = aggregate_signals()
     print("Decision making complete.")
+    return {"rows": len(df_signals)}
 
-@task
+# Only backtests are cached; paper trading has side effects at the broker and must always run
+@cached_stage("execution", input_globs=[OHLCV_GLOB, SIGNALS_GLOB],
+              skip_if=lambda parameters: parameters.get("mode") != "backtest")
 def run_execution(mode: str, symbols: List[str], start_date_str: str, end_date_str: str):
     if mode == "backtest":
         print(f"Running backtest for {symbols} from {start_date_str} to {end_date_str}...")
@@ -60,12 +183,13 @@ def run_execution(mode: str, symbols: List[str], start_date_str: str, end_date_s
         print("Backtest complete.")
     elif mode == "paper":
         print("Executing paper trades...")
-        # In a real scenario, you'd load the daily signals and execute orders
-        # For MVP, this is a placeholder.
         alpaca_client = AlpacaClient()
         account_info = alpaca_client.get_account_information()
         print(f"Alpaca Account Cash: {account_info.get('cash')}")
-        print("Paper trading execution logic goes here.")
+        # Event-driven from here: bars and news stream in and orders go out per event until the close. The
+        # service runs in its own process, so the flow finishes now instead of holding a worker all session.
+        process = start_live_trading(symbols)
+        print(f"Live trading service started (pid {process.pid}); it stops at today's close.")
     else:
         print(f"Unknown execution mode: {mode}")
 
@@ -85,8 +209,13 @@ def run_evaluation():
     # log_metrics_to_mlflow(metrics, equity_curve_df=pd.DataFrame({'Date': equity_curve_series.index, 'PortfolioValue': equity_curve_series.values}))
 
 @flow(name="Daily Trading Pipeline")
-def daily_trading_pipeline(run_date: date = date.today(), mode: str = "backtest", symbols: List[str] = DEFAULT_SYMBOLS):
+def daily_trading_pipeline(run_date: date = date.today(), mode: str = "backtest", symbols: Optional[List[str]] = None,
+                           universe: str = "default",
+                           task_runner: str = "thread", max_workers: Optional[int] = None, chunk_size: Optional[int] = None,
+                           intraday: bool = False, log_trace: bool = False):
     print(f"Starting daily trading pipeline for {run_date} in {mode} mode.")
+    # Explicit symbols win; otherwise trade the universe's members as of run_date
+    symbols = symbols or resolve_universe(universe, as_of=run_date.isoformat(), default=DEFAULT_SYMBOLS)
     
     # Define start and end dates for data ingestion and backtesting
     # For daily runs, ingest T-1 to T-0 (or a small window around run_date)
@@ -97,13 +226,30 @@ def daily_trading_pipeline(run_date: date = date.today(), mode: str = "backtest"
     backtest_start_date = (run_date - timedelta(days=7)).isoformat() # Last 7 days for dry run
     backtest_end_date = run_date.isoformat()
 
-    run_ingestion(symbols=symbols, start_date_str=ingestion_start_date, end_date_str=ingestion_end_date)
-    run_feature_engineering()
-    run_sentiment_analysis(target_date=run_date)
-    run_decision_making()
-    run_execution(mode=mode, symbols=symbols, start_date_str=backtest_start_date, end_date_str=backtest_end_date)
-    run_evaluation()
+    # Each stage is skipped (Prefect "Cached" state) when its inputs and parameters are unchanged
+    stages = StageTimer()
+
+    # Ingestion fans out per symbol chunk over the configured task runner (one chunk per worker by default)
+    max_workers = max_workers or os.cpu_count() or 1
+    ingestion = run_ingestion.with_options(task_runner=make_task_runner(task_runner, max_workers))
+    stages.run("ingestion", ingestion, symbols=symbols, start_date_str=ingestion_start_date, end_date_str=ingestion_end_date,
+               chunk_size=chunk_size, n_chunks=max_workers, intraday=intraday)
+    # Bad partitions stop the flow here, before sentiment, features or signals spend compute on them
+    stages.run("validate_ingestion", validate_data, datasets=["ohlcv_daily", "news_norm"])
+    stages.run("sentiment", run_sentiment_analysis)
+    stages.run("features", run_feature_engineering)
+    stages.run("validate_features", validate_data, datasets=["features_daily"])
+    stages.run("decision", run_decision_making)
+    stages.run("execution", run_execution, mode=mode, symbols=symbols, start_date_str=backtest_start_date, end_date_str=backtest_end_date)
+    stages.run("evaluation", run_evaluation)
 
+    metrics_path = stages.write()
+    print(f"Stage metrics written to {metrics_path}")
+
+    # Hot-path spans (yfinance, Parquet writes, FinBERT batches, DuckDB scans, Alpaca calls) recorded in this process
+    trace_path = export_trace()
+    if log_trace:
+        log_trace_to_mlflow(trace_path)
     print(f"Daily trading pipeline for {run_date} completed.")
 
 if __name__ == "__main__":
@@ -113,3 +259,7 @@ if __name__ == "__main__":
     
     # For local testing without a Prefect server (just runs Python functions directly)
     daily_trading_pipeline(run_date=date(2023, 1, 31), mode="backtest", symbols=["AAPL", "MSFT"])
+
+    # Larger universes: trade the members of a universe loaded into the security master as of run_date,
+    # fanning ingestion out over 8 worker processes (requires prefect-dask)
+    # daily_trading_pipeline(run_date=date(2023, 1, 31), universe="sp500", task_runner="process", max_workers=8)
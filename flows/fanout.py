@@ -0,0 +1,69 @@
+import glob
+import math
+import os
+import shutil
+import duckdb
+import pandas as pd
+import pyarrow as pa
+from prefect.task_runners import BaseTaskRunner, ConcurrentTaskRunner, SequentialTaskRunner
+from typing import List, Optional, Sequence
+from ingestion.writers import write_parquet, write_table
+
+def chunk_symbols(symbols: Sequence[str], chunk_size: Optional[int] = None, n_chunks: Optional[int] = None) -> List[List[str]]:
+    """Splits the universe into contiguous chunks, either of chunk_size symbols or into n_chunks near-equal pieces."""
+    symbols = list(symbols)
+    if not symbols:
+        return []
+    if chunk_size is None:
+        chunk_size = math.ceil(len(symbols) / max(1, n_chunks or 1))
+    return [symbols[i:i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+
+def make_task_runner(kind: str = "thread", max_workers: Optional[int] = None) -> BaseTaskRunner:
+    """Builds the Prefect task runner used for per-chunk subtasks.
+
+    "thread" runs chunks concurrently in the flow process (I/O-bound API pulls), "process" uses a local
+    Dask cluster of max_workers single-threaded processes (CPU-bound stages; needs prefect-dask), and
+    "sequential" runs them one after another for debugging.
+    """
+    if kind == "sequential":
+        return SequentialTaskRunner()
+    if kind == "thread":
+        return ConcurrentTaskRunner()
+    if kind == "process":
+        try:
+            from prefect_dask import DaskTaskRunner
+        except ImportError as e:
+            raise ImportError("The 'process' task runner requires prefect-dask (pip install prefect-dask).") from e
+        return DaskTaskRunner(cluster_kwargs={"n_workers": max_workers or os.cpu_count(), "processes": True, "threads_per_worker": 1})
+    raise ValueError(f"Unknown task runner: {kind}. Must be 'thread', 'process' or 'sequential'.")
+
+def merge_parts(dataset_dir: str, output_file: str, sort_by: Optional[List[str]] = None,
+                view_name: Optional[str] = None, dataset: Optional[str] = None) -> int:
+    """Concatenates {dataset_dir}/_parts/*.parquet written by concurrent chunks into {dataset_dir}/{output_file}.
+
+    The parts directory is removed afterwards so the canonical file is the only partition that downstream
+    parquet_scan globs see. If view_name is given, the dataset is (re)registered in DuckDB. With dataset, the
+    merged file is written on that dataset's schema and sort order (ingestion.writers). Returns rows written.
+    """
+    parts_dir = os.path.join(dataset_dir, '_parts')
+    part_files = sorted(glob.glob(os.path.join(parts_dir, '*.parquet')))
+    if not part_files:
+        return 0
+
+    df = pd.concat([pd.read_parquet(path) for path in part_files], ignore_index=True)
+    output_path = os.path.join(dataset_dir, output_file)
+    if dataset is not None:
+        write_parquet(df, output_path, dataset, sort_by=sort_by)
+    else:
+        if sort_by:
+            df = df.sort_values(by=sort_by).reset_index(drop=True)
+        write_table(pa.Table.from_pandas(df, preserve_index=False), output_path)
+    shutil.rmtree(parts_dir)
+
+    if view_name is not None:
+        conn = duckdb.connect(database='./data/trading.duckdb', read_only=False)
+        conn.execute(f"CREATE OR REPLACE VIEW {view_name} AS SELECT * FROM parquet_scan('{dataset_dir}/*.parquet');")
+        conn.close()
+
+    print(f"Merged {len(part_files)} parts ({len(df)} rows) into {dataset_dir}/{output_file}")
+    return len(df)
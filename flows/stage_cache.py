@@ -0,0 +1,153 @@
+import glob
+import hashlib
+import json
+import os
+import time
+import uuid
+from datetime import timedelta
+import pandas as pd
+import pyarrow.parquet as pq
+from prefect import task
+from prefect.filesystems import LocalFileSystem
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from ingestion.writers import write_parquet
+
+# Where Prefect persists task results for cache hits, and where per-stage run metrics are appended.
+STAGE_RESULTS_DIR = 'data/cache/stage_results'
+STAGE_METRICS_DIR = 'data/lake/pipeline_metrics'
+
+# Output partitions declared by each cached stage; a stage whose outputs are gone is recomputed even on a key match
+_STAGE_OUTPUTS: Dict[str, List[str]] = {}
+# Optional per-call checks, for stages whose calls each own a slice of the outputs (e.g. one symbol chunk)
+_STAGE_OUTPUT_CHECKS: Dict[str, Callable[[Dict[str, Any]], bool]] = {}
+
+def _expand(patterns: Iterable[str]) -> List[str]:
+    return sorted({path for pattern in patterns for path in glob.glob(pattern, recursive=True) if os.path.isfile(path)})
+
+def fingerprint_partitions(patterns: Iterable[str], content: bool = False) -> str:
+    """Hashes the set of files matching the globs.
+
+    By default each file contributes (path, size, mtime_ns), which is a stat call per partition and
+    changes whenever a writer touches the file. content=True hashes the bytes instead, which survives
+    rewrites of identical data but reads every file.
+    """
+    digest = hashlib.sha256()
+    for path in _expand(patterns):
+        digest.update(path.encode())
+        if content:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        else:
+            stat = os.stat(path)
+            digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+def stage_cache_key(stage: str, parameters: Dict[str, Any], input_globs: Iterable[str] = (), content: bool = False) -> str:
+    """Content-addressed key for a stage: stage name + JSON-normalized parameters + input partition fingerprint."""
+    digest = hashlib.sha256()
+    digest.update(stage.encode())
+    digest.update(json.dumps(parameters, sort_keys=True, default=str).encode())
+    digest.update(fingerprint_partitions(input_globs, content=content).encode())
+    return f"{stage}-{digest.hexdigest()}"
+
+def make_cache_key_fn(stage: str, input_globs: Iterable[str] = (), content: bool = False,
+                      skip_if: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Callable:
+    """Builds a Prefect cache_key_fn for a pipeline stage.
+
+    Returns no key (forcing a run that is not cached) when skip_if(parameters) is true,
+    e.g. for side-effecting paper trading.
+    """
+    input_globs = list(input_globs)
+
+    def cache_key_fn(context, parameters: Dict[str, Any]) -> Optional[str]:
+        if skip_if is not None and skip_if(parameters):
+            return None
+        return stage_cache_key(stage, parameters, input_globs, content=content)
+
+    return cache_key_fn
+
+def cached_stage(stage: str, input_globs: Iterable[str] = (), output_globs: Iterable[str] = (), content: bool = False,
+                 skip_if: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                 outputs_written: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                 cache_expiration: Optional[timedelta] = None, result_dir: str = STAGE_RESULTS_DIR) -> Callable:
+    """Prefect task decorator for a pipeline stage that is skipped when its inputs and parameters are unchanged.
+
+    Results are persisted to a local result store so hits carry across flow runs. Run the task through
+    StageTimer.run(stage, ...), map_stage(...), or wrap it in refresh_if_outputs_missing before .submit(),
+    so missing outputs force a refresh of the cached entry. outputs_written(parameters) narrows that check
+    to the outputs of one call; cache_expiration bounds how long an entry is reused at all.
+    """
+    _STAGE_OUTPUTS[stage] = list(output_globs)
+    if outputs_written is not None:
+        _STAGE_OUTPUT_CHECKS[stage] = outputs_written
+    return task(cache_key_fn=make_cache_key_fn(stage, input_globs, content=content, skip_if=skip_if),
+                cache_expiration=cache_expiration, persist_result=True,
+                result_storage=LocalFileSystem(basepath=result_dir))
+
+def outputs_missing(stage: str, parameters: Optional[Dict[str, Any]] = None) -> bool:
+    """True if any output glob declared for the stage currently matches no file, or if the stage's
+    per-call check says the call with these parameters did not write its outputs."""
+    if any(not _expand([pattern]) for pattern in _STAGE_OUTPUTS.get(stage, [])):
+        return True
+    check = _STAGE_OUTPUT_CHECKS.get(stage)
+    return check is not None and parameters is not None and not check(parameters)
+
+def refresh_if_outputs_missing(stage: str, stage_task: Any, parameters: Optional[Dict[str, Any]] = None) -> Any:
+    """stage_task, set to recompute and overwrite its cache entry if the stage's outputs are missing."""
+    return stage_task.with_options(refresh_cache=True) if outputs_missing(stage, parameters) else stage_task
+
+def map_stage(stage: str, stage_task: Any, name: str, values: Iterable[Any], **kwargs) -> List[Any]:
+    """Submits stage_task once per value of parameter `name`, like .map() with the other kwargs unmapped.
+
+    Each call gets its own missing-outputs check, so a chunk that wrote nothing (e.g. a download that
+    failed into an empty frame) is recomputed on the next run while the other chunks stay cache hits.
+    """
+    futures = []
+    for value in values:
+        parameters = {name: value, **kwargs}
+        futures.append(refresh_if_outputs_missing(stage, stage_task, parameters).submit(**parameters))
+    return futures
+
+def count_partition_rows(patterns: Iterable[str]) -> int:
+    """Row count across Parquet partitions, read from footers only (no data pages are scanned)."""
+    return sum(pq.ParquetFile(path).metadata.num_rows for path in _expand(patterns))
+
+class StageTimer:
+    """Collects per-stage wall time, cache status and rows processed for one flow run."""
+
+    def __init__(self, run_id: Optional[str] = None):
+        self.run_id = run_id or uuid.uuid4().hex
+        self.records: List[dict] = []
+
+    def run(self, stage: str, stage_task: Callable, **kwargs) -> Any:
+        """Calls a Prefect task with return_state=True, records its metrics and returns its result.
+
+        Raises the task's exception on failure, so the flow still fails fast.
+        """
+        stage_task = refresh_if_outputs_missing(stage, stage_task, kwargs)
+        started_at = pd.Timestamp.now(tz='UTC')
+        start = time.perf_counter()
+        state = stage_task(return_state=True, **kwargs)
+        duration_s = time.perf_counter() - start
+        result = state.result()
+
+        rows = result.get('rows') if isinstance(result, dict) else None
+        cached = state.name == 'Cached'
+        self.records.append({
+            'run_id': self.run_id, 'stage': stage, 'started_at': started_at,
+            'duration_s': duration_s, 'cached': cached, 'rows': rows,
+        })
+        print(f"[{stage}] {'cache hit' if cached else 'ran'} in {duration_s:.2f}s, rows={rows}")
+        return result
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.records, columns=['run_id', 'stage', 'started_at', 'duration_s', 'cached', 'rows'])
+
+    def write(self, output_dir: str = STAGE_METRICS_DIR) -> Optional[str]:
+        """Writes this run's stage metrics as one Parquet partition named after the run id."""
+        if not self.records:
+            return None
+        path = os.path.join(output_dir, f'{self.run_id}.parquet')
+        write_parquet(self.to_frame(), path, 'pipeline_metrics')
+        return path
@@ -1,85 +1,146 @@
-from typing import Iterable, Dict, Any
+from typing import Iterable, Dict, Any, List, Optional
+import glob
+import shutil
 import requests
 import pandas as pd
 import duckdb
 import os
+from ops.instrumentation import instrument, span, increment
+from ingestion.writers import upsert_parquet, write_parquet
 
 # This is a placeholder for your FMP API key. In a real application, use environment variables.
 FMP_API_KEY = os.environ.get("FMP_API_KEY")
 BASE_URL = "https://financialmodelingprep.com/api/v3"
 
-def ingest_fundamentals(symbols: Iterable[str]) -> None:
-    """Fetch quarterly statements (FMP). Normalize schema, write to data/lake/fundamentals, register in DuckDB."""
+FUNDAMENTALS_DIR = 'data/lake/fundamentals'
+
+# Fields kept from each FMP statement, merged on (symbol, date) where date is the fiscal period end
+STATEMENT_FIELDS = {
+    'income': ['revenue', 'netIncome', 'eps'],
+    'balance': ['totalAssets', 'totalLiabilities'],
+    'cash_flow': ['cashFlowFromOperatingActivities'],
+}
+
+# Conservative knowledge lag when a statement carries neither an acceptance nor a filing date (10-Q deadline)
+DEFAULT_REPORTING_LAG = pd.Timedelta(days=45)
+
+# One row per (symbol, period end, acceptance time): restatements add rows instead of overwriting history
+PIT_KEY = ['symbol', 'date', 'accepted_at']
+
+def _statement_frame(records: List[dict], fields: List[str]) -> pd.DataFrame:
+    df = pd.DataFrame.from_records(records).reindex(columns=['symbol', 'date', 'fillingDate', 'acceptedDate', *fields])
+    df = df.dropna(subset=['date'])
+    df['date'] = pd.to_datetime(df['date'])
+    df['filing_date'] = pd.to_datetime(df.pop('fillingDate'))
+    df['accepted_at'] = pd.to_datetime(df.pop('acceptedDate'))
+    # One pull reports each period once; keep the latest filing if an endpoint repeats a period
+    return df.sort_values(by='accepted_at').drop_duplicates(subset=['symbol', 'date'], keep='last')
+
+def normalize_statements(income: List[dict], balance: List[dict], cash_flow: List[dict]) -> pd.DataFrame:
+    """Merges raw FMP statement records (each tagged with 'symbol') into the point-in-time fundamentals schema.
+
+    The three statements are outer-merged on (symbol, date) in one pass over the whole universe. A period
+    only counts as known once every statement reporting it is out, so filing_date/accepted_at take the latest
+    value across statements. available_at is accepted_at, else the day after filing_date, else date + 45 days.
+    """
+    merged = None
+    for name, records in (('income', income), ('balance', balance), ('cash_flow', cash_flow)):
+        df = _statement_frame(records, STATEMENT_FIELDS[name]).rename(
+            columns={'filing_date': f'filing_date_{name}', 'accepted_at': f'accepted_at_{name}'})
+        merged = df if merged is None else merged.merge(df, on=['symbol', 'date'], how='outer')
+
+    filing_cols = [f'filing_date_{name}' for name in STATEMENT_FIELDS]
+    accepted_cols = [f'accepted_at_{name}' for name in STATEMENT_FIELDS]
+    merged['filing_date'] = merged[filing_cols].max(axis=1)
+    merged['accepted_at'] = merged[accepted_cols].max(axis=1)
+    merged = merged.drop(columns=filing_cols + accepted_cols)
+
+    merged['available_at'] = (merged['accepted_at']
+                              .fillna(merged['filing_date'] + pd.Timedelta(days=1))
+                              .fillna(merged['date'] + DEFAULT_REPORTING_LAG))
+    columns = ['symbol', 'date', 'filing_date', 'accepted_at', 'available_at'] + [f for fields in STATEMENT_FIELDS.values() for f in fields]
+    return merged[columns].sort_values(by=['symbol', 'date', 'available_at']).reset_index(drop=True)
+
+def upsert_fundamentals(df_new: pd.DataFrame, output_path: str = FUNDAMENTALS_DIR) -> pd.DataFrame:
+    """Adds rows to the point-in-time table, replacing only rows with the same (symbol, date, accepted_at)."""
+    # Files written before the point-in-time schema have no filing metadata; they are read back on the same schema
+    df = upsert_parquet(df_new, os.path.join(output_path, 'fundamentals.parquet'), 'fundamentals')
+    return df.sort_values(by=['symbol', 'date', 'available_at']).reset_index(drop=True)
+
+def register_fundamentals_view() -> None:
+    conn = duckdb.connect(database='./data/trading.duckdb', read_only=False)
+    conn.execute("CREATE OR REPLACE VIEW fundamentals AS SELECT * FROM parquet_scan('data/lake/fundamentals/*.parquet');")
+    conn.close()
+
+def merge_fundamentals_parts() -> int:
+    """Upserts the _parts/ written by concurrent ingest_fundamentals(part=...) calls into the point-in-time table."""
+    parts_dir = os.path.join(FUNDAMENTALS_DIR, '_parts')
+    part_files = sorted(glob.glob(os.path.join(parts_dir, '*.parquet')))
+    if not part_files:
+        return 0
+
+    df_parts = pd.concat([pd.read_parquet(path) for path in part_files], ignore_index=True)
+    upsert_fundamentals(df_parts)
+    shutil.rmtree(parts_dir)
+    register_fundamentals_view()
+    print(f"Merged {len(part_files)} fundamentals parts ({len(df_parts)} rows)")
+    return len(df_parts)
+
+@instrument("ingest_fundamentals")
+def ingest_fundamentals(symbols: Iterable[str], part: Optional[str] = None) -> None:
+    """Fetch quarterly statements (FMP). Normalize schema, write to data/lake/fundamentals, register in DuckDB.
+
+    The table is point-in-time: each row carries filing_date, accepted_at and available_at, and new
+    pulls are upserted so earlier filings and restatements stay queryable as of their own dates.
+    With part set, writes data/lake/fundamentals/_parts/{part}.parquet instead and skips DuckDB registration,
+    so symbol chunks can be fetched concurrently and merged afterwards.
+    """
 
     if not FMP_API_KEY:
         print("FMP_API_KEY environment variable not set. Skipping fundamentals ingestion.")
         return
 
-    conn = duckdb.connect(database='./data/trading.duckdb', read_only=False)
-
-    all_fundamentals_data = []
+    statements: Dict[str, List[dict]] = {name: [] for name in STATEMENT_FIELDS}
 
     for symbol in symbols:
         print(f"Fetching fundamentals for {symbol}")
         try:
-            # Fetch income statement
-            income_statement_url = f"{BASE_URL}/income-statement/{symbol}?period=quarter&apikey={FMP_API_KEY}"
-            income_data = requests.get(income_statement_url).json()
-
-            # Fetch balance sheet
-            balance_sheet_url = f"{BASE_URL}/balance-sheet-statement/{symbol}?period=quarter&apikey={FMP_API_KEY}"
-            balance_data = requests.get(balance_sheet_url).json()
-
-            # Fetch cash flow statement
-            cash_flow_url = f"{BASE_URL}/cash-flow-statement/{symbol}?period=quarter&apikey={FMP_API_KEY}"
-            cash_flow_data = requests.get(cash_flow_url).json()
-
-            # For simplicity, let's just combine some key fields. In a real scenario, this would be more robust.
-            combined_data = {}
-            for item in income_data:
-                date = item.get("date")
-                if date:
-                    combined_data.setdefault(date, {}).update({
-                        "symbol": symbol,
-                        "date": date,
-                        "revenue": item.get("revenue"),
-                        "netIncome": item.get("netIncome"),
-                        "eps": item.get("eps")
-                    })
-            for item in balance_data:
-                date = item.get("date")
-                if date:
-                    combined_data.setdefault(date, {}).update({
-                        "totalAssets": item.get("totalAssets"),
-                        "totalLiabilities": item.get("totalLiabilities")
-                    })
-            for item in cash_flow_data:
-                date = item.get("date")
-                if date:
-                    combined_data.setdefault(date, {}).update({
-                        "cashFlowFromOperatingActivities": item.get("cashFlowFromOperatingActivities")
-                    })
-            
-            for date_key, data_values in combined_data.items():
-                all_fundamentals_data.append(data_values)
+            with span("ingest_fundamentals.fetch", symbol=symbol):
+                # Fetch income statement
+                income_statement_url = f"{BASE_URL}/income-statement/{symbol}?period=quarter&apikey={FMP_API_KEY}"
+                income_data = requests.get(income_statement_url).json()
+
+                # Fetch balance sheet
+                balance_sheet_url = f"{BASE_URL}/balance-sheet-statement/{symbol}?period=quarter&apikey={FMP_API_KEY}"
+                balance_data = requests.get(balance_sheet_url).json()
+
+                # Fetch cash flow statement
+                cash_flow_url = f"{BASE_URL}/cash-flow-statement/{symbol}?period=quarter&apikey={FMP_API_KEY}"
+                cash_flow_data = requests.get(cash_flow_url).json()
+
+            # FMP returns a dict with an error message instead of a list on failures
+            for name, data in (('income', income_data), ('balance', balance_data), ('cash_flow', cash_flow_data)):
+                if isinstance(data, list):
+                    statements[name].extend({**item, 'symbol': symbol} for item in data)
 
         except Exception as e:
             print(f"Error fetching data for {symbol}: {e}")
 
-    if all_fundamentals_data:
-        df = pd.DataFrame(all_fundamentals_data)
-        df['date'] = pd.to_datetime(df['date'])
-        df = df.sort_values(by=['symbol', 'date']).reset_index(drop=True)
+    if not any(statements.values()):
+        return
+
+    df = normalize_statements(statements['income'], statements['balance'], statements['cash_flow'])
+    increment("ingest_fundamentals.rows", len(df))
 
-        # Write to Parquet
-        output_path = 'data/lake/fundamentals'
-        os.makedirs(output_path, exist_ok=True)
-        df.to_parquet(os.path.join(output_path, 'fundamentals.parquet'), index=False)
+    if part is not None:
+        write_parquet(df, os.path.join(FUNDAMENTALS_DIR, '_parts', f'{part}.parquet'), 'fundamentals')
+        return
 
-        # Register in DuckDB
-        conn.execute("CREATE OR REPLACE VIEW fundamentals AS SELECT * FROM parquet_scan('data/lake/fundamentals/*.parquet');")
+    # Write to Parquet
+    upsert_fundamentals(df)
 
-    conn.close()
+    # Register in DuckDB
+    register_fundamentals_view()
 
 if __name__ == "__main__":
     # Example Usage:
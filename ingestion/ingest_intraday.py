@@ -0,0 +1,251 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import glob
+import os
+import zlib
+import yfinance as yf
+import pandas as pd
+import duckdb
+from ops.instrumentation import instrument, span, increment
+from ingestion.writers import DATASETS, write_parquet, write_partitions
+
+INTRADAY_DIR = 'data/lake/ohlcv_1m'
+OHLCV_DIR = 'data/lake/ohlcv'
+EXCHANGE_TZ = 'America/New_York'
+N_BUCKETS = 16
+# ~64k rows per row group: a symbol-day of minute bars is 390 rows, so one group covers ~160 symbol-days
+# and its min/max symbol/ts statistics let readers skip the rest of the file
+ROW_GROUP_ROWS = 65_536
+# Yahoo serves at most 7 days of 1m bars per request, and only for the last 30 days (one day of slack here)
+MAX_1M_REQUEST_DAYS = 7
+MAX_1M_HISTORY_DAYS = 29
+
+# Layout: data/lake/ohlcv_1m/date=YYYY-MM-DD/bucket=NN/bars.parquet, one file per exchange-local session
+# and symbol bucket (crc32(symbol) % N_BUCKETS), rows sorted by (symbol, ts). A day for the whole universe
+# is N_BUCKETS files instead of one file per symbol, and a symbol scan touches one bucket per day.
+
+BAR_SCHEMA = DATASETS['ohlcv_1m']['schema']
+
+def bucket_of(symbol: str, n_buckets: int = N_BUCKETS) -> int:
+    """Stable symbol bucket (crc32, not Python's salted hash), so every process agrees on the layout."""
+    return zlib.crc32(symbol.encode()) % n_buckets
+
+def group_by_bucket(symbols: Iterable[str], n_buckets: int = N_BUCKETS) -> List[List[str]]:
+    """Splits symbols into bucket-aligned chunks, so concurrent writers never share a partition file."""
+    buckets: Dict[int, List[str]] = {}
+    for symbol in symbols:
+        buckets.setdefault(bucket_of(symbol, n_buckets), []).append(symbol)
+    return [buckets[bucket] for bucket in sorted(buckets)]
+
+def _partition_path(output_dir: str, session: str, bucket: int) -> str:
+    return os.path.join(output_dir, f'date={session}', f'bucket={bucket:02d}', 'bars.parquet')
+
+def write_intraday_bars(df_bars: pd.DataFrame, output_dir: str = INTRADAY_DIR, n_buckets: int = N_BUCKETS) -> int:
+    """Upserts minute bars (ts, symbol, open, high, low, close, volume) into the bucketed layout.
+
+    Each touched (session, bucket) file is rewritten atomically with the incoming symbols' rows replacing
+    any existing rows for those symbols, sorted by (symbol, ts) with zstd compression and column statistics.
+    Returns rows written.
+    """
+    if df_bars.empty:
+        return 0
+
+    df = df_bars[list(BAR_SCHEMA.names)].copy()
+    df['ts'] = pd.to_datetime(df['ts'], utc=True)
+    df['session'] = df['ts'].dt.tz_convert(EXCHANGE_TZ).dt.strftime('%Y-%m-%d')
+    df['bucket'] = df['symbol'].map(lambda symbol: bucket_of(symbol, n_buckets))
+
+    for (session, bucket), df_part in df.groupby(['session', 'bucket'], sort=True):
+        path = _partition_path(output_dir, session, bucket)
+        df_part = df_part.drop(columns=['session', 'bucket'])
+        if os.path.exists(path):
+            df_existing = pd.read_parquet(path)
+            df_part = pd.concat([df_existing[~df_existing['symbol'].isin(df_part['symbol'].unique())], df_part])
+
+        write_parquet(df_part, path, 'ohlcv_1m', row_group_size=ROW_GROUP_ROWS)
+    return len(df)
+
+def download_windows(start_date: str, end_date: str, interval: str = '1m',
+                     now: Optional[pd.Timestamp] = None) -> List[Tuple[str, str]]:
+    """[start, end) date windows yfinance will serve for interval, covering [start_date, end_date).
+
+    For 1m bars the range is clamped to the last MAX_1M_HISTORY_DAYS days and split into requests of at
+    most MAX_1M_REQUEST_DAYS days; other intervals are one window. Empty if nothing is in reach.
+    """
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    if interval != '1m':
+        return [(start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))] if start < end else []
+
+    today = (now if now is not None else pd.Timestamp.now()).normalize()
+    start = max(start, today - pd.Timedelta(days=MAX_1M_HISTORY_DAYS))
+    windows = []
+    while start < end:
+        stop = min(start + pd.Timedelta(days=MAX_1M_REQUEST_DAYS), end)
+        windows.append((start.strftime('%Y-%m-%d'), stop.strftime('%Y-%m-%d')))
+        start = stop
+    return windows
+
+@instrument("ingest_intraday")
+def ingest_intraday(symbols: Iterable[str], start_date: str, end_date: Optional[str] = None, interval: str = '1m',
+                    output_dir: str = INTRADAY_DIR) -> int:
+    """Pull minute bars (yfinance) into the bucketed intraday layout.
+
+    1m requests are clamped to the ~30 days Yahoo keeps and split into 7-day windows (download_windows). Pass bucket-aligned chunks (group_by_bucket) when calling concurrently. Returns rows written.
+    """
+    if end_date is None:
+        end_date = pd.Timestamp.now().strftime('%Y-%m-%d')
+
+    windows = download_windows(start_date, end_date, interval)
+    if not windows:
+        print(f"No {interval} bars available between {start_date} and {end_date}")
+        return 0
+
+    frames = []
+    for symbol in symbols:
+        print(f"Ingesting {interval} bars for {symbol} from {windows[0][0]} to {windows[-1][1]}")
+        for window_start, window_end in windows:
+            with span("ingest_intraday.download", symbol=symbol):
+                data = yf.download(symbol, start=window_start, end=window_end, interval=interval, auto_adjust=True,
+                                   progress=False)
+            if data.empty:
+                continue
+            if isinstance(data.columns, pd.MultiIndex):
+                data.columns = data.columns.get_level_values(0)
+            data = data.reset_index()
+            frames.append(pd.DataFrame({
+                'ts': pd.to_datetime(data.iloc[:, 0], utc=True), 'symbol': symbol,
+                'open': data['Open'], 'high': data['High'], 'low': data['Low'], 'close': data['Close'],
+                'volume': data['Volume'].astype('int64'),
+            }))
+
+    if not frames:
+        return 0
+    with span("ingest_intraday.write_parquet"):
+        rows = write_intraday_bars(pd.concat(frames, ignore_index=True), output_dir=output_dir)
+    increment("ingest_intraday.rows", rows)
+    return rows
+
+def intraday_sessions(input_dir: str = INTRADAY_DIR, start_date: Optional[str] = None,
+                      end_date: Optional[str] = None) -> List[str]:
+    """Sorted session dates present in the intraday lake, optionally limited to [start_date, end_date]."""
+    if not os.path.isdir(input_dir):
+        return []
+    sessions = sorted(name.split('=', 1)[1] for name in os.listdir(input_dir) if name.startswith('date='))
+    return [s for s in sessions if (start_date is None or s >= start_date) and (end_date is None or s <= end_date)]
+
+def _partition_files(input_dir: str, sessions: List[str], symbols: Optional[List[str]], n_buckets: int) -> List[str]:
+    buckets = sorted({bucket_of(symbol, n_buckets) for symbol in symbols}) if symbols is not None else None
+    files = []
+    for session in sessions:
+        if buckets is None:
+            files.extend(sorted(glob.glob(os.path.join(input_dir, f'date={session}', 'bucket=*', 'bars.parquet'))))
+        else:
+            files.extend(path for path in (_partition_path(input_dir, session, b) for b in buckets) if os.path.exists(path))
+    return files
+
+def _as_utc(ts: Optional[str]) -> Optional[pd.Timestamp]:
+    if ts is None:
+        return None
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize('UTC') if ts.tz is None else ts.tz_convert('UTC')
+
+@instrument("load_intraday_bars")
+def load_intraday_bars(symbols: Optional[List[str]] = None, start_ts: Optional[str] = None, end_ts: Optional[str] = None,
+                       columns: Optional[List[str]] = None, input_dir: str = INTRADAY_DIR,
+                       n_buckets: int = N_BUCKETS) -> pd.DataFrame:
+    """Minute bars for symbols (default all) with start_ts <= ts < end_ts, sorted by (symbol, ts).
+
+    Only the session directories in the range and the buckets of the requested symbols are opened;
+    within each file DuckDB skips row groups whose symbol/ts statistics cannot match.
+    Naive timestamps are read as UTC.
+    """
+    start, end = _as_utc(start_ts), _as_utc(end_ts)
+    # One day of slack on each side: sessions are exchange-local dates, the bounds are UTC instants
+    sessions = intraday_sessions(input_dir,
+                                 start_date=(start - pd.Timedelta(days=1)).strftime('%Y-%m-%d') if start is not None else None,
+                                 end_date=(end + pd.Timedelta(days=1)).strftime('%Y-%m-%d') if end is not None else None)
+    files = _partition_files(input_dir, sessions, symbols, n_buckets)
+    selected = columns or list(BAR_SCHEMA.names)
+    if not files:
+        return pd.DataFrame(columns=selected)
+
+    conditions, params = [], [files]
+    if symbols is not None:
+        conditions.append("symbol IN (SELECT UNNEST(?))")
+        params.append(list(symbols))
+    if start is not None:
+        conditions.append("ts >= ?")
+        params.append(start.to_pydatetime())
+    if end is not None:
+        conditions.append("ts < ?")
+        params.append(end.to_pydatetime())
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    conn = duckdb.connect()
+    conn.execute("SET TimeZone = 'UTC'")
+    df = conn.execute(f"SELECT {', '.join(selected)} FROM read_parquet(?) {where} ORDER BY symbol, ts", params).fetchdf()
+    conn.close()
+    return df
+
+@instrument("resample_intraday_to_daily")
+def resample_intraday_to_daily(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                               input_dir: str = INTRADAY_DIR, output_dir: str = OHLCV_DIR,
+                               session_open: str = '09:30:00', session_close: str = '16:00:00',
+                               register: bool = True) -> int:
+    """Builds daily OHLCV from minute bars, one session at a time so memory is bounded by a day of bars.
+
+    Only bars inside the regular session (exchange-local [session_open, session_close)) count. Bars are
+    upserted into data/lake/ohlcv/{date}/{symbol}.parquet, the layout ingest_market writes, replacing its
+    bar for the same (date, symbol). Returns rows written.
+    """
+    conn = duckdb.connect()
+    conn.execute("SET TimeZone = 'UTC'")
+    rows = 0
+    for session in intraday_sessions(input_dir, start_date, end_date):
+        files = _partition_files(input_dir, [session], None, N_BUCKETS)
+        with span("resample_intraday_to_daily.session", session=session):
+            df_daily = conn.execute(
+                """
+                WITH bars AS (
+                  SELECT *, CAST(timezone(?, ts) AS TIME) AS local_time FROM read_parquet(?)
+                )
+                SELECT
+                  CAST(? AS VARCHAR) AS date,
+                  symbol,
+                  arg_min(open, ts) AS open,
+                  max(high) AS high,
+                  min(low) AS low,
+                  arg_max(close, ts) AS close,
+                  CAST(sum(volume) AS BIGINT) AS volume
+                FROM bars
+                WHERE local_time >= CAST(? AS TIME) AND local_time < CAST(? AS TIME)
+                GROUP BY symbol
+                ORDER BY symbol
+                """,
+                [EXCHANGE_TZ, files, session, session_open, session_close]
+            ).fetchdf()
+        if df_daily.empty:
+            continue
+
+        # Same {date}/{symbol}.parquet upsert as ingest_market, so whichever of the two ran last owns the
+        # (date, symbol) bar and ohlcv_daily never sees it twice
+        legacy_file = os.path.join(output_dir, session, 'intraday.parquet')
+        if os.path.exists(legacy_file):
+            os.remove(legacy_file)  # the session-wide file of the old layout; every symbol in it is rewritten below
+        for symbol, df_symbol in df_daily.groupby('symbol', sort=False):
+            write_partitions(df_symbol, output_dir, 'ohlcv', filename=f'{symbol}.parquet')
+        rows += len(df_daily)
+    conn.close()
+
+    increment("resample_intraday_to_daily.rows", rows)
+    if register and rows:
+        conn = duckdb.connect(database='./data/trading.duckdb', read_only=False)
+        conn.execute(f"CREATE OR REPLACE VIEW ohlcv_daily AS SELECT * FROM parquet_scan('{output_dir}/**/*.parquet');")
+        conn.close()
+    print(f"Resampled {rows} daily bars from minute data")
+    return rows
+
+if __name__ == "__main__":
+    # Example Usage:
+    ingest_intraday(symbols=["AAPL", "MSFT"], start_date=(pd.Timestamp.now() - pd.Timedelta(days=5)).strftime('%Y-%m-%d'))
+    resample_intraday_to_daily()
+    print(load_intraday_bars(symbols=["AAPL"]).tail())
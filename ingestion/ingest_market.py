@@ -3,33 +3,49 @@ import yfinance as yf
 import pandas as pd
 import duckdb
 import os
+from ops.instrumentation import instrument, span, increment
+from ingestion.writers import write_partitions
 
-def ingest_market(symbols: Iterable[str], start_date: str, end_date: Optional[str] = None, adjusted: bool = True) -> None:
-    """Pull daily OHLCV (yfinance). Write Parquet to data/lake/ohlcv/{date}/{symbol}.parquet and register in DuckDB."""
+@instrument("ingest_market")
+def ingest_market(symbols: Iterable[str], start_date: str, end_date: Optional[str] = None, adjusted: bool = True,
+                  register: bool = True) -> int:
+    """Pull daily OHLCV (yfinance). Write Parquet to data/lake/ohlcv/{date}/{symbol}.parquet and register in DuckDB.
+
+    Files are per symbol, so several calls over disjoint symbol chunks can run concurrently;
+    pass register=False from those and register the view once afterwards. Returns the number of rows
+    written; yfinance reports a failed download as an empty frame, so a symbol that failed adds nothing.
+    """
 
     if end_date is None:
         end_date = pd.Timestamp.now().strftime('%Y-%m-%d')
 
-    conn = duckdb.connect(database='./data/trading.duckdb', read_only=False)
-
+    rows = 0
     for symbol in symbols:
         print(f"Ingesting market data for {symbol} from {start_date} to {end_date}")
-        data = yf.download(symbol, start=start_date, end=end_date, auto_adjust=adjusted)
-        if not data.empty:
+        with span("ingest_market.download", symbol=symbol):
+            data = yf.download(symbol, start=start_date, end=end_date, auto_adjust=adjusted)
+        if data.empty:
+            increment("ingest_market.empty_downloads")
+        else:
             data = data.reset_index()
-            data['date'] = data['Date'].dt.strftime('%Y-%m-%d')
+            data['date'] = data['Date']
             data['symbol'] = symbol
             data = data[['date', 'symbol', 'Open', 'High', 'Low', 'Close', 'Volume']]
             data.columns = ['date', 'symbol', 'open', 'high', 'low', 'close', 'volume']
 
-            # Write to Parquet
-            for date in data['date'].unique():
-                date_path = os.path.join('data', 'lake', 'ohlcv', date)
-                os.makedirs(date_path, exist_ok=True)
-                file_path = os.path.join(date_path, f'{symbol}.parquet')
-                data[data['date'] == date].to_parquet(file_path, index=False)
+            # One file per (date, symbol); re-ingesting a day replaces that symbol's bar
+            with span("ingest_market.write_parquet", symbol=symbol, rows=len(data)):
+                write_partitions(data, os.path.join('data', 'lake', 'ohlcv'), 'ohlcv', filename=f'{symbol}.parquet')
+            increment("ingest_market.rows", len(data))
+            rows += len(data)
 
-    # Register Parquet directories as views in DuckDB (assuming data/lake/ohlcv already exists)
+    if register:
+        register_ohlcv_view()
+    return rows
+
+def register_ohlcv_view() -> None:
+    """Register Parquet directories as views in DuckDB (assuming data/lake/ohlcv already exists)."""
+    conn = duckdb.connect(database='./data/trading.duckdb', read_only=False)
     conn.execute("CREATE OR REPLACE VIEW ohlcv_daily AS SELECT * FROM parquet_scan('data/lake/ohlcv/**/*.parquet');")
     conn.close()
 
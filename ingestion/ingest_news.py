@@ -1,14 +1,20 @@
-from typing import List
+from typing import List, Optional
 import requests
 import pandas as pd
 import os
+from ops.instrumentation import instrument, span, increment
+from ingestion.writers import write_parquet
 
 # Placeholder for NewsAPI key. Use environment variables in production.
 NEWSAPI_API_KEY = os.environ.get("NEWSAPI_API_KEY")
 NEWSAPI_BASE_URL = "https://newsapi.org/v2"
 
-def ingest_news(symbols: List[str], start_ts: str, end_ts: str) -> None:
-    """Fetch headlines (NewsAPI/Reddit). Write raw to news_raw/."""
+@instrument("ingest_news")
+def ingest_news(symbols: List[str], start_ts: str, end_ts: str, part: Optional[str] = None) -> None:
+    """Fetch headlines (NewsAPI/Reddit). Write raw to news_raw/.
+
+    With part set, writes news_raw/_parts/{part}.parquet so symbol chunks can be fetched concurrently and merged afterwards.
+    """
 
     if not NEWSAPI_API_KEY:
         print("NEWSAPI_API_KEY environment variable not set. Skipping news ingestion.")
@@ -29,7 +35,8 @@ def ingest_news(symbols: List[str], start_ts: str, end_ts: str) -> None:
                 "language": "en",
                 "pageSize": 100  # Max articles per request
             }
-            response = requests.get(f"{NEWSAPI_BASE_URL}/everything", params=params)
+            with span("ingest_news.fetch", symbol=symbol):
+                response = requests.get(f"{NEWSAPI_BASE_URL}/everything", params=params)
             response.raise_for_status()
             articles = response.json().get('articles', [])
 
@@ -49,10 +56,10 @@ def ingest_news(symbols: List[str], start_ts: str, end_ts: str) -> None:
 
     if all_articles:
         df = pd.DataFrame(all_articles)
-        output_path = 'data/lake/news_raw'
-        os.makedirs(output_path, exist_ok=True)
+        increment("ingest_news.rows", len(df))
+        output_path = 'data/lake/news_raw' if part is None else 'data/lake/news_raw/_parts'
         # Save as a single parquet file for simplicity in MVP, partition by date later if needed.
-        df.to_parquet(os.path.join(output_path, 'news_raw.parquet'), index=False)
+        write_parquet(df, os.path.join(output_path, 'news_raw.parquet' if part is None else f'{part}.parquet'), 'news_raw')
         print(f"Successfully ingested {len(all_articles)} raw news articles.")
 
 if __name__ == "__main__":
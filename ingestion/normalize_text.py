@@ -3,7 +3,11 @@ import os
 import re
 import hashlib
 import duckdb
+from ops.instrumentation import instrument, increment
+from ingestion.security_master import encode_symbols
+from ingestion.writers import write_parquet
 
+@instrument("normalize_text")
 def normalize_text() -> None:
     """Clean, deduplicate, map tickers; write normalized records to data/lake/news_norm/."""
 
@@ -49,8 +53,9 @@ def normalize_text() -> None:
     df_normalized = df_deduplicated[['ts', 'symbol', 'source', 'title', 'content_clean', 'url']].copy()
     df_normalized.rename(columns={'content_clean': 'text'}, inplace=True)
 
-    # Write normalized records to data/lake/news_norm/
-    df_normalized.to_parquet(os.path.join(output_path, 'news_norm.parquet'), index=False)
+    # Write normalized records to data/lake/news_norm/, symbols encoded with security-master ids
+    write_parquet(encode_symbols(df_normalized), os.path.join(output_path, 'news_norm.parquet'), 'news_norm')
+    increment("normalize_text.rows", len(df_normalized))
     print(f"Successfully normalized {len(df_normalized)} news articles.")
 
     # Register in DuckDB
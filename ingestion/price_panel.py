@@ -0,0 +1,322 @@
+import json
+import os
+import shutil
+import uuid
+import duckdb
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List, Optional, Tuple
+from ops.instrumentation import instrument, span, increment
+
+OHLCV_DIR = 'data/lake/ohlcv'
+PRICE_PANEL_DIR = 'data/cache/price_panel'
+PANEL_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+MANIFEST = 'manifest.json'
+
+# Layout: {panel_dir}/manifest.json names the current generation directory, which holds dates.npy,
+# symbols.npy and one raw C-order (dates x symbols) array per field. New trading days are appended to
+# the arrays in place; new symbols or backfilled dates write a fresh generation and switch the manifest
+# atomically, so readers holding the previous generation keep a consistent (if stale) snapshot.
+
+def _partition_fingerprints(ohlcv_dir: str) -> Dict[str, List[int]]:
+    """(files, bytes, max mtime_ns) per {date}/ directory, from one scandir per directory (no Parquet reads)."""
+    fingerprints = {}
+    if not os.path.isdir(ohlcv_dir):
+        return fingerprints
+    for date_entry in os.scandir(ohlcv_dir):
+        if not date_entry.is_dir() or date_entry.name.startswith('_'):
+            continue
+        n_files, size, mtime = 0, 0, 0
+        for entry in os.scandir(date_entry.path):
+            if entry.name.endswith('.parquet'):
+                stat = entry.stat()
+                n_files, size, mtime = n_files + 1, size + stat.st_size, max(mtime, stat.st_mtime_ns)
+        if n_files:
+            fingerprints[date_entry.name] = [n_files, size, mtime]
+    return fingerprints
+
+def _directory_fingerprints(ohlcv_dir: str) -> Dict[str, int]:
+    """mtime_ns of ohlcv_dir and of each {date}/ directory: one scandir plus one stat per date, no per-file stats.
+
+    Lake writes go through ingestion.writers (temp file + rename), which creates and renames directory
+    entries, so any write, replace or delete of a partition file bumps its date directory's mtime.
+    """
+    if not os.path.isdir(ohlcv_dir):
+        return {}
+    fingerprints = {'.': os.stat(ohlcv_dir).st_mtime_ns}
+    for date_entry in os.scandir(ohlcv_dir):
+        if date_entry.is_dir() and not date_entry.name.startswith('_'):
+            fingerprints[date_entry.name] = date_entry.stat().st_mtime_ns
+    return fingerprints
+
+def _read_manifest(panel_dir: str) -> Optional[dict]:
+    path = os.path.join(panel_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def _write_manifest(panel_dir: str, manifest: dict) -> None:
+    tmp_path = os.path.join(panel_dir, f'.{MANIFEST}.{uuid.uuid4().hex}')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(panel_dir, MANIFEST))
+
+def _save_index(path: str, values: np.ndarray) -> None:
+    tmp_path = f'{path}.{uuid.uuid4().hex}.npy'
+    np.save(tmp_path, values)
+    os.replace(tmp_path, path)
+
+def _field_path(generation_dir: str, field: str, dtype: str) -> str:
+    return os.path.join(generation_dir, f'{field}.{np.dtype(dtype).str.lstrip("<>|=")}')
+
+def _scan_partitions(ohlcv_dir: str, dates: List[str]) -> pd.DataFrame:
+    """Reads the given {date}/ partitions in one DuckDB scan."""
+    files = [os.path.join(ohlcv_dir, date, '*.parquet') for date in dates]
+    conn = duckdb.connect()
+    df = conn.execute(
+        f"SELECT CAST(date AS DATE) AS date, symbol, {', '.join(PANEL_FIELDS)} FROM read_parquet(?, union_by_name = true)",
+        [files]
+    ).fetchdf()
+    conn.close()
+    return df
+
+class PricePanel:
+    """Read-only, memory-mapped OHLCV panel: one (dates x symbols) array per field plus date/symbol indexes.
+
+    Arrays are np.memmap views of the cache files, so several processes opening the same panel share
+    the page cache instead of each holding a copy. Pickling sends only the path; the receiving process
+    maps the same generation again.
+    """
+
+    def __init__(self, panel_dir: str = PRICE_PANEL_DIR, manifest: Optional[dict] = None):
+        self.panel_dir = panel_dir
+        self.manifest = manifest or _read_manifest(panel_dir)
+        if self.manifest is None:
+            raise FileNotFoundError(f"No price panel in {panel_dir}. Run build_price_panel() first.")
+
+        generation_dir = os.path.join(panel_dir, self.manifest['generation'])
+        n_dates, n_symbols = self.manifest['n_dates'], self.manifest['n_symbols']
+        # The index files may already hold dates appended after this manifest was read
+        self.dates = np.load(os.path.join(generation_dir, 'dates.npy'), mmap_mode='r')[:n_dates]
+        self.symbols = np.load(os.path.join(generation_dir, 'symbols.npy'))[:n_symbols]
+        self._symbol_index = pd.Index(self.symbols)
+        self.fields = {
+            field: np.memmap(_field_path(generation_dir, field, self.manifest['dtype']), dtype=self.manifest['dtype'],
+                             mode='r', shape=(n_dates, n_symbols))
+            for field in self.manifest['fields']
+        }
+
+    def __reduce__(self):
+        return (PricePanel, (self.panel_dir, self.manifest))
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.fields[field]
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.manifest['n_dates'], self.manifest['n_symbols']
+
+    def symbol_indices(self, symbols: Iterable[str]) -> np.ndarray:
+        """Column positions of symbols; -1 for symbols not in the panel."""
+        return self._symbol_index.get_indexer(list(symbols))
+
+    def date_slice(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> slice:
+        """Row slice covering [start_date, end_date]; slicing a field with it is still a view."""
+        start = 0 if start_date is None else np.searchsorted(self.dates, np.datetime64(start_date, 'D'), side='left')
+        end = len(self.dates) if end_date is None else np.searchsorted(self.dates, np.datetime64(end_date, 'D'), side='right')
+        return slice(int(start), int(end))
+
+    def frame(self, field: str, symbols: Optional[List[str]] = None, start_date: Optional[str] = None,
+              end_date: Optional[str] = None) -> pd.DataFrame:
+        """Wide (date x symbol) frame for one field. Missing symbols come back as all-NaN columns."""
+        rows = self.date_slice(start_date, end_date)
+        index = pd.DatetimeIndex(self.dates[rows], name='date')
+        if symbols is None:
+            return pd.DataFrame(self.fields[field][rows], index=index, columns=self.symbols, copy=False)
+        columns = self.symbol_indices(symbols)
+        values = self.fields[field][rows][:, np.where(columns < 0, 0, columns)].astype(np.float64)
+        values[:, columns < 0] = np.nan
+        return pd.DataFrame(values, index=index, columns=symbols)
+
+    def ohlcv_frames(self, symbols: List[str], start_date: Optional[str] = None,
+                     end_date: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+        """symbol -> OHLCV frame indexed by date with capitalized columns (Backtrader convention).
+
+        Matches what a per-symbol ohlcv_daily query returns: dates without a close are dropped,
+        and symbols with no rows in the range are omitted.
+        """
+        rows = self.date_slice(start_date, end_date)
+        index = pd.DatetimeIndex(self.dates[rows], name='date')
+        frames = {}
+        for symbol, column in zip(symbols, self.symbol_indices(symbols)):
+            if column < 0:
+                continue
+            df = pd.DataFrame({field.capitalize(): self.fields[field][rows, column] for field in PANEL_FIELDS}, index=index)
+            df = df[df['Close'].notna()]
+            if not df.empty:
+                frames[symbol] = df
+        return frames
+
+def open_price_panel(panel_dir: str = PRICE_PANEL_DIR, ohlcv_dir: Optional[str] = OHLCV_DIR) -> Optional[PricePanel]:
+    """Maps the current panel generation, or returns None if no panel has been built.
+
+    Also None when the panel is stale: a date directory of ohlcv_dir changed since the panel was built
+    (e.g. ingest_market(register=False) wrote partitions after the last build_price_panel), so callers fall
+    back to ohlcv_daily. The check compares directory mtimes only, so it costs one stat per date however
+    many symbol files each date holds. ohlcv_dir=None skips it.
+    """
+    manifest = _read_manifest(panel_dir)
+    if manifest is None:
+        return None
+    if ohlcv_dir is not None and manifest.get('directories') != _directory_fingerprints(ohlcv_dir):
+        print(f"Price panel in {panel_dir} is stale against {ohlcv_dir}; run build_price_panel() to refresh it.")
+        increment("price_panel.stale")
+        return None
+    return PricePanel(panel_dir, manifest)
+
+def _write_generation(panel_dir: str, dates: np.ndarray, symbols: np.ndarray, dtype: str,
+                      previous: Optional[PricePanel]) -> str:
+    """Allocates a new generation sized for dates x symbols, carrying over every value of the previous one."""
+    generation = f'gen-{uuid.uuid4().hex[:12]}'
+    generation_dir = os.path.join(panel_dir, generation)
+    os.makedirs(generation_dir)
+    np.save(os.path.join(generation_dir, 'dates.npy'), dates)
+    np.save(os.path.join(generation_dir, 'symbols.npy'), symbols)
+
+    if previous is not None:
+        rows = np.searchsorted(dates, previous.dates)
+        columns = pd.Index(symbols).get_indexer(previous.symbols)
+    for field in PANEL_FIELDS:
+        array = np.memmap(_field_path(generation_dir, field, dtype), dtype=dtype, mode='w+', shape=(len(dates), len(symbols)))
+        array[:] = np.nan
+        if previous is not None and field in previous.fields:
+            array[np.ix_(rows, columns)] = previous.fields[field]
+        array.flush()
+        del array
+    return generation
+
+def _grow_generation(generation_dir: str, old_shape: Tuple[int, int], n_dates: int, dtype: str) -> None:
+    """Appends NaN rows to every field file in place; existing mappings of the old rows stay valid."""
+    n_old, n_symbols = old_shape
+    for field in PANEL_FIELDS:
+        path = _field_path(generation_dir, field, dtype)
+        with open(path, 'r+b') as f:
+            f.truncate(n_dates * n_symbols * np.dtype(dtype).itemsize)
+        array = np.memmap(path, dtype=dtype, mode='r+', shape=(n_dates, n_symbols))
+        array[n_old:] = np.nan
+        array.flush()
+        del array
+
+@instrument("build_price_panel")
+def build_price_panel(ohlcv_dir: str = OHLCV_DIR, panel_dir: str = PRICE_PANEL_DIR, dtype: str = 'float64',
+                      full: bool = False) -> dict:
+    """Builds or incrementally refreshes the memory-mapped price panel from data/lake/ohlcv/{date}/ partitions.
+
+    Only date partitions whose (files, bytes, max mtime) changed since the last build are scanned.
+    When they are all new trailing dates over known symbols, rows are appended in place; otherwise
+    (changed existing dates, new symbols, backfilled or removed dates, dtype change, full=True) a new
+    generation is written and the manifest switched, so open panels never see history change under them.
+    Returns a summary with the mode ('unchanged', 'append', 'rewrite'), partitions scanned and shape.
+    """
+    # Directory mtimes are taken first, so a write racing the build leaves the panel looking stale
+    directories = _directory_fingerprints(ohlcv_dir)
+    fingerprints = _partition_fingerprints(ohlcv_dir)
+    manifest = None if full else _read_manifest(panel_dir)
+    if manifest is not None and manifest['dtype'] != dtype:
+        manifest = None
+    if manifest is not None and set(manifest['partitions']) - set(fingerprints):
+        # A date partition was deleted: rebuild rather than track holes
+        manifest = None
+    known = manifest['partitions'] if manifest is not None else {}
+
+    changed = sorted(date for date, fingerprint in fingerprints.items() if known.get(date) != fingerprint)
+    if manifest is not None and not changed:
+        if manifest.get('directories') != directories:
+            _write_manifest(panel_dir, {**manifest, 'directories': directories})
+        return {'mode': 'unchanged', 'partitions': 0, 'shape': (manifest['n_dates'], manifest['n_symbols'])}
+
+    with span("build_price_panel.scan", partitions=len(changed)):
+        df = _scan_partitions(ohlcv_dir, changed) if changed else pd.DataFrame(columns=['date', 'symbol', *PANEL_FIELDS])
+    increment("build_price_panel.rows", len(df))
+
+    previous = PricePanel(panel_dir, manifest) if manifest is not None else None
+    old_dates = previous.dates if previous is not None else np.array([], dtype='datetime64[D]')
+    old_symbols = previous.symbols if previous is not None else np.array([], dtype=str)
+    new_dates = np.setdiff1d(np.array(changed, dtype='datetime64[D]'), old_dates)
+    new_symbols = np.setdiff1d(np.asarray(df['symbol'].unique(), dtype=str), old_symbols)
+    dates = np.sort(np.concatenate([old_dates, new_dates]))
+    # New symbols go after the existing ones so column positions stay stable across generations
+    symbols = np.concatenate([old_symbols, np.sort(new_symbols)]).astype(str)
+
+    # Only trailing new dates over known symbols are written into the live generation: those rows lie past
+    # the n_dates every open reader mapped. A changed existing date would rewrite rows readers can see.
+    appendable = (previous is not None and len(new_symbols) == 0 and len(new_dates) == len(changed)
+                  and (len(new_dates) == 0 or len(old_dates) == 0 or new_dates.min() > old_dates.max()))
+    os.makedirs(panel_dir, exist_ok=True)
+    if appendable:
+        mode, generation = 'append', manifest['generation']
+        generation_dir = os.path.join(panel_dir, generation)
+        if len(new_dates):
+            _grow_generation(generation_dir, previous.shape, len(dates), dtype)
+            _save_index(os.path.join(generation_dir, 'dates.npy'), dates)
+    else:
+        mode = 'rewrite'
+        with span("build_price_panel.rewrite", dates=len(dates), symbols=len(symbols)):
+            generation = _write_generation(panel_dir, dates, symbols, dtype, previous)
+        generation_dir = os.path.join(panel_dir, generation)
+
+    # Scatter the scanned partitions; changed dates are cleared first so dropped symbols become NaN again
+    rows = np.searchsorted(dates, np.array(changed, dtype='datetime64[D]'))
+    row_of = np.searchsorted(dates, df['date'].to_numpy(dtype='datetime64[D]'))
+    column_of = pd.Index(symbols).get_indexer(df['symbol'].astype(str))
+    for field in PANEL_FIELDS:
+        array = np.memmap(_field_path(generation_dir, field, dtype), dtype=dtype, mode='r+', shape=(len(dates), len(symbols)))
+        array[rows] = np.nan
+        array[row_of, column_of] = df[field].to_numpy(dtype=np.float64)
+        array.flush()
+        del array
+
+    _write_manifest(panel_dir, {
+        'generation': generation, 'dtype': dtype, 'fields': PANEL_FIELDS,
+        'n_dates': int(len(dates)), 'n_symbols': int(len(symbols)), 'partitions': fingerprints,
+        'directories': directories,
+    })
+    # Processes still mapping an old generation keep their pages after the unlink
+    for entry in os.scandir(panel_dir):
+        if entry.is_dir() and entry.name.startswith('gen-') and entry.name != generation:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+    print(f"Price panel {mode}: {len(changed)} partitions scanned, shape {len(dates)} x {len(symbols)}")
+    return {'mode': mode, 'partitions': len(changed), 'shape': (int(len(dates)), int(len(symbols)))}
+
+def load_ohlcv_frames(symbols: List[str], start_date: str, end_date: str, panel_dir: str = PRICE_PANEL_DIR,
+                      ohlcv_dir: Optional[str] = OHLCV_DIR) -> Dict[str, pd.DataFrame]:
+    """Per-symbol OHLCV frames (Backtrader convention) from the price panel, or from ohlcv_daily if none is
+    built or it is stale against ohlcv_dir (see open_price_panel)."""
+    panel = open_price_panel(panel_dir, ohlcv_dir)
+    if panel is not None:
+        return panel.ohlcv_frames(symbols, start_date, end_date)
+
+    conn = duckdb.connect(database='./data/trading.duckdb', read_only=True)
+    df_ohlcv = conn.execute(
+        "SELECT date, symbol, open, high, low, close, volume FROM ohlcv_daily "
+        "WHERE symbol IN (SELECT UNNEST(?)) AND date >= ? AND date <= ? ORDER BY symbol, date",
+        [symbols, start_date, end_date]
+    ).fetchdf()
+    conn.close()
+
+    df_ohlcv['date'] = pd.to_datetime(df_ohlcv['date'])
+    frames = {}
+    for symbol, df_symbol in df_ohlcv.groupby('symbol', sort=False):
+        df_symbol = df_symbol.drop(columns='symbol').set_index('date')
+        df_symbol.columns = [col.capitalize() for col in df_symbol.columns]
+        frames[symbol] = df_symbol
+    return {symbol: frames[symbol] for symbol in symbols if symbol in frames}
+
+if __name__ == "__main__":
+    # Example Usage:
+    # Requires ingest_market.py to have written data/lake/ohlcv
+    print(build_price_panel())
+    panel = open_price_panel()
+    print(panel.frame('close').tail())
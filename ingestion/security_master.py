@@ -0,0 +1,162 @@
+import os
+import duckdb
+import numpy as np
+import pandas as pd
+from typing import Iterable, List, Optional, Sequence
+from ingestion.writers import write_parquet
+
+SECURITY_MASTER_DIR = 'data/lake/security_master'
+
+# securities.parquet: one row per symbol; symbol_id is the row position, so ids are dense int32 and
+# id -> symbol is an array take. Ids are never reused or reordered, only appended.
+# universe_membership.parquet: (universe, symbol_id, start_date, end_date) intervals, start inclusive and
+# end exclusive (the effective date of the removal); a null end_date means still a member.
+SECURITY_COLUMNS = ['symbol_id', 'symbol', 'first_seen']
+MEMBERSHIP_COLUMNS = ['universe', 'symbol_id', 'start_date', 'end_date']
+
+class SecurityMaster:
+    """Symbol <-> int32 id dictionary plus date-effective universe membership."""
+
+    def __init__(self, securities: Optional[pd.DataFrame] = None, membership: Optional[pd.DataFrame] = None):
+        securities = securities if securities is not None else pd.DataFrame(columns=SECURITY_COLUMNS)
+        self.securities = securities.sort_values(by='symbol_id').reset_index(drop=True)
+        self.securities['symbol_id'] = self.securities['symbol_id'].astype(np.int32)
+        self.membership = membership if membership is not None else pd.DataFrame(columns=MEMBERSHIP_COLUMNS)
+        self._rebuild_index()
+
+    def _rebuild_index(self) -> None:
+        self.symbols = self.securities['symbol'].to_numpy(dtype=object)
+        self._index = pd.Index(self.symbols)
+
+    @classmethod
+    def load(cls, path: str = SECURITY_MASTER_DIR) -> 'SecurityMaster':
+        securities_path = os.path.join(path, 'securities.parquet')
+        membership_path = os.path.join(path, 'universe_membership.parquet')
+        securities = pd.read_parquet(securities_path) if os.path.exists(securities_path) else None
+        membership = pd.read_parquet(membership_path) if os.path.exists(membership_path) else None
+        return cls(securities, membership)
+
+    def save(self, path: str = SECURITY_MASTER_DIR) -> None:
+        write_parquet(self.securities, os.path.join(path, 'securities.parquet'), 'securities')
+        write_parquet(self.membership, os.path.join(path, 'universe_membership.parquet'), 'universe_membership')
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def ids(self, symbols: Iterable[str]) -> np.ndarray:
+        """int32 ids for symbols; -1 for symbols not in the master."""
+        return self._index.get_indexer(pd.Index(symbols, dtype=object)).astype(np.int32)
+
+    def to_symbols(self, ids: Sequence[int]) -> np.ndarray:
+        return self.symbols[np.asarray(ids, dtype=np.int64)]
+
+    def assign(self, symbols: Iterable[str], first_seen: Optional[str] = None) -> int:
+        """Gives every unknown symbol the next free id. Returns the number of symbols added."""
+        symbols = pd.Index(list(symbols), dtype=object)
+        unknown = pd.unique(symbols[self.ids(symbols) < 0])
+        if len(unknown) == 0:
+            return 0
+        added = pd.DataFrame({
+            'symbol_id': np.arange(len(self), len(self) + len(unknown), dtype=np.int32),
+            'symbol': np.sort(unknown.astype(str)),
+            'first_seen': pd.Timestamp(first_seen or pd.Timestamp.now().date()),
+        })
+        self.securities = pd.concat([self.securities, added], ignore_index=True) if len(self) else added
+        self._rebuild_index()
+        return len(added)
+
+    def encode(self, df: pd.DataFrame, column: str = 'symbol') -> pd.DataFrame:
+        """Adds an int32 symbol_id column and turns the symbol column into a categorical whose codes are the ids.
+
+        Parquet stores the categorical dictionary-encoded, and DuckDB reads it back as VARCHAR.
+        Symbols must already be assigned.
+        """
+        ids = self.ids(df[column])
+        if (ids < 0).any():
+            raise KeyError(f"Symbols not in the security master: {sorted(set(df[column][ids < 0]))[:10]}")
+        df = df.copy()
+        df['symbol_id'] = ids
+        df[column] = pd.Categorical.from_codes(ids, categories=self.symbols)
+        return df
+
+    def set_membership(self, universe: str, df_members: pd.DataFrame) -> None:
+        """Replaces a universe's membership with intervals from a (symbol, start_date[, end_date]) frame."""
+        self.assign(df_members['symbol'])
+        df = pd.DataFrame({
+            'universe': universe,
+            'symbol_id': self.ids(df_members['symbol']),
+            'start_date': pd.to_datetime(df_members['start_date']),
+            'end_date': pd.to_datetime(df_members['end_date']) if 'end_date' in df_members else pd.NaT,
+        })
+        others = self.membership[self.membership['universe'] != universe]
+        self.membership = pd.concat([others, df], ignore_index=True) if len(others) else df
+
+    def universes(self) -> List[str]:
+        return sorted(self.membership['universe'].unique())
+
+    def _intervals(self, universe: str) -> pd.DataFrame:
+        df = self.membership[self.membership['universe'] == universe]
+        if df.empty:
+            raise KeyError(f"Unknown universe: {universe}")
+        return df
+
+    def members(self, universe: str, as_of: Optional[str] = None) -> List[str]:
+        """Symbols in the universe on as_of (default today), sorted."""
+        as_of = pd.Timestamp(as_of or pd.Timestamp.now().date())
+        df = self._intervals(universe)
+        active = (df['start_date'] <= as_of) & (df['end_date'].isna() | (df['end_date'] > as_of))
+        return sorted(self.to_symbols(df.loc[active, 'symbol_id'].unique()))
+
+    def members_between(self, universe: str, start_date: str, end_date: str) -> List[str]:
+        """Symbols that were in the universe on at least one day of [start_date, end_date]."""
+        df = self._intervals(universe)
+        overlaps = ((df['start_date'] <= pd.Timestamp(end_date))
+                    & (df['end_date'].isna() | (df['end_date'] > pd.Timestamp(start_date))))
+        return sorted(self.to_symbols(df.loc[overlaps, 'symbol_id'].unique()))
+
+    def membership_frame(self, universe: str, dates: Sequence, symbols: Sequence[str]) -> pd.DataFrame:
+        """Boolean (dates x symbols) frame: True where the symbol is a member on that date."""
+        dates = pd.DatetimeIndex(pd.to_datetime(dates))
+        columns = pd.Index(self.ids(symbols))
+        mask = np.zeros((len(dates), len(symbols)), dtype=bool)
+        df = self._intervals(universe)
+        df = df[df['symbol_id'].isin(columns)]
+        start_rows = dates.searchsorted(df['start_date'].to_numpy(), side='left')
+        end_rows = np.where(df['end_date'].isna(), len(dates), dates.searchsorted(df['end_date'].to_numpy(), side='left'))
+        for column, start, end in zip(columns.get_indexer(df['symbol_id']), start_rows, end_rows):
+            mask[start:end, column] = True
+        return pd.DataFrame(mask, index=dates, columns=list(symbols))
+
+def encode_symbols(df: pd.DataFrame, path: str = SECURITY_MASTER_DIR) -> pd.DataFrame:
+    """Assigns ids to any new symbols in df (persisting the master if it grew) and returns df encoded."""
+    master = SecurityMaster.load(path)
+    if master.assign(df['symbol'].unique()):
+        master.save(path)
+    return master.encode(df)
+
+def register_security_master_views(path: str = SECURITY_MASTER_DIR) -> None:
+    """Registers securities and universe_membership in DuckDB, for joins on symbol_id."""
+    conn = duckdb.connect(database='./data/trading.duckdb', read_only=False)
+    conn.execute(f"CREATE OR REPLACE VIEW securities AS SELECT * FROM parquet_scan('{path}/securities.parquet');")
+    conn.execute(f"CREATE OR REPLACE VIEW universe_membership AS SELECT * FROM parquet_scan('{path}/universe_membership.parquet');")
+    conn.close()
+
+def resolve_universe(universe: str, as_of: Optional[str] = None, default: Optional[List[str]] = None,
+                     path: str = SECURITY_MASTER_DIR) -> List[str]:
+    """Members of universe as of a date, or default when that universe has not been loaded."""
+    master = SecurityMaster.load(path)
+    if universe not in master.universes():
+        if default is None:
+            raise KeyError(f"Unknown universe: {universe}")
+        return list(default)
+    return master.members(universe, as_of)
+
+if __name__ == "__main__":
+    # Example Usage:
+    master = SecurityMaster.load()
+    master.set_membership('sp500', pd.DataFrame({
+        'symbol': ['AAPL', 'MSFT', 'TSLA'],
+        'start_date': ['1982-11-30', '1994-06-01', '2020-12-21'],
+    }))
+    master.save()
+    print(master.members('sp500', as_of='2020-01-02'))
@@ -0,0 +1,233 @@
+from typing import Dict, List, Optional, Sequence
+import os
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# One rows-per-group default for the lake: DuckDB scans and parallelises by row group and its own groups
+# are 122,880 rows, so a group is one unit of work. Files are sorted by (symbol, date) before writing, so
+# each group covers a narrow symbol range and its min/max statistics let symbol filters skip the rest.
+ROW_GROUP_ROWS = 122_880
+COMPRESSION = 'zstd'
+
+# Session dates are date32 and event times UTC timestamps, whatever the source frame carried (ISO strings,
+# datetime64, datetime.date). Symbols on the security-master-encoded datasets stay dictionary-typed, so
+# pandas reads them back as categoricals.
+# sort_by: row order within a file. key: rows an append replaces (see upsert_parquet); None appends blindly.
+DATASETS: Dict[str, dict] = {
+    'ohlcv': {
+        'schema': pa.schema([
+            ('date', pa.date32()), ('symbol', pa.string()), ('open', pa.float64()), ('high', pa.float64()),
+            ('low', pa.float64()), ('close', pa.float64()), ('volume', pa.int64()),
+        ]),
+        'sort_by': ['symbol', 'date'],
+        'key': ['symbol', 'date'],
+    },
+    'ohlcv_1m': {
+        'schema': pa.schema([
+            ('ts', pa.timestamp('us', tz='UTC')), ('symbol', pa.string()), ('open', pa.float64()),
+            ('high', pa.float64()), ('low', pa.float64()), ('close', pa.float64()), ('volume', pa.int64()),
+        ]),
+        'sort_by': ['symbol', 'ts'],
+        'key': ['symbol', 'ts'],
+    },
+    'news_raw': {
+        'schema': pa.schema([
+            ('ts', pa.timestamp('us', tz='UTC')), ('symbol', pa.string()), ('source', pa.string()),
+            ('title', pa.string()), ('description', pa.string()), ('url', pa.string()), ('content', pa.string()),
+        ]),
+        'sort_by': ['symbol', 'ts'],
+        'key': None,
+    },
+    'news_norm': {
+        'schema': pa.schema([
+            ('ts', pa.timestamp('us', tz='UTC')), ('symbol', pa.dictionary(pa.int32(), pa.string())),
+            ('source', pa.string()), ('title', pa.string()), ('text', pa.string()), ('url', pa.string()),
+            ('symbol_id', pa.int32()),
+        ]),
+        'sort_by': ['symbol', 'ts'],
+        'key': None,
+    },
+    'fundamentals': {
+        'schema': pa.schema([
+            ('symbol', pa.string()), ('date', pa.date32()), ('filing_date', pa.date32()),
+            ('accepted_at', pa.timestamp('us')), ('available_at', pa.timestamp('us')),
+            ('revenue', pa.float64()), ('netIncome', pa.float64()), ('eps', pa.float64()),
+            ('totalAssets', pa.float64()), ('totalLiabilities', pa.float64()),
+            ('cashFlowFromOperatingActivities', pa.float64()),
+        ]),
+        'sort_by': ['symbol', 'date', 'available_at'],
+        'key': ['symbol', 'date', 'accepted_at'],
+    },
+    'features_daily': {
+        'schema': pa.schema([
+            ('date', pa.date32()), ('symbol', pa.dictionary(pa.int32(), pa.string())), ('r20', pa.float64()),
+            ('rsi14', pa.float64()), ('news_sent', pa.float64()), ('news_conf', pa.float64()),
+            ('news_count', pa.int64()), ('news_sent_decay', pa.float64()), ('symbol_id', pa.int32()),
+        ]),
+        'sort_by': ['symbol', 'date'],
+        'key': ['symbol', 'date'],
+    },
+    'aggregated_signals': {
+        'schema': pa.schema([
+            ('date', pa.date32()), ('symbol', pa.dictionary(pa.int32(), pa.string())), ('alpha', pa.float64()),
+            ('reason', pa.string()), ('side', pa.string()), ('conf', pa.float64()), ('meta_version', pa.string()),
+            ('symbol_id', pa.int32()),
+        ]),
+        'sort_by': ['symbol', 'date'],
+        'key': ['symbol', 'date'],
+    },
+    'news_sentiment': {
+        'schema': pa.schema([
+            ('ts', pa.timestamp('us', tz='UTC')), ('symbol', pa.string()), ('news_sent', pa.float64()),
+            ('news_conf', pa.float64()),
+        ]),
+        'sort_by': ['symbol', 'ts'],
+        'key': None,
+    },
+    'securities': {
+        'schema': pa.schema([('symbol_id', pa.int32()), ('symbol', pa.string()), ('first_seen', pa.timestamp('us'))]),
+        'sort_by': ['symbol_id'],
+        'key': ['symbol_id'],
+    },
+    'universe_membership': {
+        'schema': pa.schema([
+            ('universe', pa.string()), ('symbol_id', pa.int32()), ('start_date', pa.timestamp('us')),
+            ('end_date', pa.timestamp('us')),
+        ]),
+        'sort_by': ['universe', 'symbol_id', 'start_date'],
+        'key': None,
+    },
+    'data_quality': {
+        'schema': pa.schema([
+            ('checked_at', pa.timestamp('us', tz='UTC')), ('dataset', pa.string()), ('partition', pa.string()),
+            ('fingerprint', pa.string()), ('check', pa.string()), ('value', pa.float64()), ('threshold', pa.float64()),
+            ('passed', pa.bool_()), ('detail', pa.string()),
+        ]),
+        'sort_by': ['dataset', 'partition', 'check'],
+        'key': None,
+    },
+    'pipeline_metrics': {
+        'schema': pa.schema([
+            ('run_id', pa.string()), ('stage', pa.string()), ('started_at', pa.timestamp('us', tz='UTC')),
+            ('duration_s', pa.float64()), ('cached', pa.bool_()), ('rows', pa.int64()),
+        ]),
+        'sort_by': ['started_at'],
+        'key': None,
+    },
+    'walk_forward_equity': {
+        'schema': pa.schema([('date', pa.date32()), ('portfolio_value', pa.float64())]),
+        'sort_by': ['date'],
+        'key': ['date'],
+    },
+    'walk_forward_folds': {
+        'schema': pa.schema([
+            ('fold', pa.int64()), ('train_start', pa.date32()), ('train_end', pa.date32()), ('test_start', pa.date32()),
+            ('test_end', pa.date32()), ('min_alpha_buy', pa.float64()), ('max_alpha_sell', pa.float64()),
+            ('objective', pa.string()), ('train_score', pa.float64()), ('test_total_return', pa.float64()),
+            ('test_annualized_volatility', pa.float64()), ('test_sharpe_ratio', pa.float64()),
+            ('test_max_drawdown', pa.float64()),
+        ]),
+        'sort_by': ['fold'],
+        'key': ['fold'],
+    },
+}
+
+def _coerce(df: pd.DataFrame, dataset: str) -> pd.DataFrame:
+    """df restricted to the schema's columns in schema order, with date/timestamp columns parsed to datetime64.
+
+    Raises ValueError when df is missing a column or has one the schema does not know, instead of letting a
+    drifted frame write a file that no longer unions with the rest of the dataset.
+    """
+    schema = DATASETS[dataset]['schema']
+    missing = [name for name in schema.names if name not in df.columns]
+    unexpected = [name for name in df.columns if name not in schema.names]
+    if missing or unexpected:
+        raise ValueError(f"{dataset}: frame does not match the schema (missing={missing}, unexpected={unexpected})")
+
+    df = df[schema.names].copy()
+    for field in schema:
+        if pa.types.is_timestamp(field.type) or pa.types.is_date(field.type):
+            utc = pa.types.is_timestamp(field.type) and field.type.tz is not None
+            values = pd.to_datetime(df[field.name], utc=utc)
+            if not utc and values.dt.tz is not None:
+                values = values.dt.tz_convert('UTC').dt.tz_localize(None)
+            df[field.name] = values
+    return df
+
+def to_table(df: pd.DataFrame, dataset: str, sort_by: Optional[Sequence[str]] = None) -> pa.Table:
+    """Converts df to the dataset's Arrow schema (see _coerce), sorted by sort_by.
+
+    Sorting happens in pandas because Arrow cannot sort dictionary columns; categorical symbols sort by
+    their string value, not by security-master id.
+    """
+    df = _coerce(df, dataset)
+    if sort_by:
+        df = df.sort_values(by=list(sort_by), kind='stable',
+                            key=lambda column: column.astype(str) if isinstance(column.dtype, pd.CategoricalDtype) else column)
+    return pa.Table.from_pandas(df, schema=DATASETS[dataset]['schema'], preserve_index=False)
+
+def write_table(table: pa.Table, path: str, sort_by: Optional[Sequence[str]] = None,
+                row_group_size: int = ROW_GROUP_ROWS) -> int:
+    """Writes table to path (sorted by sort_by if given), zstd-compressed with column statistics, via temp file + rename.
+
+    Readers see either the previous file or the complete new one, never a partial write. Returns rows written.
+    """
+    if sort_by:
+        table = table.sort_by([(column, 'ascending') for column in sort_by])
+    dictionary_columns = [name for name in table.column_names
+                          if name == 'symbol' or pa.types.is_dictionary(table.schema.field(name).type)]
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        pq.write_table(table, tmp_path, row_group_size=row_group_size, compression=COMPRESSION,
+                       use_dictionary=dictionary_columns, write_statistics=True)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return table.num_rows
+
+def write_parquet(df: pd.DataFrame, path: str, dataset: str, sort_by: Optional[Sequence[str]] = None,
+                  row_group_size: int = ROW_GROUP_ROWS) -> int:
+    """Schema-checked, sorted (dataset default unless sort_by is given), atomic write of df. Returns rows written."""
+    return write_table(to_table(df, dataset, sort_by=sort_by or DATASETS[dataset]['sort_by']), path,
+                       row_group_size=row_group_size)
+
+def upsert_parquet(df: pd.DataFrame, path: str, dataset: str, row_group_size: int = ROW_GROUP_ROWS) -> pd.DataFrame:
+    """Appends df to the file at path, replacing existing rows with the same dataset key. Returns the full file.
+
+    Files written before a column was added are read back on the current schema (missing columns null).
+    """
+    key = DATASETS[dataset]['key']
+    df = _coerce(df, dataset)
+    if os.path.exists(path):
+        df_existing = pd.read_parquet(path).reindex(columns=df.columns)
+        df = pd.concat([_coerce(df_existing, dataset), df], ignore_index=True)
+        if key is not None:
+            df = df.drop_duplicates(subset=key, keep='last')
+    write_parquet(df, path, dataset, row_group_size=row_group_size)
+    return df
+
+def write_partitions(df: pd.DataFrame, root: str, dataset: str, filename: str, partition_by: str = 'date',
+                     append: bool = True) -> List[str]:
+    """Writes df as {root}/{partition value}/{filename}, one file per distinct partition_by value.
+
+    With append, each partition's rows are upserted into any existing file (upsert_parquet); otherwise the
+    file is replaced. Date partitions are named YYYY-MM-DD. Returns the paths written.
+    """
+    values = df[partition_by]
+    if pa.types.is_date(DATASETS[dataset]['schema'].field(partition_by).type):
+        values = pd.to_datetime(values).dt.strftime('%Y-%m-%d')
+
+    paths = []
+    for value, df_part in df.groupby(values, sort=True):
+        path = os.path.join(root, str(value), filename)
+        if append:
+            upsert_parquet(df_part, path, dataset)
+        else:
+            write_parquet(df_part, path, dataset)
+        paths.append(path)
+    return paths
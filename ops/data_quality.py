@@ -0,0 +1,270 @@
+import glob
+import hashlib
+import os
+import uuid
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Dict, Iterable, List, Optional, Tuple
+from ops.instrumentation import instrument, span, increment
+from ingestion.writers import write_parquet
+
+QUALITY_DIR = 'data/lake/quality'
+QUALITY_COLUMNS = ['checked_at', 'dataset', 'partition', 'fingerprint', 'check', 'value', 'threshold', 'passed', 'detail']
+
+# Column kinds: 'temporal' accepts ISO strings as well as date/timestamp columns (checked for parseability
+# instead), 'number' accepts any integer or float type.
+# partition_by: 'directory' groups the files of one directory into a partition (ohlcv date directories),
+# 'file' makes every file its own partition.
+# max_null_rate: columns not listed may be null freely.
+# partition_date: the partition name is the session date, and every row's date must match it.
+DATASETS: Dict[str, dict] = {
+    'ohlcv_daily': {
+        'pattern': 'data/lake/ohlcv/*/*.parquet',
+        'partition_by': 'directory',
+        'schema': {'date': 'temporal', 'symbol': 'string', 'open': 'float', 'high': 'float', 'low': 'float',
+                   'close': 'float', 'volume': 'number'},
+        'max_null_rate': {'date': 0.0, 'symbol': 0.0, 'open': 0.0, 'high': 0.0, 'low': 0.0, 'close': 0.0, 'volume': 0.0},
+        'key': ['date', 'symbol'],
+        'ohlc': True,
+        'date_column': 'date',
+        'partition_date': True,
+    },
+    'news_norm': {
+        'pattern': 'data/lake/news_norm/*.parquet',
+        'partition_by': 'file',
+        'schema': {'ts': 'temporal', 'symbol': 'string', 'source': 'string', 'title': 'string', 'text': 'string',
+                   'url': 'string'},
+        'max_null_rate': {'ts': 0.0, 'symbol': 0.0, 'title': 0.0},
+        # normalize_text deduplicates on (ts, source, title), so one headline syndicated by two sources is two rows
+        'key': ['ts', 'symbol', 'source', 'title'],
+    },
+    'features_daily': {
+        'pattern': 'data/lake/features/daily/*.parquet',
+        'partition_by': 'file',
+        'schema': {'date': 'temporal', 'symbol': 'string', 'r20': 'float', 'rsi14': 'float', 'news_sent': 'float',
+                   'news_conf': 'float', 'news_count': 'integer', 'news_sent_decay': 'float'},
+        # RSI is undefined until a symbol has 14 sessions, which only the oldest rows can lack
+        'max_null_rate': {'date': 0.0, 'symbol': 0.0, 'r20': 0.0, 'rsi14': 0.01},
+        'key': ['date', 'symbol'],
+        'date_column': 'date',
+    },
+}
+
+class DataQualityError(Exception):
+    """Raised when a validated partition fails a check; results holds the failing rows of the quality table."""
+
+    def __init__(self, results: pd.DataFrame):
+        self.results = results
+        failures = [f"{row.dataset}/{row.partition}: {row.check}={row.value:g} (max {row.threshold:g}){' ' + row.detail if row.detail else ''}"
+                    for row in results.itertuples()]
+        super().__init__(f"{len(failures)} data quality check(s) failed:\n" + "\n".join(failures[:20]))
+
+def _kind_matches(kind: str, dtype: pa.DataType) -> bool:
+    if pa.types.is_dictionary(dtype):
+        dtype = dtype.value_type
+    if kind == 'string':
+        return pa.types.is_string(dtype) or pa.types.is_large_string(dtype)
+    if kind == 'float':
+        return pa.types.is_floating(dtype)
+    if kind == 'integer':
+        return pa.types.is_integer(dtype)
+    if kind == 'number':
+        return pa.types.is_integer(dtype) or pa.types.is_floating(dtype)
+    if kind == 'temporal':
+        return (pa.types.is_string(dtype) or pa.types.is_large_string(dtype) or pa.types.is_date(dtype)
+                or pa.types.is_timestamp(dtype))
+    raise ValueError(f"Unknown column kind: {kind}")
+
+def _schema_errors(path: str, expected: Dict[str, str]) -> List[str]:
+    """Footer-only schema check of one file: missing columns and columns of the wrong kind."""
+    schema = pq.read_schema(path)
+    errors = []
+    for column, kind in expected.items():
+        index = schema.get_field_index(column)
+        if index < 0:
+            errors.append(f"{column}: missing")
+        elif not _kind_matches(kind, schema.field(index).type):
+            errors.append(f"{column}: expected {kind}, got {schema.field(index).type}")
+    return errors
+
+def list_partitions(dataset: str) -> Dict[str, Tuple[str, List[str]]]:
+    """partition name -> (fingerprint, files) for a dataset.
+
+    The fingerprint hashes each file's (name, size, mtime_ns), so any rewrite of a partition makes it new again.
+    """
+    spec = DATASETS[dataset]
+    grouped: Dict[str, List[str]] = {}
+    for path in sorted(glob.glob(spec['pattern'])):
+        if spec['partition_by'] == 'directory':
+            name = os.path.basename(os.path.dirname(path))
+        else:
+            name = os.path.basename(path)
+        grouped.setdefault(name, []).append(path)
+
+    partitions = {}
+    for name, files in grouped.items():
+        digest = hashlib.sha256()
+        for path in files:
+            stat = os.stat(path)
+            digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        partitions[name] = (digest.hexdigest(), files)
+    return partitions
+
+def load_quality_results(quality_dir: str = QUALITY_DIR) -> pd.DataFrame:
+    files = sorted(glob.glob(os.path.join(quality_dir, '*.parquet')))
+    if not files:
+        return pd.DataFrame(columns=QUALITY_COLUMNS)
+    return pd.concat([pd.read_parquet(path) for path in files], ignore_index=True)
+
+def _passed_fingerprints(df_results: pd.DataFrame, dataset: str) -> set:
+    df = df_results[df_results['dataset'] == dataset]
+    if df.empty:
+        return set()
+    passed = df.groupby(['partition', 'fingerprint'])['passed'].all()
+    return {key for key, ok in passed.items() if ok}
+
+def _checks_query(spec: dict) -> Tuple[str, List[Tuple[str, float]]]:
+    """One aggregate query over all files being validated, grouped by partition.
+
+    Returns the SQL and the (check, threshold) pairs it computes, in column order after partition and rows.
+    Null checks yield rates; every other check yields a count of offending rows that must be zero.
+    """
+    selects, checks = [], []
+    for column, max_rate in spec['max_null_rate'].items():
+        selects.append(f"(COUNT(*) - COUNT({column})) / COUNT(*)::DOUBLE AS null_rate_{column}")
+        checks.append((f"null_rate_{column}", max_rate))
+
+    key = ', '.join(spec['key'])
+    selects.append(f"COUNT(*) - COUNT(DISTINCT ({key})) AS duplicate_keys")
+    checks.append(("duplicate_keys", 0.0))
+
+    if spec.get('ohlc'):
+        selects.append("COUNT(*) FILTER (WHERE high < GREATEST(open, close) OR low > LEAST(open, close) "
+                       "OR low <= 0 OR volume < 0) AS ohlc_violations")
+        checks.append(("ohlc_violations", 0.0))
+
+    for column, kind in spec['schema'].items():
+        if kind == 'temporal':
+            selects.append(f"COUNT(*) FILTER (WHERE {column} IS NOT NULL AND TRY_CAST({column} AS TIMESTAMPTZ) IS NULL) "
+                           f"AS unparseable_{column}")
+            checks.append((f"unparseable_{column}", 0.0))
+
+    window = ""
+    date_column = spec.get('date_column')
+    if date_column:
+        # Dates must strictly increase per symbol in storage order (catches both unsorted appends and repeats)
+        window = (f", TRY_CAST({date_column} AS TIMESTAMPTZ) AS _date, "
+                  f"LAG(TRY_CAST({date_column} AS TIMESTAMPTZ)) OVER (PARTITION BY _file, symbol ORDER BY _row) AS _prev_date")
+        selects.append("COUNT(*) FILTER (WHERE _date <= _prev_date) AS non_monotonic_dates")
+        checks.append(("non_monotonic_dates", 0.0))
+        if spec.get('partition_date'):
+            selects.append("COUNT(*) FILTER (WHERE CAST(_date AS DATE) <> TRY_CAST(_partition AS DATE)) AS partition_date_mismatch")
+            checks.append(("partition_date_mismatch", 0.0))
+
+    query = f"""
+    WITH src AS (
+      SELECT *, filename AS _file, file_row_number AS _row
+      FROM read_parquet(?, union_by_name = true, filename = true, file_row_number = true)
+    ),
+    checked AS (
+      SELECT src.*, p.partition AS _partition {window}
+      FROM src JOIN partition_files p ON src._file = p.file
+    )
+    SELECT _partition AS partition, COUNT(*) AS rows, {', '.join(selects)}
+    FROM checked
+    GROUP BY _partition
+    """
+    return query, checks
+
+def validate_partitions(dataset: str, partitions: Dict[str, Tuple[str, List[str]]]) -> pd.DataFrame:
+    """Runs every check for the given partitions of a dataset and returns quality-table rows.
+
+    Schema is checked from file footers; partitions that fail it are not scanned. All other checks run in a
+    single DuckDB scan of the remaining files.
+    """
+    spec = DATASETS[dataset]
+    checked_at = pd.Timestamp.now(tz='UTC')
+    records = []
+
+    def record(partition: str, check: str, value: float, threshold: float, detail: str = '') -> None:
+        records.append({
+            'checked_at': checked_at, 'dataset': dataset, 'partition': partition,
+            'fingerprint': partitions[partition][0], 'check': check, 'value': float(value),
+            'threshold': float(threshold), 'passed': bool(value <= threshold), 'detail': detail,
+        })
+
+    scan = {}
+    for partition, (_, files) in partitions.items():
+        errors = [f"{os.path.basename(path)} {error}" for path in files for error in _schema_errors(path, spec['schema'])]
+        record(partition, 'schema', len(errors), 0, '; '.join(errors[:5]))
+        if not errors:
+            scan[partition] = files
+
+    if scan:
+        df_files = pd.DataFrame([(path, partition) for partition, files in scan.items() for path in files],
+                                columns=['file', 'partition'])
+        query, checks = _checks_query(spec)
+        conn = duckdb.connect()
+        conn.execute("SET TimeZone = 'UTC'")
+        conn.register('partition_files', df_files)
+        with span("validate_partitions.scan", dataset=dataset, partitions=len(scan), files=len(df_files)):
+            df_checks = conn.execute(query, [df_files['file'].tolist()]).fetchdf().set_index('partition')
+        conn.close()
+
+        for partition in scan:
+            if partition not in df_checks.index:
+                record(partition, 'empty_partition', 1, 0)
+                continue
+            row = df_checks.loc[partition]
+            record(partition, 'empty_partition', 0, 0, f"rows={int(row['rows'])}")
+            for check, threshold in checks:
+                record(partition, check, row[check], threshold)
+
+    return pd.DataFrame(records, columns=QUALITY_COLUMNS)
+
+def write_quality_results(df_results: pd.DataFrame, quality_dir: str = QUALITY_DIR) -> Optional[str]:
+    """Appends one validation run to the quality table (one Parquet file per run) and registers the view."""
+    if df_results.empty:
+        return None
+    path = os.path.join(quality_dir, f'{uuid.uuid4().hex}.parquet')
+    write_parquet(df_results, path, 'data_quality')
+
+    conn = duckdb.connect(database='./data/trading.duckdb', read_only=False)
+    conn.execute(f"CREATE OR REPLACE VIEW data_quality AS SELECT * FROM parquet_scan('{quality_dir}/*.parquet');")
+    conn.close()
+    return path
+
+@instrument("validate_new_partitions")
+def validate_new_partitions(datasets: Iterable[str], quality_dir: str = QUALITY_DIR,
+                            raise_on_failure: bool = True) -> pd.DataFrame:
+    """Validates partitions of the datasets that have not passed validation in their current form.
+
+    A partition counts as validated while its fingerprint matches one whose checks all passed, so a daily run
+    only scans what ingestion or feature engineering just (re)wrote. Results are appended to the quality table
+    before DataQualityError is raised for any failed check.
+    """
+    df_previous = load_quality_results(quality_dir)
+    frames = []
+    for dataset in datasets:
+        passed = _passed_fingerprints(df_previous, dataset)
+        new = {name: part for name, part in list_partitions(dataset).items() if (name, part[0]) not in passed}
+        increment(f"validate_new_partitions.{dataset}.partitions", len(new))
+        if new:
+            frames.append(validate_partitions(dataset, new))
+        print(f"Validated {len(new)} new partition(s) of {dataset}")
+
+    df_results = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=QUALITY_COLUMNS)
+    write_quality_results(df_results, quality_dir)
+
+    failed = df_results[~df_results['passed'].astype(bool)]
+    if raise_on_failure and not failed.empty:
+        raise DataQualityError(failed)
+    return df_results
+
+if __name__ == "__main__":
+    # Example Usage:
+    # Requires ingest_market.py / normalize_text.py / features/daily.py output in data/lake
+    df = validate_new_partitions(['ohlcv_daily', 'news_norm', 'features_daily'], raise_on_failure=False)
+    print(df[~df['passed']] if not df.empty else "Nothing new to validate.")
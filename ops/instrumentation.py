@@ -0,0 +1,247 @@
+import contextvars
+import cProfile
+import functools
+import inspect
+import json
+import os
+import pstats
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+# Comma-separated span names to profile, e.g. TRADING_PROFILE=run_sentiment,calculate_daily_features.
+# "*" profiles every span (expect overhead). TRADING_PROFILE_MODE picks the profiler: "cprofile" (default)
+# writes <span>-<pid>-<n>.prof for pstats/snakeviz; "py-spy" attaches `py-spy record` to this process for the
+# span and writes a speedscope .json. Output goes to TRADING_PROFILE_DIR (default data/profiles).
+PROFILE_ENV = "TRADING_PROFILE"
+PROFILE_MODE_ENV = "TRADING_PROFILE_MODE"
+PROFILE_DIR_ENV = "TRADING_PROFILE_DIR"
+TRACE_DIR = 'data/traces'
+MAX_SPANS = 100_000
+# Histograms keep the most recent values only, so a per-event observe() in a long-running service stays bounded
+MAX_HISTOGRAM_VALUES = 10_000
+
+_current_span: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_span", default=None)
+# Set while a span in this context is being profiled; enabling a second cProfile would replace the outer one
+_profiling: contextvars.ContextVar[bool] = contextvars.ContextVar("profiling", default=False)
+
+class Tracer:
+    """Process-local store of finished spans, counters and histograms."""
+
+    def __init__(self, max_spans: int = MAX_SPANS, max_histogram_values: int = MAX_HISTOGRAM_VALUES):
+        self.run_id = uuid.uuid4().hex
+        self.enabled = os.environ.get("TRADING_TRACE", "1") != "0"
+        self._lock = threading.Lock()
+        self.spans: deque = deque(maxlen=max_spans)
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.histograms: Dict[str, deque] = defaultdict(lambda: deque(maxlen=max_histogram_values))
+        self._profile_counter = 0
+
+    def record_span(self, record: dict) -> None:
+        with self._lock:
+            self.spans.append(record)
+            self.counters[f"{record['name']}.calls"] += 1
+            if record['error']:
+                self.counters[f"{record['name']}.errors"] += 1
+            self.histograms[f"{record['name']}.duration_s"].append(record['duration_s'])
+
+    def increment(self, name: str, value: float = 1.0) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            self.histograms[name].append(value)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+            self.histograms.clear()
+
+    def histogram_summary(self) -> pd.DataFrame:
+        """count/mean/p50/p95/p99/max per histogram, over its most recent max_histogram_values values."""
+        with self._lock:
+            items = {name: np.asarray(values, dtype=np.float64) for name, values in self.histograms.items() if values}
+        rows = [{
+            'name': name, 'count': len(values), 'mean': values.mean(),
+            'p50': np.percentile(values, 50), 'p95': np.percentile(values, 95),
+            'p99': np.percentile(values, 99), 'max': values.max(),
+        } for name, values in items.items()]
+        return pd.DataFrame(rows, columns=['name', 'count', 'mean', 'p50', 'p95', 'p99', 'max'])
+
+    def spans_frame(self) -> pd.DataFrame:
+        with self._lock:
+            records = list(self.spans)
+        columns = ['run_id', 'span_id', 'parent_id', 'name', 'start_ts', 'duration_s', 'pid', 'thread', 'error', 'attributes']
+        df = pd.DataFrame(records, columns=columns)
+        df['attributes'] = df['attributes'].map(lambda attrs: json.dumps(attrs, default=str))
+        return df
+
+    def _profile_path(self, name: str, extension: str) -> str:
+        with self._lock:
+            self._profile_counter += 1
+            counter = self._profile_counter
+        output_dir = os.environ.get(PROFILE_DIR_ENV, 'data/profiles')
+        os.makedirs(output_dir, exist_ok=True)
+        return os.path.join(output_dir, f"{name.replace('/', '_')}-{os.getpid()}-{counter}{extension}")
+
+_TRACER = Tracer()
+
+def get_tracer() -> Tracer:
+    return _TRACER
+
+class _StageProfiler:
+    """Opt-in profiler for a single span, in cProfile or py-spy mode."""
+
+    def __init__(self, name: str):
+        self.mode = os.environ.get(PROFILE_MODE_ENV, "cprofile")
+        self.path = _TRACER._profile_path(name, '.json' if self.mode == "py-spy" else '.prof')
+        self._profile: Optional[cProfile.Profile] = None
+        self._process: Optional[subprocess.Popen] = None
+
+    def start(self) -> None:
+        if self.mode == "py-spy":
+            self._process = subprocess.Popen(["py-spy", "record", "--pid", str(os.getpid()), "--format", "speedscope",
+                                              "--output", self.path, "--nonblocking"])
+        else:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self) -> str:
+        if self._process is not None:
+            # py-spy writes its output when interrupted
+            self._process.send_signal(signal.SIGINT)
+            self._process.wait(timeout=60)
+        elif self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.path)
+        return self.path
+
+def _profiled(name: str) -> bool:
+    profiled = {entry.strip() for entry in os.environ.get(PROFILE_ENV, "").split(",") if entry.strip()}
+    return name in profiled or "*" in profiled
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[dict]:
+    """Times a block as a named span. The yielded dict can be filled with extra attributes (e.g. rows)."""
+    tracer = _TRACER
+    if not tracer.enabled:
+        yield attributes
+        return
+
+    span_id = uuid.uuid4().hex[:16]
+    token = _current_span.set(span_id)
+    # Spans nested in a profiled span are already covered by its profile
+    profiler = _StageProfiler(name) if _profiled(name) and not _profiling.get() else None
+    profiling_token = _profiling.set(True) if profiler is not None else None
+
+    start_ts = pd.Timestamp.now(tz='UTC')
+    error = None
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.start()
+    try:
+        yield attributes
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration_s = time.perf_counter() - start
+        if profiler is not None:
+            attributes['profile'] = profiler.stop()
+            _profiling.reset(profiling_token)
+        _current_span.reset(token)
+        tracer.record_span({
+            'run_id': tracer.run_id, 'span_id': span_id, 'parent_id': _current_span.get(), 'name': name,
+            'start_ts': start_ts, 'duration_s': duration_s, 'pid': os.getpid(),
+            'thread': threading.current_thread().name, 'error': error, 'attributes': dict(attributes),
+        })
+
+def instrument(name: Optional[str] = None) -> Callable:
+    """Decorator form of span(). Works on plain and async functions; the span name defaults to the function name."""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+def increment(name: str, value: float = 1.0) -> None:
+    """Adds to a named counter (e.g. rows written)."""
+    if _TRACER.enabled:
+        _TRACER.increment(name, value)
+
+def observe(name: str, value: float) -> None:
+    """Records one value in a named histogram (e.g. batch size, latency)."""
+    if _TRACER.enabled:
+        _TRACER.observe(name, value)
+
+def export_trace(path: Optional[str] = None) -> Optional[str]:
+    """Writes the spans recorded in this process to JSON or Parquet (picked from the extension).
+
+    The default path is data/traces/trace-<run_id>-<pid>.parquet, so workers of a process pool
+    each write their own file. Counters and histogram summaries go to a sibling .metrics.json file.
+    """
+    df_spans = _TRACER.spans_frame()
+    if df_spans.empty:
+        return None
+
+    path = path or os.path.join(TRACE_DIR, f"trace-{_TRACER.run_id}-{os.getpid()}.parquet")
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if path.endswith('.json'):
+        df_spans.assign(start_ts=df_spans['start_ts'].astype(str)).to_json(path, orient='records', indent=2)
+    else:
+        df_spans.to_parquet(path, index=False)
+
+    metrics = {
+        'counters': dict(_TRACER.counters),
+        'histograms': _TRACER.histogram_summary().to_dict(orient='records'),
+    }
+    with open(os.path.splitext(path)[0] + '.metrics.json', 'w') as f:
+        json.dump(metrics, f, indent=2, default=float)
+    print(f"Trace with {len(df_spans)} spans written to {path}")
+    return path
+
+def log_trace_to_mlflow(trace_path: Optional[str] = None) -> None:
+    """Logs counters and histogram p50/p95/max as MLflow metrics (and the trace file as an artifact) on the active run."""
+    import mlflow
+
+    metrics = {name.replace('.', '/'): value for name, value in _TRACER.counters.items()}
+    for row in _TRACER.histogram_summary().to_dict(orient='records'):
+        for stat in ('p50', 'p95', 'max'):
+            metrics[f"{row['name'].replace('.', '/')}/{stat}"] = row[stat]
+
+    def _log():
+        mlflow.log_metrics(metrics)
+        if trace_path is not None and os.path.exists(trace_path):
+            mlflow.log_artifact(trace_path)
+
+    if mlflow.active_run() is None:
+        with mlflow.start_run(run_name=f"trace-{_TRACER.run_id}"):
+            _log()
+    else:
+        _log()
+
+def print_profile(path: str, limit: int = 30) -> None:
+    """Prints the top functions by cumulative time from a .prof file written in profile mode."""
+    pstats.Stats(path).sort_stats('cumulative').print_stats(limit)
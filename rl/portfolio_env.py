@@ -0,0 +1,289 @@
+import duckdb
+import gymnasium as gym
+import numpy as np
+import pandas as pd
+from gymnasium import spaces
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+from ingestion.price_panel import load_ohlcv_frames, open_price_panel
+
+DEFAULT_FEATURE_COLUMNS = ['r20', 'rsi14', 'news_sent', 'news_conf', 'news_sent_decay']
+
+class PortfolioData:
+    """Dense (dates x symbols) arrays an episode steps through.
+
+    Decisions are made on day t's close and filled at day t+1's open, as PortfolioStrategy's market orders
+    are, so each step is split into the overnight gap (close t -> open t+1) and the session (open t+1 ->
+    close t+1). Both returns are precomputed with missing prices as 0, and a symbol is tradable on t+1 only
+    if it has a positive open and close there.
+
+    Features are standardized per column with feature_scaler, a (mean, std) pair. Without one it is fitted on
+    this range, which is only valid for training data: build evaluation data with the training range's
+    feature_scaler so its observations carry no statistics from the dates being evaluated.
+    """
+
+    def __init__(self, dates: Sequence, symbols: Sequence[str], opens: np.ndarray, closes: np.ndarray,
+                 features: np.ndarray, feature_columns: Sequence[str],
+                 feature_scaler: Optional[Tuple[np.ndarray, np.ndarray]] = None):
+        self.dates = pd.DatetimeIndex(dates)
+        self.symbols = list(symbols)
+        self.feature_columns = list(feature_columns)
+        opens = np.asarray(opens, dtype=np.float64)
+        closes = np.asarray(closes, dtype=np.float64)
+        if len(self.dates) < 2:
+            raise ValueError("PortfolioData needs at least two dates")
+
+        # Features are scaled per column, so RSI (0-100) and returns share a scale
+        features = np.asarray(features, dtype=np.float64)
+        if feature_scaler is None:
+            feature_scaler = (np.nanmean(features, axis=(0, 1), keepdims=True),
+                              np.nanstd(features, axis=(0, 1), keepdims=True))
+        self.feature_scaler = feature_scaler
+        mean, std = feature_scaler
+        scaled = (features - np.nan_to_num(mean)) / np.where(np.nan_to_num(std) > 0, std, 1.0)
+        self.features = np.nan_to_num(scaled, nan=0.0).astype(np.float32)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gap = opens[1:] / closes[:-1] - 1
+            session = closes[1:] / opens[1:] - 1
+        self.tradable = np.isfinite(opens[1:]) & np.isfinite(closes[1:]) & (opens[1:] > 0) & (closes[1:] > 0)
+        self.gap = np.where(np.isfinite(gap), gap, 0.0)
+        self.session = np.where(np.isfinite(session), session, 0.0)
+
+    @property
+    def n_steps(self) -> int:
+        """Rebalances available in the range (one per date except the last)."""
+        return len(self.dates) - 1
+
+    @classmethod
+    def from_lake(cls, symbols: List[str], start_date: str, end_date: str,
+                  feature_columns: Sequence[str] = DEFAULT_FEATURE_COLUMNS,
+                  feature_scaler: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> 'PortfolioData':
+        """Prices from the price panel (ohlcv_daily if none is built) and features from features_daily.
+
+        Pass the training data's feature_scaler when loading an evaluation range.
+        """
+        panel = open_price_panel()
+        if panel is not None:
+            opens = panel.frame('open', symbols, start_date, end_date)
+            closes = panel.frame('close', symbols, start_date, end_date)
+        else:
+            frames = load_ohlcv_frames(symbols, start_date, end_date)
+            opens = pd.DataFrame({s: f['Open'] for s, f in frames.items()}).reindex(columns=symbols).sort_index()
+            closes = pd.DataFrame({s: f['Close'] for s, f in frames.items()}).reindex(columns=symbols).sort_index()
+
+        conn = duckdb.connect(database='./data/trading.duckdb', read_only=True)
+        df_features = conn.execute(
+            f"SELECT date, symbol, {', '.join(feature_columns)} FROM features_daily "
+            "WHERE symbol IN (SELECT UNNEST(?)) AND date >= ? AND date <= ?",
+            [symbols, start_date, end_date]
+        ).fetchdf()
+        conn.close()
+
+        df_features['date'] = pd.to_datetime(df_features['date'])
+        df_features['symbol'] = df_features['symbol'].astype(str)
+        grid = pd.MultiIndex.from_product([closes.index, symbols], names=['date', 'symbol'])
+        values = df_features.set_index(['date', 'symbol'])[list(feature_columns)].reindex(grid).to_numpy()
+        features = values.reshape(len(closes.index), len(symbols), len(feature_columns))
+        return cls(closes.index, symbols, opens.to_numpy(), closes.to_numpy(), features, feature_columns,
+                   feature_scaler=feature_scaler)
+
+def action_to_weights(actions: np.ndarray, gross_limit: float = 1.0, max_weight: float = 0.1,
+                      allow_short: bool = False) -> np.ndarray:
+    """Maps raw actions in [-1, 1] (one row per env) to target weights.
+
+    Long-only drops negative actions. Rows whose gross exposure exceeds gross_limit are scaled down to it and
+    every weight is then clipped to +/- max_weight, the same order target_weights applies to alphas.
+    """
+    weights = np.clip(actions, -1.0 if allow_short else 0.0, 1.0)
+    gross = np.abs(weights).sum(axis=-1, keepdims=True)
+    scale = np.where(gross > gross_limit, gross_limit / np.where(gross > 0, gross, 1.0), 1.0)
+    return np.clip(weights * scale, -max_weight, max_weight)
+
+def portfolio_step(data: PortfolioData, t: np.ndarray, weights: np.ndarray, target: np.ndarray,
+                   commission: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Advances a batch of portfolios from close t to close t+1. Returns (growth, new weights, turnover).
+
+    Holdings drift over the gap, the book is rebalanced to target at the open paying commission on traded
+    notional (Backtrader's percentage commission, as in run_backtest), and the new book earns the session
+    return. Names that cannot trade on t+1 keep their drifted weight. Cash earns nothing.
+    """
+    gap, session, tradable = data.gap[t], data.session[t], data.tradable[t]
+
+    gap_growth = 1.0 + (weights * gap).sum(axis=1)
+    drifted = weights * (1.0 + gap) / gap_growth[:, None]
+    target = np.where(tradable, target, drifted)
+    turnover = np.abs(target - drifted).sum(axis=1)
+
+    session_growth = 1.0 + (target * session).sum(axis=1)
+    growth = gap_growth * (1.0 - commission * turnover) * session_growth
+    new_weights = target * (1.0 + session) / session_growth[:, None]
+    return growth, new_weights, turnover
+
+class PortfolioEnv(gym.Env):
+    """Single-portfolio Gymnasium environment over PortfolioData.
+
+    Observation: (symbols, features + 1) float32, the scaled feature vector of each symbol on day t with the
+    symbol's current portfolio weight appended. Action: (symbols,) in [-1, 1], mapped to target weights by
+    action_to_weights. Reward: log growth of equity from close t to close t+1, net of commission.
+    Episodes start at a random date and last episode_length steps (or run to the end of the data).
+    """
+
+    metadata = {"render_modes": []}
+
+    def __init__(self, data: PortfolioData, episode_length: Optional[int] = 252, commission: float = 0.001,
+                 gross_limit: float = 1.0, max_weight: float = 0.1, allow_short: bool = False):
+        self.data = data
+        self.episode_length = min(episode_length or data.n_steps, data.n_steps)
+        self.commission = commission
+        self.gross_limit = gross_limit
+        self.max_weight = max_weight
+        self.allow_short = allow_short
+
+        n_symbols, n_features = len(data.symbols), len(data.feature_columns)
+        self.observation_space = spaces.Box(-np.inf, np.inf, shape=(n_symbols, n_features + 1), dtype=np.float32)
+        self.action_space = spaces.Box(-1.0, 1.0, shape=(n_symbols,), dtype=np.float32)
+
+        self._t = np.zeros(1, dtype=np.int64)
+        self._end = 0
+        self._weights = np.zeros((1, n_symbols))
+        self._equity = 1.0
+
+    def _observation(self) -> np.ndarray:
+        obs = np.empty(self.observation_space.shape, dtype=np.float32)
+        obs[:, :-1] = self.data.features[self._t[0]]
+        obs[:, -1] = self._weights[0]
+        return obs
+
+    def reset(self, *, seed: Optional[int] = None, options: Optional[dict] = None) -> Tuple[np.ndarray, dict]:
+        super().reset(seed=seed)
+        start = int(self.np_random.integers(0, self.data.n_steps - self.episode_length + 1))
+        self._t[0], self._end = start, start + self.episode_length
+        self._weights[:] = 0.0
+        self._equity = 1.0
+        return self._observation(), {"date": self.data.dates[start]}
+
+    def step(self, action: np.ndarray) -> Tuple[np.ndarray, float, bool, bool, dict]:
+        target = action_to_weights(np.asarray(action, dtype=np.float64)[None, :], self.gross_limit,
+                                   self.max_weight, self.allow_short)
+        growth, self._weights, turnover = portfolio_step(self.data, self._t, self._weights, target, self.commission)
+        self._equity *= growth[0]
+        self._t += 1
+        truncated = bool(self._t[0] >= self._end)
+        info = {"equity": self._equity, "turnover": turnover[0], "date": self.data.dates[self._t[0]]}
+        return self._observation(), float(np.log(growth[0])), False, truncated, info
+
+class BatchedPortfolioEnv(VecEnv):
+    """n_envs independent portfolios over the same PortfolioData, stepped together in NumPy.
+
+    A drop-in VecEnv for stable-baselines3: one vectorized portfolio_step per call instead of n_envs Python
+    env steps (or n_envs pipe round trips with SubprocVecEnv). Finished episodes reset automatically and
+    report their last observation in info["terminal_observation"], per the VecEnv convention.
+    """
+
+    def __init__(self, data: PortfolioData, n_envs: int, episode_length: Optional[int] = 252,
+                 commission: float = 0.001, gross_limit: float = 1.0, max_weight: float = 0.1,
+                 allow_short: bool = False, seed: Optional[int] = None):
+        template = PortfolioEnv(data, episode_length, commission, gross_limit, max_weight, allow_short)
+        self.render_mode = None
+        super().__init__(n_envs, template.observation_space, template.action_space)
+        self.data = data
+        self.episode_length = template.episode_length
+        self.commission = commission
+        self.gross_limit = gross_limit
+        self.max_weight = max_weight
+        self.allow_short = allow_short
+
+        self._rng = np.random.default_rng(seed)
+        self._t = np.zeros(n_envs, dtype=np.int64)
+        self._end = np.zeros(n_envs, dtype=np.int64)
+        self._weights = np.zeros((n_envs, len(data.symbols)))
+        self._equity = np.ones(n_envs)
+        self._actions: Optional[np.ndarray] = None
+
+    def _reset_envs(self, mask: np.ndarray) -> None:
+        n = int(mask.sum())
+        start = self._rng.integers(0, self.data.n_steps - self.episode_length + 1, size=n)
+        self._t[mask], self._end[mask] = start, start + self.episode_length
+        self._weights[mask] = 0.0
+        self._equity[mask] = 1.0
+
+    def _observations(self) -> np.ndarray:
+        obs = np.empty((self.num_envs, *self.observation_space.shape), dtype=np.float32)
+        obs[:, :, :-1] = self.data.features[self._t]
+        obs[:, :, -1] = self._weights
+        return obs
+
+    def reset(self) -> np.ndarray:
+        self._reset_envs(np.ones(self.num_envs, dtype=bool))
+        return self._observations()
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self._actions = actions
+
+    def step_wait(self):
+        target = action_to_weights(np.asarray(self._actions, dtype=np.float64), self.gross_limit,
+                                   self.max_weight, self.allow_short)
+        growth, self._weights, turnover = portfolio_step(self.data, self._t, self._weights, target, self.commission)
+        self._equity *= growth
+        self._t += 1
+        rewards = np.log(growth).astype(np.float32)
+
+        dones = self._t >= self._end
+        obs = self._observations()
+        infos = [{"equity": equity, "turnover": turn} for equity, turn in zip(self._equity, turnover)]
+        if dones.any():
+            for i in np.flatnonzero(dones):
+                # Episodes end on time, not on a terminal state, so bootstrapping past them is valid
+                infos[i]["terminal_observation"] = obs[i].copy()
+                infos[i]["TimeLimit.truncated"] = True
+            self._reset_envs(dones)
+            obs[dones] = self._observations()[dones]
+        return obs, rewards, dones, infos
+
+    def seed(self, seed: Optional[int] = None) -> List[Optional[int]]:
+        self._rng = np.random.default_rng(seed)
+        return [seed] * self.num_envs
+
+    def close(self) -> None:
+        pass
+
+    def get_attr(self, attr_name: str, indices=None) -> List[Any]:
+        return [getattr(self, attr_name)] * len(self._get_indices(indices))
+
+    def set_attr(self, attr_name: str, value: Any, indices=None) -> None:
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> List[Any]:
+        # As with get_attr, the envs are rows of one object: the method runs once, on the whole batch
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result] * len(self._get_indices(indices))
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        return [False] * len(self._get_indices(indices))
+
+def make_env(data: PortfolioData, seed: int = 0, **env_kwargs) -> Callable[[], PortfolioEnv]:
+    """Env factory for SubprocVecEnv/DummyVecEnv: make_vec_env-style thunk that seeds its env on first reset."""
+    def _init() -> PortfolioEnv:
+        env = PortfolioEnv(data, **env_kwargs)
+        env.reset(seed=seed)
+        return env
+    return _init
+
+if __name__ == "__main__":
+    # Example Usage:
+    # Requires the price panel (or ohlcv_daily) and features_daily
+    from stable_baselines3 import PPO
+
+    data = PortfolioData.from_lake(["AAPL", "MSFT"], "2020-01-01", "2022-12-31")
+    vec_env = BatchedPortfolioEnv(data, n_envs=64, episode_length=126, seed=0)
+    model = PPO("MlpPolicy", vec_env, n_steps=128, batch_size=1024, verbose=1)
+    model.learn(total_timesteps=200_000)
+
+    # Out-of-sample year, scaled with the training years' statistics
+    eval_data = PortfolioData.from_lake(["AAPL", "MSFT"], "2023-01-01", "2023-12-31", feature_scaler=data.feature_scaler)
+    eval_env = PortfolioEnv(eval_data, episode_length=None)
+
+    # The same data through separate processes, for envs that are not NumPy-batched
+    # from stable_baselines3.common.vec_env import SubprocVecEnv
+    # vec_env = SubprocVecEnv([make_env(data, seed=i) for i in range(8)])
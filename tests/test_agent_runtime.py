@@ -0,0 +1,102 @@
+import os
+import sys
+import threading
+import time
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.runtime import Agent, ModelScheduler
+
+class EchoAgent(Agent):
+    """Doubles each value; records every batch and model load."""
+
+    def __init__(self, scheduler, model_key='echo', nbytes=100, log=None):
+        super().__init__(scheduler)
+        self.model_key = model_key
+        self.nbytes = nbytes
+        self.log = log if log is not None else {'batches': [], 'loads': []}
+
+    def load_model(self):
+        self.log['loads'].append(self.model_key)
+        return self.model_key
+
+    def model_bytes(self, model):
+        return self.nbytes
+
+    def predict(self, model, items):
+        self.log['batches'].append((model, list(items)))
+        if 'boom' in items:
+            raise RuntimeError("bad input")
+        return [2 * x for x in items]
+
+    def inputs(self, df):
+        return df['x'].tolist()
+
+    def to_frame(self, df, outputs):
+        return df.assign(y=outputs)
+
+@pytest.fixture
+def scheduler():
+    scheduler = ModelScheduler(memory_budget_bytes=250, max_batch_size=4, max_latency_ms=50)
+    yield scheduler
+    scheduler.close()
+
+def test_run_splits_into_micro_batches(scheduler):
+    agent = EchoAgent(scheduler)
+    df = agent.run(pd.DataFrame({'x': range(10)}))
+    assert df['y'].tolist() == [2 * x for x in range(10)]
+    assert [len(items) for _, items in agent.log['batches']] == [4, 4, 2]
+    assert agent.log['loads'] == ['echo']
+    assert agent.run(pd.DataFrame({'x': []}))['y'].tolist() == []
+
+def test_requests_from_several_agents_are_coalesced(scheduler):
+    log = {'batches': [], 'loads': []}
+    daily, backfill = EchoAgent(scheduler, log=log), EchoAgent(scheduler, log=log)
+    # Both land within the latency window, so they share a batch
+    futures = [backfill.scheduler.submit(backfill, [1, 2, 3, 4, 5, 6]), daily.scheduler.submit(daily, [100])]
+    assert futures[0].result() == [2, 4, 6, 8, 10, 12] and futures[1].result() == [200]
+    # The daily item rides in the first batch instead of queueing behind the whole backfill
+    assert 100 in log['batches'][0][1]
+    assert log['loads'] == ['echo']
+
+def test_partial_batch_waits_for_deadline():
+    scheduler = ModelScheduler(max_batch_size=64, max_latency_ms=100)
+    agent = EchoAgent(scheduler)
+    start = time.perf_counter()
+    assert scheduler.submit(agent, [1]).result(timeout=5) == [2]
+    assert 0.09 <= time.perf_counter() - start < 2
+    scheduler.close()
+
+def test_models_are_evicted_least_recently_used(scheduler):
+    log = {'batches': [], 'loads': []}
+    a, b, c = (EchoAgent(scheduler, model_key=key, log=log) for key in 'abc')
+    for agent in (a, b, a, c):
+        scheduler.submit(agent, [1]).result()
+    # Budget holds two 100-byte models: loading c evicts b, the least recently used
+    assert scheduler.models.keys() == ['a', 'c']
+    scheduler.submit(b, [1]).result()
+    assert log['loads'] == ['a', 'b', 'c', 'b']
+    assert scheduler.models.resident_bytes <= 250
+
+def test_errors_fail_only_the_batch_requests(scheduler):
+    agent = EchoAgent(scheduler)
+    with pytest.raises(RuntimeError, match="bad input"):
+        scheduler.submit(agent, ['boom']).result()
+    assert scheduler.submit(agent, [3]).result() == [6]
+
+def test_concurrent_callers(scheduler):
+    agent = EchoAgent(scheduler)
+    results = {}
+
+    def call(i):
+        results[i] = agent.run(pd.DataFrame({'x': [i] * 3}))['y'].tolist()
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {i: [2 * i] * 3 for i in range(8)}
+    assert max(len(items) for _, items in agent.log['batches']) == 4
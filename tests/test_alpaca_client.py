@@ -0,0 +1,126 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from exec.alpaca_client import AlpacaClient, LocalTradingStream
+
+class FakeTradingClient:
+    """Counts API round trips so the tests can assert the cache is doing its job."""
+
+    def __init__(self):
+        self.account_calls = 0
+        self.position_calls = 0
+        self.down = False
+
+    def get_account(self):
+        self.account_calls += 1
+        if self.down:
+            raise ConnectionError("broker unreachable")
+        return {"cash": "10000", "equity": "12000"}
+
+    def get_all_positions(self):
+        self.position_calls += 1
+        return [
+            {"symbol": "AAPL", "qty": "10", "avg_entry_price": "150", "market_value": "1600"},
+            {"symbol": "MSFT", "qty": "5", "avg_entry_price": "300", "market_value": "1500"},
+        ]
+
+    def submit_order(self, request):
+        return SimpleNamespace(id="order-1", symbol=request.symbol, model_dump=lambda: {"id": "order-1"})
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("ALPACA_API_KEY", "test-key")
+    monkeypatch.setenv("ALPACA_SECRET_KEY", "test-secret")
+    return AlpacaClient(state_ttl=60.0, trading_client=FakeTradingClient())
+
+def test_positions_are_served_from_cache(client):
+    for symbol in ["AAPL", "MSFT", "AAPL", "TSLA"]:
+        client.get_position(symbol)
+    client.get_open_positions()
+    client.get_account_information()
+
+    assert client.trading_client.position_calls == 1
+    assert client.trading_client.account_calls == 1
+    assert client.get_position_qty("AAPL") == 10.0
+    assert client.get_position("TSLA") is None
+
+def test_ttl_expiry_and_invalidate_trigger_refresh(client):
+    client.refresh_state()
+    client.state_ttl = 0.0
+    client._last_refresh -= 1.0
+    client.get_position("AAPL")
+    assert client.trading_client.position_calls == 2
+
+    client.state_ttl = 60.0
+    client.invalidate_state()
+    client.get_state_snapshot()
+    assert client.trading_client.position_calls == 3
+
+def test_local_stream_fills_update_book(client):
+    stream = LocalTradingStream()
+    client.attach_trade_stream(stream)
+    client.refresh_state()
+
+    stream.publish({"event": "new", "order": {"symbol": "AAPL", "side": "buy"}, "qty": None, "price": None})
+    assert client.get_position_qty("AAPL") == 10.0
+
+    stream.publish({"event": "fill", "order": {"symbol": "AAPL", "side": "buy"}, "qty": "10", "price": "170"})
+    position = client.get_position("AAPL")
+    assert position["qty"] == 20.0
+    assert position["avg_entry_price"] == pytest.approx(160.0)
+    assert client.get_account_information()["cash"] == pytest.approx(10000 - 1700)
+
+    # Broker-reported position_qty wins over local accumulation
+    update = SimpleNamespace(event="partial_fill", order=SimpleNamespace(symbol="MSFT", side="sell"), qty="2", price="310", position_qty="0")
+    client.handle_trade_update(update)
+    assert client.get_position("MSFT") is None
+
+    stream.publish({"event": "fill", "order": {"symbol": "NVDA", "side": "buy"}, "qty": "3", "price": "400"})
+    snapshot = client.get_state_snapshot()
+    assert set(snapshot["positions"]) == {"AAPL", "NVDA"}
+    assert client.trading_client.position_calls == 1
+
+def test_orders_invalidate_cache_without_a_stream(client):
+    client.refresh_state()
+    client.place_market_order("AAPL", 5, "BUY")
+    client.get_position("AAPL")
+    assert client.trading_client.position_calls == 2
+
+    # With a stream attached, fills patch the cache and the submit keeps it
+    client.attach_trade_stream(LocalTradingStream())
+    client.place_market_order("AAPL", 5, "BUY")
+    client.get_position("AAPL")
+    assert client.trading_client.position_calls == 2
+
+def test_position_errors_are_reported(client):
+    client.trading_client.down = True
+    assert "error" in client.get_position("AAPL")
+    with pytest.raises(RuntimeError, match="broker unreachable"):
+        client.get_position_qty("AAPL")
+
+def test_refresh_that_races_a_fill_is_discarded(client):
+    client.attach_trade_stream(LocalTradingStream())
+    client.refresh_state()
+    fetch_positions = client.trading_client.get_all_positions
+    # A fill lands in the cache while the first forced refresh is still fetching the pre-fill book
+    def fill_during_fetch():
+        positions = fetch_positions()
+        if client.trading_client.position_calls == 2:
+            client.apply_fill("AAPL", "BUY", 5, 160.0, position_qty=15.0)
+        return positions if client.trading_client.position_calls == 2 else [dict(positions[0], qty="15"), positions[1]]
+    client.trading_client.get_all_positions = fill_during_fetch
+
+    client.refresh_state(force=True)
+    assert client.trading_client.position_calls == 3
+    assert client.get_position_qty("AAPL") == 15.0
+
+def test_snapshot_errors_are_reported(client):
+    client.trading_client.down = True
+    assert "error" in client.get_state_snapshot()
+    with pytest.raises(RuntimeError, match="broker unreachable"):
+        client.get_positions_frame()
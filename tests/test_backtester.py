@@ -0,0 +1,118 @@
+import os
+import sys
+import backtrader as bt
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from exec.backtester import target_weights, build_portfolio_cerebro
+from benchmarks.synthetic_data import make_synthetic_universe
+from exec.feeds import ArrayFeed, load_ohlcv_arrow, slice_dates
+from ingestion.ingest_market import register_ohlcv_view
+from ingestion.writers import write_partitions
+
+def test_target_weights_respects_thresholds_and_limits():
+    alpha = np.array([0.9, 0.6, 0.2, -0.8, np.nan])
+
+    long_only = target_weights(alpha, min_alpha_buy=0.5, max_alpha_sell=-0.5, gross_limit=1.0, max_weight=1.0)
+    assert long_only[2:].tolist() == [0.0, 0.0, 0.0]
+    assert long_only.sum() == pytest.approx(1.0)
+    assert long_only[0] / long_only[1] == pytest.approx(1.5)
+
+    long_short = target_weights(alpha, gross_limit=1.0, max_weight=0.35, allow_short=True)
+    assert long_short[3] < 0
+    assert np.abs(long_short).max() <= 0.35 + 1e-12
+    assert np.abs(long_short).sum() <= 1.0 + 1e-12
+
+    assert not target_weights(np.zeros(3)).any()
+
+def test_portfolio_strategy_trades_all_feeds():
+    tables, signals = make_synthetic_universe(n_symbols=8, n_days=40, seed=1)
+    signals['alpha'] = 0.9  # every name is a BUY with equal conviction
+    cerebro = build_portfolio_cerebro(tables, signals, cash=1_000_000.0, max_weight=0.2, rebalance_every=5)
+    strategy = cerebro.run()[0]
+
+    assert len(strategy.equity) == 40
+    # Every feed ends up held at ~1/8 of equity, i.e. the book is not just datas[0]
+    assert (strategy.shares > 0).all()
+    for i, data in enumerate(strategy.datas):
+        assert strategy.getposition(data).size == strategy.shares[i]
+
+def test_portfolio_strategy_trades_only_universe_members():
+    tables, signals = make_synthetic_universe(n_symbols=4, n_days=30, seed=2)
+    signals['alpha'] = 0.9
+    symbols = list(tables)
+    dates = pd.DatetimeIndex(tables[symbols[0]].column('date').to_numpy())
+    membership = pd.DataFrame(True, index=dates, columns=symbols)
+    membership.loc[:, symbols[0]] = False                # never a member
+    membership.loc[dates[10]:, symbols[1]] = False       # dropped from the universe on day 10
+
+    cerebro = build_portfolio_cerebro(tables, signals, cash=1_000_000.0, max_weight=0.5, gross_limit=0.9,
+                                      membership=membership)
+    strategy = cerebro.run()[0]
+
+    assert strategy.shares[0] == 0
+    assert strategy.shares[1] == 0
+    assert (strategy.shares[2:] > 0).all()
+
+def test_portfolio_strategy_trades_before_late_feeds_start():
+    tables, signals = make_synthetic_universe(n_symbols=2, n_days=30, seed=3)
+    signals['alpha'] = 0.9
+    symbols = list(tables)
+    dates = pd.DatetimeIndex(tables[symbols[0]].column('date').to_numpy())
+    tables[symbols[1]] = slice_dates(tables[symbols[1]], dates[15], dates[-1])   # lists halfway through the range
+
+    cerebro = build_portfolio_cerebro(tables, signals, cash=1_000_000.0, max_weight=0.5, gross_limit=0.9)
+    cerebro.addanalyzer(bt.analyzers.Transactions, _name='transactions')
+    strategy = cerebro.run()[0]
+    transactions = strategy.analyzers.transactions.get_analysis()
+    first_trade = {symbol: min(ts for ts, rows in transactions.items() for row in rows if row[3] == symbol)
+                   for symbol in symbols}
+
+    assert len(strategy.equity) == 30
+    # The first name trades from the start instead of waiting for the late listing
+    assert first_trade[symbols[0]].date() <= dates[1].date()
+    assert first_trade[symbols[1]].date() >= dates[15].date()
+    assert (strategy.shares > 0).all()
+
+class _RecordBars(bt.Strategy):
+    def __init__(self):
+        self.bars = []
+
+    def next(self):
+        self.bars.append(tuple((data._name, data.datetime.datetime(0), data.open[0], data.close[0], data.volume[0])
+                               for data in self.datas))
+
+def test_bulk_arrow_feeds_match_pandas_feeds(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tables, _ = make_synthetic_universe(n_symbols=3, n_days=30, seed=2)
+    frames = {symbol: table.to_pandas().assign(date=lambda d: pd.to_datetime(d['date'])).set_index('date')
+                           .rename(columns=str.capitalize) for symbol, table in tables.items()}
+    for symbol, df in frames.items():
+        df_long = df.rename(columns=str.lower).rename_axis('date').reset_index().assign(symbol=symbol)
+        # One session left on the old VARCHAR-date layout
+        df_old = df_long.iloc[:1].assign(date=lambda d: d['date'].dt.strftime('%Y-%m-%d'))
+        os.makedirs(f"data/lake/ohlcv/{df_old['date'].iloc[0]}", exist_ok=True)
+        df_old.to_parquet(f"data/lake/ohlcv/{df_old['date'].iloc[0]}/{symbol}.parquet", index=False)
+        write_partitions(df_long.iloc[1:], 'data/lake/ohlcv', 'ohlcv', filename=f'{symbol}.parquet')
+    register_ohlcv_view()
+
+    dates = next(iter(frames.values())).index
+    start, end = str(dates[5].date()), str(dates[-5].date())
+    tables = load_ohlcv_arrow(['SYM0001', 'MISSING', 'SYM0000'], str(dates[0].date()), end)
+    assert list(tables) == ['SYM0001', 'SYM0000'] and tables['SYM0000'].num_rows == 26
+    tables = load_ohlcv_arrow(list(frames), start, end)
+
+    def run(make_feed):
+        cerebro = bt.Cerebro(stdstats=False)
+        for symbol in frames:
+            cerebro.adddata(make_feed(symbol), name=symbol)
+        cerebro.addstrategy(_RecordBars)
+        return cerebro.run()[0].bars
+
+    arrow_bars = run(lambda symbol: ArrayFeed(dataname=tables[symbol]))
+    pandas_bars = run(lambda symbol: bt.feeds.PandasData(dataname=frames[symbol].loc[start:end]))
+    assert len(arrow_bars) == 21
+    assert arrow_bars == pandas_bars
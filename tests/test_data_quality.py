@@ -0,0 +1,92 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ops.data_quality import DataQualityError, load_quality_results, validate_new_partitions
+
+def _write_ohlcv(day, rows):
+    os.makedirs(f'data/lake/ohlcv/{day}', exist_ok=True)
+    for row in rows:
+        bar = {'date': day, 'symbol': 'AAPL', 'open': 100.0, 'high': 101.0, 'low': 99.0, 'close': 100.5, 'volume': 1000}
+        bar.update(row)
+        pd.DataFrame([bar]).to_parquet(f"data/lake/ohlcv/{day}/{bar['symbol']}.parquet", index=False)
+
+def _write_features(dates):
+    os.makedirs('data/lake/features/daily', exist_ok=True)
+    pd.DataFrame({
+        'date': pd.to_datetime(dates), 'symbol': 'AAPL', 'r20': 0.01, 'rsi14': 55.0,
+        'news_sent': np.nan, 'news_conf': np.nan, 'news_count': 0, 'news_sent_decay': np.nan,
+    }).to_parquet('data/lake/features/daily/features_daily.parquet', index=False)
+
+@pytest.fixture
+def lake(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    _write_ohlcv('2024-01-02', [{'symbol': 'AAPL'}, {'symbol': 'MSFT'}])
+    _write_ohlcv('2024-01-03', [{'symbol': 'AAPL'}])
+    return tmp_path
+
+def test_only_new_partitions_are_validated(lake):
+    df = validate_new_partitions(['ohlcv_daily'])
+    assert set(df['partition']) == {'2024-01-02', '2024-01-03'}
+    assert df['passed'].all()
+    assert {'schema', 'null_rate_close', 'duplicate_keys', 'ohlc_violations', 'non_monotonic_dates',
+            'partition_date_mismatch'} <= set(df['check'])
+
+    # Nothing changed, so nothing is scanned again
+    assert validate_new_partitions(['ohlcv_daily']).empty
+
+    _write_ohlcv('2024-01-04', [{'symbol': 'AAPL'}])
+    df = validate_new_partitions(['ohlcv_daily'])
+    assert set(df['partition']) == {'2024-01-04'}
+    assert len(load_quality_results()['partition'].unique()) == 3
+
+def test_bad_partition_fails_fast_and_is_recorded(lake):
+    validate_new_partitions(['ohlcv_daily'])
+    # High below close, and a bar stamped with the wrong session
+    _write_ohlcv('2024-01-04', [{'symbol': 'AAPL', 'high': 100.0}, {'symbol': 'MSFT', 'date': '2024-01-05'}])
+
+    with pytest.raises(DataQualityError) as excinfo:
+        validate_new_partitions(['ohlcv_daily'])
+    failed = excinfo.value.results
+    assert set(failed['check']) == {'ohlc_violations', 'partition_date_mismatch'}
+    assert (failed['partition'] == '2024-01-04').all()
+
+    df_table = load_quality_results()
+    assert not df_table.loc[df_table['partition'] == '2024-01-04', 'passed'].all()
+    # A failed partition is checked again on the next run until it is fixed
+    with pytest.raises(DataQualityError):
+        validate_new_partitions(['ohlcv_daily'])
+
+def test_schema_mismatch_skips_the_scan(lake):
+    os.makedirs('data/lake/ohlcv/2024-01-04')
+    pd.DataFrame({'date': ['2024-01-04'], 'symbol': ['AAPL'], 'close': ['100.5']}).to_parquet(
+        'data/lake/ohlcv/2024-01-04/AAPL.parquet', index=False)
+
+    df = validate_new_partitions(['ohlcv_daily'], raise_on_failure=False)
+    bad = df[df['partition'] == '2024-01-04']
+    assert list(bad['check']) == ['schema']
+    assert 'open: missing' in bad['detail'].iloc[0] and 'close: expected float' in bad['detail'].iloc[0]
+
+def test_features_duplicates_and_unsorted_dates(lake):
+    _write_features(['2024-01-02', '2024-01-03', '2024-01-04'])
+    assert validate_new_partitions(['features_daily'])['passed'].all()
+
+    _write_features(['2024-01-02', '2024-01-04', '2024-01-03', '2024-01-03'])
+    with pytest.raises(DataQualityError) as excinfo:
+        validate_new_partitions(['features_daily'])
+    failed = excinfo.value.results.set_index('check')['value']
+    assert failed['duplicate_keys'] == 1
+    assert failed['non_monotonic_dates'] == 2
+
+def test_news_from_two_sources_is_not_a_duplicate(lake):
+    os.makedirs('data/lake/news_norm')
+    row = {'ts': pd.Timestamp('2024-01-02 14:30', tz='UTC'), 'symbol': 'AAPL', 'title': 'Apple beats', 'text': 'apple beats',
+           'url': 'https://example.com'}
+    pd.DataFrame([{**row, 'source': 'Reuters'}, {**row, 'source': 'Bloomberg'}]).to_parquet(
+        'data/lake/news_norm/news_norm.parquet', index=False)
+    assert validate_new_partitions(['news_norm'])['passed'].all()
@@ -0,0 +1,110 @@
+import os
+import sys
+import threading
+import time
+import pandas as pd
+import pytest
+from prefect.testing.utilities import prefect_test_harness
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import flows.daily_run as daily_run
+from flows.fanout import chunk_symbols, make_task_runner, merge_parts
+
+@pytest.fixture(scope="module")
+def prefect_harness():
+    with prefect_test_harness():
+        yield
+
+def test_chunk_symbols():
+    symbols = [f"S{i}" for i in range(10)]
+    assert chunk_symbols(symbols, chunk_size=4) == [symbols[0:4], symbols[4:8], symbols[8:10]]
+    assert [len(c) for c in chunk_symbols(symbols, n_chunks=3)] == [4, 4, 2]
+    assert chunk_symbols([], n_chunks=3) == []
+    with pytest.raises(ValueError):
+        make_task_runner("gpu")
+
+def test_merge_parts(tmp_path):
+    dataset_dir = str(tmp_path / 'news_raw')
+    os.makedirs(os.path.join(dataset_dir, '_parts'))
+    pd.DataFrame({'symbol': ['MSFT'], 'ts': [2]}).to_parquet(os.path.join(dataset_dir, '_parts', 'chunk-0001.parquet'))
+    pd.DataFrame({'symbol': ['AAPL', 'AAPL'], 'ts': [2, 1]}).to_parquet(os.path.join(dataset_dir, '_parts', 'chunk-0000.parquet'))
+
+    assert merge_parts(dataset_dir, 'news_raw.parquet', sort_by=['symbol', 'ts']) == 3
+    merged = pd.read_parquet(os.path.join(dataset_dir, 'news_raw.parquet'))
+    assert merged['symbol'].tolist() == ['AAPL', 'AAPL', 'MSFT']
+    assert merged['ts'].tolist() == [1, 2, 2]
+    assert not os.path.exists(os.path.join(dataset_dir, '_parts'))
+    assert merge_parts(dataset_dir, 'news_raw.parquet') == 0
+
+def test_ingestion_fans_out_chunks_concurrently(tmp_path, monkeypatch, prefect_harness):
+    monkeypatch.chdir(tmp_path)
+    lock = threading.Lock()
+    active, peak, calls = [0], [0], []
+
+    def track(name, symbols):
+        with lock:
+            calls.append((name, tuple(symbols)))
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.2)
+        with lock:
+            active[0] -= 1
+
+    def fake_ingest_market(symbols, start_date, end_date, register=True):
+        track('market', symbols)
+        for symbol in symbols:
+            os.makedirs(f'data/lake/ohlcv/{start_date}', exist_ok=True)
+            pd.DataFrame({'date': [start_date], 'symbol': [symbol], 'close': [1.0]}).to_parquet(f'data/lake/ohlcv/{start_date}/{symbol}.parquet')
+
+    def fake_ingest_news(symbols, start_ts, end_ts, part=None):
+        track('news', symbols)
+        os.makedirs('data/lake/news_raw/_parts', exist_ok=True)
+        pd.DataFrame({'ts': [start_ts] * len(symbols), 'symbol': symbols, 'source': 'AP', 'title': 'headline',
+                      'description': None, 'url': None, 'content': None}).to_parquet(f'data/lake/news_raw/_parts/{part}.parquet')
+
+    monkeypatch.setattr(daily_run, 'ingest_market', fake_ingest_market)
+    monkeypatch.setattr(daily_run, 'ingest_news', fake_ingest_news)
+    monkeypatch.setattr(daily_run, 'ingest_fundamentals', lambda symbols, part=None: track('fundamentals', symbols))
+    monkeypatch.setattr(daily_run, 'register_ohlcv_view', lambda: None)
+    monkeypatch.setattr(daily_run, 'build_price_panel', lambda: None)
+    monkeypatch.setattr(daily_run, 'normalize_text', lambda: calls.append(('normalize', ())))
+
+    symbols = [f"S{i}" for i in range(6)]
+    ingestion = daily_run.run_ingestion.with_options(task_runner=make_task_runner("thread"))
+    result = ingestion(symbols=symbols, start_date_str="2023-01-02", end_date_str="2023-01-03", n_chunks=3)
+
+    assert sorted(c for name, c in calls if name == 'market') == [('S0', 'S1'), ('S2', 'S3'), ('S4', 'S5')]
+    assert calls[-1] == ('normalize', ())
+    # market, fundamentals and news chunks overlap in time rather than running back to back
+    assert peak[0] > 1
+    assert result['rows'] == 6
+    assert len(pd.read_parquet('data/lake/news_raw/news_raw.parquet')) == 6
+
+def test_market_chunk_that_wrote_nothing_reruns_alone(tmp_path, monkeypatch, prefect_harness):
+    monkeypatch.chdir(tmp_path)
+    calls = []
+
+    def flaky_ingest_market(symbols, start_date, end_date, register=True):
+        calls.append(tuple(symbols))
+        if 'F1' in symbols and calls.count(tuple(symbols)) == 1:
+            return 0  # yfinance swallowed a network error: empty frame, nothing written
+        for symbol in symbols:
+            os.makedirs(f'data/lake/ohlcv/{start_date}', exist_ok=True)
+            pd.DataFrame({'date': [start_date], 'symbol': [symbol], 'close': [1.0]}).to_parquet(f'data/lake/ohlcv/{start_date}/{symbol}.parquet')
+        return len(symbols)
+
+    monkeypatch.setattr(daily_run, 'ingest_market', flaky_ingest_market)
+    monkeypatch.setattr(daily_run, 'ingest_news', lambda symbols, start_ts, end_ts, part=None: None)
+    monkeypatch.setattr(daily_run, 'ingest_fundamentals', lambda symbols, part=None: None)
+    monkeypatch.setattr(daily_run, 'merge_parts', lambda *args, **kwargs: 0)
+    monkeypatch.setattr(daily_run, 'merge_fundamentals_parts', lambda: 0)
+    monkeypatch.setattr(daily_run, 'register_ohlcv_view', lambda: None)
+    monkeypatch.setattr(daily_run, 'build_price_panel', lambda: None)
+    monkeypatch.setattr(daily_run, 'normalize_text', lambda: None)
+
+    for _ in range(3):
+        daily_run.run_ingestion(symbols=['F0', 'F1'], start_date_str="2023-02-01", end_date_str="2023-02-02", n_chunks=2)
+
+    # the failed chunk runs again on the next flow run; the chunk that wrote its bars stays a cache hit
+    assert calls == [('F0',), ('F1',), ('F1',)]
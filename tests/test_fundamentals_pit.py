@@ -0,0 +1,75 @@
+import os
+import sys
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ingestion.ingest_fundamentals import normalize_statements, upsert_fundamentals
+from features.fundamentals_pit import load_features_with_fundamentals
+
+def _statement(symbol, date, filed, accepted, **fields):
+    return {'symbol': symbol, 'date': date, 'fillingDate': filed, 'acceptedDate': accepted, **fields}
+
+def test_normalize_statements_merges_and_dates_filings():
+    income = [_statement('AAPL', '2023-03-31', '2023-05-05', '2023-05-04 18:04:43', revenue=100.0, netIncome=20.0, eps=1.5),
+              _statement('MSFT', '2023-03-31', '2023-04-26', None, revenue=50.0, netIncome=10.0, eps=2.0)]
+    balance = [_statement('AAPL', '2023-03-31', '2023-05-05', '2023-05-04 18:04:43', totalAssets=300.0, totalLiabilities=200.0),
+               _statement('MSFT', '2023-03-31', '2023-04-26', None, totalAssets=150.0, totalLiabilities=80.0)]
+    cash_flow = [_statement('AAPL', '2023-03-31', '2023-05-05', '2023-05-04 18:04:43', cashFlowFromOperatingActivities=25.0)]
+
+    df = normalize_statements(income, balance, cash_flow).set_index('symbol')
+    assert df.loc['AAPL', 'totalAssets'] == 300.0
+    assert df.loc['AAPL', 'available_at'] == pd.Timestamp('2023-05-04 18:04:43')
+    # No acceptance time: known from the day after filing
+    assert df.loc['MSFT', 'available_at'] == pd.Timestamp('2023-04-27')
+    assert pd.isna(df.loc['MSFT', 'cashFlowFromOperatingActivities'])
+
+def test_asof_join_has_no_look_ahead(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data/lake/features/daily')
+
+    original = normalize_statements(*[[_statement('AAPL', '2023-03-31', '2023-05-05', '2023-05-04 18:04:43', eps=1.5)]] * 3)
+    restated = normalize_statements(*[[_statement('AAPL', '2023-03-31', '2023-06-01', '2023-06-01 09:00:00', eps=1.2)]] * 3)
+    upsert_fundamentals(original, output_path='data/lake/fundamentals')
+    upsert_fundamentals(restated, output_path='data/lake/fundamentals')
+    upsert_fundamentals(restated, output_path='data/lake/fundamentals')  # re-pull of the same filing is idempotent
+    assert len(pd.read_parquet('data/lake/fundamentals/fundamentals.parquet')) == 2
+
+    dates = pd.to_datetime(['2023-05-04', '2023-05-05', '2023-05-31', '2023-06-01'])
+    pd.DataFrame({'date': dates, 'symbol': 'AAPL', 'r20': 0.1}).to_parquet('data/lake/features/daily/features_daily.parquet', index=False)
+
+    df = load_features_with_fundamentals()
+    # Accepted after the close on 05-04, so first visible on 05-05; the restatement only from 06-01
+    assert pd.isna(df['eps'].iloc[0])
+    assert df['eps'].tolist()[1:] == [1.5, 1.5, 1.2]
+    assert (df['fundamentals_available_at'].dropna() <= df['date'].iloc[1:] + pd.Timedelta(hours=16)).all()
+
+    later_only = load_features_with_fundamentals(start_date='2023-06-01')
+    assert later_only['eps'].tolist() == [1.2]
+
+def test_restated_older_quarter_does_not_replace_newer_one(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data/lake/features/daily')
+
+    q4 = normalize_statements(*[[_statement('AAPL', '2022-12-31', '2023-02-02', '2023-02-02 18:00:00', eps=1.0)]] * 3)
+    q1 = normalize_statements(*[[_statement('AAPL', '2023-03-31', '2023-05-04', '2023-05-04 18:00:00', eps=1.5)]] * 3)
+    q4_restated = normalize_statements(*[[_statement('AAPL', '2022-12-31', '2023-06-01', '2023-06-01 09:00:00', eps=0.9)]] * 3)
+    for df in (q4, q1, q4_restated):
+        upsert_fundamentals(df, output_path='data/lake/fundamentals')
+
+    dates = pd.to_datetime(['2023-03-01', '2023-05-05', '2023-06-02'])
+    pd.DataFrame({'date': dates, 'symbol': 'AAPL', 'r20': 0.1}).to_parquet('data/lake/features/daily/features_daily.parquet', index=False)
+
+    df = load_features_with_fundamentals()
+    assert df['eps'].tolist() == [1.0, 1.5, 1.5]
+    assert df['fundamentals_period_end'].iloc[-1] == pd.Timestamp('2023-03-31')
+    assert df['fundamentals_available_at'].iloc[-1] == pd.Timestamp('2023-05-04 18:00:00')
+
+    # Once only the restated quarter's period is known, its restatement is served
+    msft_q4 = normalize_statements(*[[_statement('MSFT', '2022-12-31', '2023-02-01', '2023-02-01 18:00:00', eps=2.0)]] * 3)
+    msft_fix = normalize_statements(*[[_statement('MSFT', '2022-12-31', '2023-03-01', '2023-03-01 08:00:00', eps=2.2)]] * 3)
+    for df_filing in (msft_q4, msft_fix):
+        upsert_fundamentals(df_filing, output_path='data/lake/fundamentals')
+    pd.DataFrame({'date': pd.to_datetime(['2023-02-15', '2023-03-02']), 'symbol': 'MSFT', 'r20': 0.1}).to_parquet(
+        'data/lake/features/daily/features_daily.parquet', index=False)
+    assert load_features_with_fundamentals()['eps'].tolist() == [2.0, 2.2]
@@ -0,0 +1,90 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import duckdb
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import ingestion.ingest_market as ingest_market_module
+from ingestion.ingest_intraday import (bucket_of, download_windows, group_by_bucket, load_intraday_bars,
+                                       resample_intraday_to_daily, write_intraday_bars)
+
+def _minute_bars(symbol, session, closes, start='09:29'):
+    ts = pd.date_range(f'{session} {start}', periods=len(closes), freq='min', tz='America/New_York').tz_convert('UTC')
+    closes = np.asarray(closes, dtype=float)
+    return pd.DataFrame({'ts': ts, 'symbol': symbol, 'open': closes - 0.5, 'high': closes + 1, 'low': closes - 1,
+                         'close': closes, 'volume': 100})
+
+@pytest.fixture
+def lake(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    df = pd.concat([
+        _minute_bars('AAA', '2023-05-04', [10, 11, 12, 13]),
+        _minute_bars('BBB', '2023-05-04', [20, 21, 22, 23]),
+        _minute_bars('AAA', '2023-05-05', [14, 15]),
+    ])
+    write_intraday_bars(df)
+    return tmp_path
+
+def test_layout_is_bucketed_sorted_and_has_statistics(lake):
+    assert bucket_of('AAA') == bucket_of('AAA') and 0 <= bucket_of('AAA') < 16
+    assert sorted(sum(group_by_bucket(['AAA', 'BBB', 'CCC']), [])) == ['AAA', 'BBB', 'CCC']
+
+    path = f"data/lake/ohlcv_1m/date=2023-05-04/bucket={bucket_of('AAA'):02d}/bars.parquet"
+    metadata = pq.ParquetFile(path).metadata
+    stats = metadata.row_group(0).column(metadata.schema.names.index('symbol')).statistics
+    assert stats.has_min_max and stats.min == 'AAA'
+    df = pd.read_parquet(path)
+    assert df.equals(df.sort_values(by=['symbol', 'ts']))
+
+    # Re-ingesting a symbol-day replaces its rows instead of appending duplicates
+    write_intraday_bars(_minute_bars('AAA', '2023-05-04', [50, 51]))
+    assert load_intraday_bars(['AAA'], '2023-05-04', '2023-05-05')['close'].tolist() == [50.0, 51.0]
+
+def test_load_intraday_bars_by_symbol_and_time(lake):
+    df = load_intraday_bars(['AAA'])
+    assert df['symbol'].unique().tolist() == ['AAA'] and len(df) == 6
+
+    df = load_intraday_bars(start_ts='2023-05-04 13:30', end_ts='2023-05-04 13:32', columns=['ts', 'symbol', 'close'])
+    assert list(df.columns) == ['ts', 'symbol', 'close']
+    assert df['close'].tolist() == [11.0, 12.0, 21.0, 22.0]
+
+def test_resample_builds_ohlcv_daily(lake):
+    os.makedirs('data/lake/ohlcv/2023-05-04')
+    pd.DataFrame({'date': ['2023-05-04'], 'symbol': ['AAA'], 'open': [0.0], 'high': [0.0], 'low': [0.0], 'close': [0.0],
+                  'volume': [0]}).to_parquet('data/lake/ohlcv/2023-05-04/AAA.parquet', index=False)
+
+    assert resample_intraday_to_daily() == 3
+    df = pd.read_parquet('data/lake/ohlcv/2023-05-04/AAA.parquet')
+    # The 09:29 pre-open bar is excluded from the regular session, and the resampled bar replaced the daily one
+    assert df[['open', 'high', 'low', 'close', 'volume']].values.tolist() == [[10.5, 14.0, 10.0, 13.0, 300]]
+    assert pd.read_parquet('data/lake/ohlcv/2023-05-04/BBB.parquet')['close'].tolist() == [23.0]
+    assert pd.read_parquet('data/lake/ohlcv/2023-05-05/AAA.parquet')['close'].tolist() == [15.0]
+    assert not os.path.exists('data/lake/ohlcv/2023-05-04/intraday.parquet')
+
+def test_daily_ingest_after_resample_keeps_one_bar_per_key(lake, monkeypatch):
+    assert resample_intraday_to_daily(register=False) == 3
+
+    def fake_download(symbol, start, end, auto_adjust=True):
+        index = pd.DatetimeIndex(pd.to_datetime(['2023-05-04', '2023-05-05']), name='Date')
+        return pd.DataFrame({'Open': [1.0, 2.0], 'High': [1.0, 2.0], 'Low': [1.0, 2.0], 'Close': [1.0, 2.0],
+                             'Volume': [10, 20]}, index=index)
+
+    monkeypatch.setattr(ingest_market_module.yf, 'download', fake_download)
+    ingest_market_module.ingest_market(['AAA', 'BBB'], '2023-05-04', '2023-05-06', register=False)
+
+    df = duckdb.sql("SELECT * FROM read_parquet('data/lake/ohlcv/**/*.parquet')").df()
+    assert len(df) == 4
+    assert not df.duplicated(['date', 'symbol']).any()
+
+def test_1m_downloads_are_clamped_and_split_into_weekly_windows():
+    now = pd.Timestamp('2024-03-31 12:00')
+    # The first days are past Yahoo's 1m retention and are dropped
+    assert download_windows('2024-02-20', '2024-03-31', now=now) == [
+        ('2024-03-02', '2024-03-09'), ('2024-03-09', '2024-03-16'), ('2024-03-16', '2024-03-23'),
+        ('2024-03-23', '2024-03-30'), ('2024-03-30', '2024-03-31')]
+    assert download_windows('2024-01-01', '2024-02-01', now=now) == []
+    assert download_windows('2024-01-01', '2024-03-31', interval='1h', now=now) == [('2024-01-01', '2024-03-31')]
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import os
+import pstats
+import sys
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ops.instrumentation import Tracer, export_trace, get_tracer, increment, instrument, observe, span
+
+@pytest.fixture(autouse=True)
+def fresh_tracer():
+    get_tracer().reset()
+    yield
+    get_tracer().reset()
+
+def test_nested_spans_counters_and_histograms():
+    @instrument("stage")
+    def stage(n):
+        with span("stage.inner", rows=n) as attrs:
+            attrs['extra'] = 'x'
+        increment("stage.rows", n)
+        observe("stage.batch_size", n)
+        return n
+
+    stage(3)
+    stage(5)
+    with pytest.raises(ZeroDivisionError):
+        with span("failing"):
+            1 / 0
+
+    tracer = get_tracer()
+    df_spans = tracer.spans_frame()
+    outer = df_spans[df_spans['name'] == 'stage']
+    inner = df_spans[df_spans['name'] == 'stage.inner']
+    assert len(outer) == 2
+    assert set(inner['parent_id']) == set(outer['span_id'])
+    assert json.loads(inner['attributes'].iloc[0]) == {'rows': 3, 'extra': 'x'}
+    assert tracer.counters['stage.calls'] == 2
+    assert tracer.counters['stage.rows'] == 8
+    assert tracer.counters['failing.errors'] == 1
+
+    summary = tracer.histogram_summary().set_index('name')
+    assert summary.loc['stage.batch_size', 'max'] == 5
+    assert summary.loc['stage.duration_s', 'count'] == 2
+
+def test_async_functions_are_instrumented():
+    @instrument()
+    async def handler():
+        await asyncio.sleep(0)
+        return 1
+
+    assert asyncio.run(handler()) == 1
+    assert get_tracer().counters[f"{handler.__qualname__}.calls"] == 1
+
+def test_export_trace_json_and_parquet(tmp_path):
+    with span("export_me", rows=1):
+        pass
+
+    parquet_path = export_trace(str(tmp_path / 'trace.parquet'))
+    json_path = export_trace(str(tmp_path / 'trace.json'))
+    assert pd.read_parquet(parquet_path)['name'].tolist() == ['export_me']
+    assert json.load(open(json_path))[0]['name'] == 'export_me'
+    metrics = json.load(open(tmp_path / 'trace.metrics.json'))
+    assert metrics['counters']['export_me.calls'] == 1
+
+def test_profile_mode_writes_cprofile_output(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRADING_PROFILE", "hot_stage")
+    monkeypatch.setenv("TRADING_PROFILE_DIR", str(tmp_path))
+
+    with span("hot_stage"):
+        sum(range(1000))
+    with span("cold_stage"):
+        pass
+
+    profiles = os.listdir(tmp_path)
+    assert len(profiles) == 1 and profiles[0].startswith("hot_stage-")
+    df_spans = get_tracer().spans_frame()
+    assert 'profile' in json.loads(df_spans[df_spans['name'] == 'hot_stage']['attributes'].iloc[0])
+
+def test_nested_spans_share_the_outer_profile(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRADING_PROFILE", "*")
+    monkeypatch.setenv("TRADING_PROFILE_DIR", str(tmp_path))
+
+    def inner_work():
+        return sum(range(1000))
+
+    with span("outer"):
+        with span("inner"):
+            inner_work()
+    with span("after"):
+        pass
+
+    profiles = sorted(os.listdir(tmp_path))
+    assert [name.split('-')[0] for name in profiles] == ['after', 'outer']
+    # The inner span ran under the outer profiler instead of replacing it
+    outer = pstats.Stats(str(tmp_path / profiles[1]))
+    assert any(func[2] == 'inner_work' for func in outer.stats)
+
+def test_histograms_are_bounded():
+    tracer = Tracer(max_histogram_values=100)
+    for value in range(1000):
+        tracer.observe("latency", value)
+    summary = tracer.histogram_summary().set_index('name')
+    assert summary.loc['latency', 'count'] == 100
+    assert summary.loc['latency', 'max'] == 999 and summary.loc['latency', 'p50'] >= 900
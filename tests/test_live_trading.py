@@ -0,0 +1,178 @@
+import asyncio
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import exec.live_trading as live_trading
+from decision.aggregator_v0 import compute_alpha
+from exec.alpaca_client import AlpacaClient, LocalTradingStream
+from exec.live_trading import LiveTradingService, ReplaySource
+
+class FakeOrder:
+    def __init__(self, order_id, request):
+        self.id = order_id
+        self.request = request
+
+    def model_dump(self):
+        return {"id": self.id, "client_order_id": self.request.client_order_id, "symbol": self.request.symbol,
+                "qty": self.request.qty}
+
+class FakeTradingClient:
+    def __init__(self):
+        self.orders = []
+        self.account = {"cash": "100000", "equity": "100000"}
+        self.on_submit = None
+
+    def get_account(self):
+        if isinstance(self.account, Exception):
+            raise self.account
+        return self.account
+
+    def get_all_positions(self):
+        return []
+
+    def submit_order(self, request):
+        self.orders.append(request)
+        if self.on_submit is not None:
+            self.on_submit(request)
+        return FakeOrder(f"order-{len(self.orders)}", request)
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("ALPACA_API_KEY", "test-key")
+    monkeypatch.setenv("ALPACA_SECRET_KEY", "test-secret")
+    client = AlpacaClient(state_ttl=60.0, trading_client=FakeTradingClient())
+
+    # Twenty prior sessions closing at 100, so r20 = last / 100 - 1
+    dates = pd.bdate_range(end='2024-03-01', periods=25)
+    frames = {symbol: pd.DataFrame({'Close': 100.0}, index=dates) for symbol in ['AAA', 'BBB']}
+    monkeypatch.setattr(live_trading, "load_ohlcv_frames", lambda symbols, start, end: frames)
+
+    headlines = {"AAA beats": (0.9, 1.0), "BBB warns": (-0.9, 1.0)}
+    def sentiment_fn(titles):
+        scores = np.array([headlines[title] for title in titles])
+        return scores[:, 0], scores[:, 1]
+
+    service = LiveTradingService(client, ['AAA', 'BBB'], sentiment_fn=sentiment_fn)
+    service.warm_start(as_of='2024-03-04')
+    return service
+
+def _bars(rows):
+    return pd.DataFrame(rows, columns=['ts', 'symbol', 'close'])
+
+def test_compute_alpha_scalar_matches_frame():
+    df = pd.DataFrame({'news_sent': [0.4, np.nan], 'r20': [np.nan, 0.2]})
+    frame_alpha = compute_alpha(df)
+    for row, expected in zip(df.to_dict('records'), frame_alpha):
+        assert compute_alpha(row) == pytest.approx(expected)
+
+def test_news_then_bar_places_one_order(service):
+    replay = ReplaySource(
+        _bars([
+            ('2024-03-04 14:31:00+00:00', 'AAA', 150.0),  # r20 = 0.5 alone is a HOLD
+            ('2024-03-04 14:33:00+00:00', 'AAA', 150.5),  # the news already bought 66 shares at 150
+            ('2024-03-04 14:34:00+00:00', 'AAA', 151.0),  # same whole-share target, so no second order
+        ]),
+        pd.DataFrame({'ts': ['2024-03-04 14:32:00+00:00'], 'symbol': ['AAA'], 'title': ['AAA beats']}),
+    )
+    asyncio.run(service.run(replay))
+
+    assert [(o['symbol'], o['side'], o['qty']) for o in service.orders] == [('AAA', 'BUY', 66.0)]
+    assert service.alpha[0] == pytest.approx((0.9 + 151.0 / 100 - 1) / 2)
+    assert service.pending[0] == 66.0
+    summary = service.latency_summary()
+    assert summary['count'] == 1 and summary['p99'] >= summary['p50'] > 0
+
+def test_after_close_news_counts_toward_next_session(service):
+    state = service.states[1]
+    replay = ReplaySource(
+        _bars([
+            ('2024-03-04 20:59:00+00:00', 'BBB', 100.0),
+            ('2024-03-05 14:31:00+00:00', 'BBB', 100.0),
+        ]),
+        # 17:30 New York time, after the 16:00 cutoff
+        pd.DataFrame({'ts': ['2024-03-04 22:30:00+00:00'], 'symbol': ['BBB'], 'title': ['BBB warns']}),
+    )
+    asyncio.run(service.run(replay))
+
+    assert state.session == pd.Timestamp('2024-03-05')
+    assert state.news_sent == pytest.approx(-0.9)
+    assert not state.pending_news
+    # Shorting is off, so a negative alpha is flat, not an order
+    assert service.orders == []
+
+def test_fills_release_pending_quantity(service):
+    stream = LocalTradingStream()
+    service.attach_trade_stream(stream)
+    replay = ReplaySource(
+        _bars([('2024-03-04 14:33:00+00:00', 'AAA', 150.0)]),
+        pd.DataFrame({'ts': ['2024-03-04 14:32:00+00:00'], 'symbol': ['AAA'], 'title': ['AAA beats']}),
+    )
+    asyncio.run(service.run(replay))
+    order = service.orders[0]
+
+    stream.publish({"event": "partial_fill", "order": {"client_order_id": order['client_order_id'], "symbol": "AAA", "side": "buy"},
+                    "qty": "16", "price": "150"})
+    assert service.pending[0] == 50.0
+    stream.publish({"event": "fill", "order": {"client_order_id": order['client_order_id'], "symbol": "AAA", "side": "buy"},
+                    "qty": "50", "price": "150"})
+    assert service.pending[0] == 0.0
+    assert service.client.get_position_qty("AAA") == 66.0
+
+
+def _news_then_bar():
+    return ReplaySource(
+        _bars([('2024-03-04 14:33:00+00:00', 'AAA', 150.0)]),
+        pd.DataFrame({'ts': ['2024-03-04 14:32:00+00:00'], 'symbol': ['AAA'], 'title': ['AAA beats']}),
+    )
+
+def test_fill_before_acknowledgement_releases_pending(service):
+    stream = LocalTradingStream()
+    service.attach_trade_stream(stream)
+    # The broker fills on the stream thread before submit_order has returned the order
+    service.client.trading_client.on_submit = lambda request: stream.publish(
+        {"event": "fill", "order": {"client_order_id": request.client_order_id, "symbol": request.symbol,
+                                    "side": "buy"}, "qty": str(request.qty), "price": "150"})
+    asyncio.run(service.run(_news_then_bar()))
+
+    assert [(o['symbol'], o['qty']) for o in service.orders] == [('AAA', 66.0)]
+    assert service.pending[0] == 0.0
+    assert not service._open_orders
+
+def test_fill_moves_position_and_pending_together(service):
+    stream = LocalTradingStream()
+    service.attach_trade_stream(stream)
+    seen = []
+    def fill_on_stream_thread(request):
+        stream.publish({"event": "fill", "order": {"client_order_id": request.client_order_id, "symbol": request.symbol,
+                                                   "side": "buy"}, "qty": str(request.qty), "price": "150"})
+        # Still on the executor thread: the loop has not applied the fill, so neither side has moved
+        seen.append(service.client.get_state_snapshot(refresh=False)["positions"].get("AAA"))
+    service.client.trading_client.on_submit = fill_on_stream_thread
+    asyncio.run(service.run(_news_then_bar()))
+
+    assert seen == [None]
+    assert service.client.get_position_qty("AAA") == 66.0 and service.pending[0] == 0.0
+
+@pytest.mark.parametrize("account", [RuntimeError("broker down"), {"cash": "0", "equity": "0"}, {"cash": "100000"}])
+def test_missing_equity_skips_rebalance(service, account):
+    service.client.trading_client.account = account
+    service.client.invalidate_state()
+    asyncio.run(service.run(_news_then_bar()))
+
+    assert service.orders == [] and service.pending[0] == 0.0
+
+def test_start_live_trading_detaches(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(live_trading.subprocess, "Popen", lambda args, **kwargs: calls.append((args, kwargs)))
+    log_path = str(tmp_path / 'logs' / 'live.log')
+    live_trading.start_live_trading(['AAA', 'BBB'], until=pd.Timestamp('2024-03-04 21:00', tz='UTC'), log_path=log_path)
+
+    (args, kwargs), = calls
+    assert args[1:] == ['-m', 'exec.live_trading', '--until', '2024-03-04T21:00:00+00:00', 'AAA', 'BBB']
+    assert kwargs['start_new_session'] and os.path.exists(log_path)
@@ -0,0 +1,94 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ingestion.ingest_market import register_ohlcv_view
+from decision.aggregator_v0 import aggregate_signals, compute_alpha
+from decision.meta_labeling import META_MODEL_DIR, build_meta_labels, load_meta_model, train_meta_model, triple_barrier_labels
+
+@pytest.fixture
+def lake(tmp_path, monkeypatch):
+    """News always points the way the stock trends; high-confidence news is right, low-confidence news is wrong."""
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range('2024-01-01', periods=80)
+    symbols = [f'S{i}' for i in range(8)]
+    news_sign = np.where(np.arange(8) % 2 == 0, 1.0, -1.0)
+    confident = np.arange(8) < 4
+    trend = np.where(confident, news_sign, -news_sign) * 0.01
+
+    closes = 100 * np.exp(np.cumsum(trend + rng.normal(0, 0.004, (len(dates), 8)), axis=0))
+    opens = np.vstack([closes[:1], closes[:-1]]) * (1 + rng.normal(0, 0.001, closes.shape))
+    for i, day in enumerate(dates.strftime('%Y-%m-%d')):
+        os.makedirs(f'data/lake/ohlcv/{day}')
+        pd.DataFrame({'date': day, 'symbol': symbols, 'open': opens[i], 'high': np.maximum(opens[i], closes[i]),
+                      'low': np.minimum(opens[i], closes[i]), 'close': closes[i], 'volume': 1000}).to_parquet(
+            f'data/lake/ohlcv/{day}/bars.parquet', index=False)
+    register_ohlcv_view()
+
+    os.makedirs('data/lake/features/daily')
+    n = len(dates) * len(symbols)
+    pd.DataFrame({
+        'date': np.repeat(dates.values, len(symbols)),
+        'symbol': np.tile(symbols, len(dates)),
+        'r20': 0.0,
+        'rsi14': 50.0,
+        'news_sent': np.tile(news_sign * 0.8, len(dates)),
+        'news_conf': np.tile(np.where(confident, 0.9, 0.2), len(dates)) + rng.normal(0, 0.02, n),
+    }).to_parquet('data/lake/features/daily/features_daily.parquet', index=False)
+    return tmp_path
+
+def test_triple_barrier_labels():
+    # Quiet alternating closes give a volatility estimate, then S0 jumps 10% and S1 drops 10%
+    closes = np.tile(100 * (1 + 0.001 * (-1) ** np.arange(30))[:, None], (1, 2))
+    closes[23:, 0] *= 1.10
+    closes[23:, 1] *= 0.90
+    opens = closes.copy()
+    side = np.ones_like(closes)
+    side[:, 1] = -1
+
+    labels = triple_barrier_labels(opens, closes, side, horizon=5)
+    # Entered at the day-21 open; the jump on day 23 is inside the horizon
+    assert labels[20, 0] == 1.0 and labels[20, 1] == 1.0
+    assert np.isnan(labels[:10]).all()            # no volatility estimate yet
+    assert np.isnan(labels[-5:]).all()            # horizon runs past the data
+    labels_short = triple_barrier_labels(opens, closes, -side, horizon=5)
+    assert labels_short[20, 0] == 0.0 and labels_short[20, 1] == 0.0
+
+def test_train_is_versioned_cached_and_used_for_conf(lake):
+    model = train_meta_model(horizon=5, holdout=0.25)
+    assert model.metrics['holdout_auc'] > 0.9
+    # The holdout only scores the metrics; the saved model is fit on every labeled row
+    assert model.metrics['holdout_rows'] > 0
+    assert model.metrics['train_rows'] == len(build_meta_labels(pd.read_parquet('data/lake/features/daily'), horizon=5))
+    assert load_meta_model() is model
+    versions = [name for name in os.listdir(META_MODEL_DIR) if not name.startswith('.') and name != 'LATEST']
+    assert versions == [model.version]
+
+    # Same rows and params: the stored version is reused, not refit
+    assert train_meta_model(horizon=5, holdout=0.25).version == model.version
+    assert len(os.listdir(META_MODEL_DIR)) == 2
+    # Different labeling params make a new version
+    other = train_meta_model(horizon=3, holdout=0.25)
+    assert other.version != model.version
+    assert load_meta_model().version == other.version
+
+    df = aggregate_signals()
+    assert (df['meta_version'] == other.version).all()
+    conf = df.groupby('symbol')['conf'].mean()
+    assert conf[['S0', 'S1', 'S2', 'S3']].min() > conf[['S4', 'S5', 'S6', 'S7']].max()
+
+    # Training rows carry their out-of-fold score; later rows the final model's
+    assert other.metrics['oof_auc'] > 0.9
+    df = df.assign(date=pd.to_datetime(df['date'])).set_index(['date', 'symbol'])
+    oof = load_meta_model().oof_scores.set_index(['date', 'symbol'])['conf']
+    np.testing.assert_allclose(df.loc[oof.index, 'conf'], oof)
+    features = pd.read_parquet('data/lake/features/daily')
+    later = features[features['date'] > pd.Timestamp(other.metrics['trained_through'])]
+    later = later.assign(alpha=compute_alpha(later)).set_index(['date', 'symbol'])
+    assert len(later)
+    np.testing.assert_allclose(df.loc[later.index, 'conf'], other.score(later.reset_index()))
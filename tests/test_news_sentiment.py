@@ -0,0 +1,50 @@
+import os
+import sys
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from features.news_sentiment import calculate_news_features, write_news_sentiment
+
+@pytest.fixture
+def lake(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # Thu 2023-05-04, Fri 2023-05-05, Mon 2023-05-08
+    for day in ['2023-05-04', '2023-05-05', '2023-05-08']:
+        os.makedirs(f'data/lake/ohlcv/{day}')
+        pd.DataFrame({'date': [day], 'symbol': ['AAPL'], 'close': [100.0]}).to_parquet(f'data/lake/ohlcv/{day}/AAPL.parquet', index=False)
+    return tmp_path
+
+def test_news_is_assigned_to_sessions_by_close_cutoff(lake):
+    df_sentiment = pd.DataFrame({
+        # 10:00 and 15:00 New York time on Thursday
+        'ts': ['2023-05-04T14:00:00Z', '2023-05-04T19:00:00Z',
+               # Thursday 17:30 New York, after the close
+               '2023-05-04T21:30:00Z',
+               # Saturday
+               '2023-05-06T15:00:00Z'],
+        'symbol': 'AAPL',
+        'news_sent': [1.0, -1.0, 0.5, -0.5],
+        'news_conf': [0.75, 0.25, 1.0, 1.0],
+    })
+    assert write_news_sentiment(df_sentiment) == 4
+    # Rewriting the same days replaces their partitions instead of duplicating rows
+    write_news_sentiment(df_sentiment)
+
+    df = calculate_news_features(decay_sessions=2, half_life=1.0).set_index('date')
+    thursday, friday, monday = pd.to_datetime(['2023-05-04', '2023-05-05', '2023-05-08'])
+
+    assert df.loc[thursday, 'news_count'] == 2
+    assert df.loc[thursday, 'news_sent'] == pytest.approx((0.75 - 0.25) / 1.0)
+    assert df.loc[thursday, 'news_conf'] == pytest.approx(0.5)
+    # After-close Thursday news rolls to Friday, weekend news to Monday
+    assert df.loc[friday, 'news_count'] == 1 and df.loc[friday, 'news_sent'] == pytest.approx(0.5)
+    assert df.loc[monday, 'news_count'] == 1 and df.loc[monday, 'news_sent'] == pytest.approx(-0.5)
+    # Two-session window with weights 1, 0.5: Monday blends Monday (-0.5, conf 1) with Friday (0.5, conf 1)
+    assert df.loc[monday, 'news_sent_decay'] == pytest.approx((-0.5 + 0.5 * 0.5) / (1 + 0.5))
+
+def test_news_features_without_sentiment_are_empty(lake):
+    df = calculate_news_features()
+    assert df.empty
+    assert {'news_sent', 'news_conf', 'news_count', 'news_sent_decay'} <= set(df.columns)
@@ -0,0 +1,100 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from gymnasium.utils.env_checker import check_env
+from stable_baselines3 import PPO
+from stable_baselines3.common.vec_env import SubprocVecEnv
+from rl.portfolio_env import BatchedPortfolioEnv, PortfolioData, PortfolioEnv, action_to_weights, make_env
+
+def _random_data(n_dates=60, n_symbols=4, seed=0):
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (n_dates, n_symbols)), axis=0))
+    opens = closes * np.exp(rng.normal(0, 0.005, (n_dates, n_symbols)))
+    # A symbol that only starts trading halfway through
+    opens[:n_dates // 2, -1] = closes[:n_dates // 2, -1] = np.nan
+    features = rng.normal(size=(n_dates, n_symbols, 2))
+    return PortfolioData(pd.bdate_range('2024-01-01', periods=n_dates), [f'S{i}' for i in range(n_symbols)],
+                         opens, closes, features, ['r20', 'rsi14'])
+
+def test_env_follows_gymnasium_api():
+    check_env(PortfolioEnv(_random_data(), episode_length=20), skip_render_check=True)
+
+def test_eval_features_use_the_training_scaler():
+    rng = np.random.default_rng(0)
+    prices = np.full((10, 1), 100.0)
+    train = PortfolioData(pd.bdate_range('2024-01-01', periods=10), ['AAA'], prices, prices,
+                          rng.normal(0, 1, (10, 1, 1)), ['r20'])
+    # A regime shift in the evaluation range must show up in the observations, not be scaled away
+    eval_features = rng.normal(5, 1, (10, 1, 1))
+    evaluation = PortfolioData(pd.bdate_range('2024-01-15', periods=10), ['AAA'], prices, prices, eval_features,
+                               ['r20'], feature_scaler=train.feature_scaler)
+    mean, std = train.feature_scaler
+    np.testing.assert_allclose(evaluation.features, ((eval_features - mean) / std).astype(np.float32), rtol=1e-6)
+    assert evaluation.features.mean() > 3
+
+def test_step_charges_commission_on_traded_notional():
+    data = PortfolioData(pd.bdate_range('2024-01-01', periods=3), ['AAA'],
+                         opens=[[100.0], [110.0], [110.0]], closes=[[100.0], [121.0], [121.0]],
+                         features=np.zeros((3, 1, 1)), feature_columns=['r20'])
+    env = PortfolioEnv(data, episode_length=None, commission=0.001, max_weight=0.5)
+    obs, _ = env.reset(seed=0)
+    assert obs.shape == (1, 2)
+
+    # Buy 50% at the 110 open, which closes at 121 (+10% on the session)
+    obs, reward, terminated, truncated, info = env.step(np.array([1.0], dtype=np.float32))
+    assert info['turnover'] == pytest.approx(0.5)
+    assert info['equity'] == pytest.approx((1 - 0.001 * 0.5) * (1 + 0.5 * 0.1))
+    assert reward == pytest.approx(np.log(info['equity']))
+    # The position grew to 0.55 of 1.05 of the book
+    assert obs[0, -1] == pytest.approx(0.55 / 1.05)
+    assert not terminated and not truncated
+
+def test_action_to_weights_matches_target_weight_limits():
+    weights = action_to_weights(np.array([[0.9, 0.9, -0.5, 0.0], [0.02, 0.01, 0.0, 0.0]]), gross_limit=1.0, max_weight=0.4)
+    np.testing.assert_allclose(weights, [[0.4, 0.4, 0.0, 0.0], [0.02, 0.01, 0.0, 0.0]])
+    shorts = action_to_weights(np.array([[1.0, -1.0]]), gross_limit=1.0, max_weight=1.0, allow_short=True)
+    np.testing.assert_allclose(shorts, [[0.5, -0.5]])
+
+def test_batched_env_matches_single_env():
+    data = _random_data()
+    actions = np.random.default_rng(1).uniform(-1, 1, (data.n_steps, 3, len(data.symbols))).astype(np.float32)
+    batched = BatchedPortfolioEnv(data, n_envs=3, episode_length=None, seed=0)
+    batched.reset()
+
+    singles = [PortfolioEnv(data, episode_length=None) for _ in range(3)]
+    for env in singles:
+        env.reset(seed=0)
+    for step in range(data.n_steps):
+        obs, rewards, dones, infos = batched.step(actions[step])
+        for i, env in enumerate(singles):
+            single_obs, reward, _, truncated, _ = env.step(actions[step, i])
+            assert rewards[i] == pytest.approx(reward, rel=1e-5)
+            assert dones[i] == truncated
+            if truncated:
+                np.testing.assert_allclose(infos[i]['terminal_observation'], single_obs)
+            else:
+                np.testing.assert_allclose(obs[i], single_obs, rtol=1e-6)
+    # Every episode covered the whole range, so all envs finished together and were reset
+    assert dones.all() and (batched._weights == 0).all()
+
+    # VecEnv helpers reach the batch itself
+    reset_obs = batched.env_method('reset', indices=[0, 2])
+    assert len(reset_obs) == 2 and reset_obs[0].shape == (3, len(data.symbols), 3)
+    assert batched.get_attr('episode_length') == [data.n_steps] * 3
+
+def test_sb3_vec_envs():
+    data = _random_data()
+    subproc = SubprocVecEnv([make_env(data, seed=i, episode_length=10) for i in range(2)], start_method='fork')
+    subproc.reset()
+    obs, rewards, dones, _ = subproc.step(np.ones((2, len(data.symbols)), dtype=np.float32))
+    assert obs.shape == (2, len(data.symbols), 3) and rewards.shape == (2,)
+    subproc.close()
+
+    model = PPO("MlpPolicy", BatchedPortfolioEnv(data, n_envs=4, episode_length=10, seed=0), n_steps=16,
+                batch_size=32, n_epochs=1, seed=0)
+    model.learn(total_timesteps=64)
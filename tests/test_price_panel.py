@@ -0,0 +1,105 @@
+import os
+import pickle
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ingestion.ingest_market import register_ohlcv_view
+from ingestion.price_panel import build_price_panel, load_ohlcv_frames, open_price_panel
+from ingestion.writers import write_partitions
+
+def _write_day(day, closes):
+    os.makedirs(f'data/lake/ohlcv/{day}', exist_ok=True)
+    for symbol, close in closes.items():
+        pd.DataFrame({'date': [day], 'symbol': [symbol], 'open': [close - 1], 'high': [close + 1], 'low': [close - 2],
+                      'close': [close], 'volume': [1000]}).to_parquet(f'data/lake/ohlcv/{day}/{symbol}.parquet', index=False)
+
+@pytest.fixture
+def lake(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_day('2023-01-03', {'AAA': 10.0, 'BBB': 20.0})
+    _write_day('2023-01-04', {'AAA': 11.0, 'BBB': 21.0})
+    return tmp_path
+
+def test_build_and_map_panel(lake):
+    assert build_price_panel()['mode'] == 'rewrite'
+    assert build_price_panel()['mode'] == 'unchanged'
+
+    panel = open_price_panel()
+    assert panel.shape == (2, 2)
+    assert isinstance(panel['close'], np.memmap)
+    close = panel.frame('close', symbols=['BBB', 'ZZZ'])
+    assert close['BBB'].tolist() == [20.0, 21.0]
+    assert close['ZZZ'].isna().all()
+
+    frames = panel.ohlcv_frames(['AAA'], start_date='2023-01-04')
+    assert list(frames['AAA'].columns) == ['Open', 'High', 'Low', 'Close', 'Volume']
+    assert frames['AAA']['Close'].tolist() == [11.0]
+
+    # Pickling maps the same files again instead of copying the arrays
+    clone = pickle.loads(pickle.dumps(panel))
+    assert isinstance(clone['close'], np.memmap)
+    assert np.array_equal(clone['close'], panel['close'])
+
+def test_incremental_append_and_rewrite(lake):
+    build_price_panel()
+    before = open_price_panel()
+
+    # A new trading day over known symbols is appended in place
+    _write_day('2023-01-05', {'AAA': 12.0})
+    summary = build_price_panel()
+    assert summary == {'mode': 'append', 'partitions': 1, 'shape': (3, 2)}
+    panel = open_price_panel()
+    assert panel.manifest['generation'] == before.manifest['generation']
+    assert panel.frame('close')['AAA'].tolist() == [10.0, 11.0, 12.0]
+    assert np.isnan(panel.frame('close')['BBB'].iloc[-1])
+    # The earlier mapping still sees its own two rows
+    assert before.shape == (2, 2) and before['close'][1, 0] == 11.0
+
+    # A new symbol (and a backfilled date) needs a new layout, carrying the old values over
+    _write_day('2023-01-02', {'CCC': 5.0})
+    summary = build_price_panel()
+    assert summary['mode'] == 'rewrite' and summary['partitions'] == 1
+    panel = open_price_panel()
+    assert list(panel.symbols) == ['AAA', 'BBB', 'CCC']
+    df = panel.frame('close')
+    assert df.index[0] == pd.Timestamp('2023-01-02')
+    assert df['AAA'].tolist()[1:] == [10.0, 11.0, 12.0]
+    assert df['CCC'].tolist()[0] == 5.0
+
+    # Rewritten partitions replace their row, including symbols that disappeared from it, in a new
+    # generation: a reader already holding the panel keeps its snapshot
+    before = open_price_panel()
+    os.remove('data/lake/ohlcv/2023-01-04/BBB.parquet')
+    _write_day('2023-01-04', {'AAA': 15.0})
+    assert build_price_panel()['mode'] == 'rewrite'
+    df = open_price_panel().frame('close')
+    assert df.loc['2023-01-04', 'AAA'] == 15.0 and np.isnan(df.loc['2023-01-04', 'BBB'])
+    assert before.frame('close').loc['2023-01-04', 'AAA'] == 11.0
+
+def test_load_ohlcv_frames_prefers_panel(lake):
+    build_price_panel()
+    frames = load_ohlcv_frames(['BBB', 'AAA', 'ZZZ'], '2023-01-01', '2023-01-31')
+    assert list(frames) == ['BBB', 'AAA']
+    assert frames['BBB']['Close'].tolist() == [20.0, 21.0]
+
+def test_stale_panel_falls_back_to_ohlcv_daily(lake):
+    build_price_panel()
+    # Partitions written after the last build (e.g. ingest_market(register=False)) make the panel stale
+    _write_day('2023-01-05', {'AAA': 12.0})
+    assert open_price_panel() is None
+    assert open_price_panel(ohlcv_dir=None).shape == (2, 2)
+
+    register_ohlcv_view()
+    frames = load_ohlcv_frames(['AAA'], '2023-01-01', '2023-01-31')
+    assert frames['AAA']['Close'].tolist() == [10.0, 11.0, 12.0]
+    build_price_panel()
+    assert open_price_panel().shape == (3, 2)
+
+    # Replacing a file inside an existing date through the shared writer is caught by its directory mtime
+    write_partitions(pd.DataFrame({'date': ['2023-01-04'], 'symbol': ['AAA'], 'open': [1.0], 'high': [1.0], 'low': [1.0],
+                                   'close': [1.0], 'volume': [1]}), 'data/lake/ohlcv', 'ohlcv', filename='AAA.parquet')
+    assert open_price_panel() is None
@@ -0,0 +1,66 @@
+import os
+import sys
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ingestion.normalize_text import normalize_text
+from ingestion.security_master import SecurityMaster, encode_symbols, resolve_universe
+
+def test_ids_are_stable_and_map_both_ways(tmp_path):
+    path = str(tmp_path / 'security_master')
+    master = SecurityMaster()
+    assert master.assign(['MSFT', 'AAPL']) == 2
+    assert master.assign(['AAPL', 'TSLA']) == 1
+    master.save(path)
+
+    master = SecurityMaster.load(path)
+    ids = master.ids(['AAPL', 'MSFT', 'TSLA', 'NOPE'])
+    assert ids.dtype == np.int32
+    assert ids.tolist() == [0, 1, 2, -1]
+    assert master.to_symbols([2, 0]).tolist() == ['TSLA', 'AAPL']
+
+def test_membership_is_date_effective():
+    master = SecurityMaster()
+    master.set_membership('index', pd.DataFrame({
+        'symbol': ['AAA', 'BBB', 'CCC'],
+        'start_date': ['2020-01-01', '2020-01-01', '2020-01-03'],
+        'end_date': [None, '2020-01-03', None],
+    }))
+    assert master.members('index', as_of='2020-01-02') == ['AAA', 'BBB']
+    # end_date is the effective date of the removal
+    assert master.members('index', as_of='2020-01-03') == ['AAA', 'CCC']
+    assert master.members_between('index', '2020-01-01', '2020-01-02') == ['AAA', 'BBB']
+
+    mask = master.membership_frame('index', pd.bdate_range('2020-01-01', periods=4), ['BBB', 'CCC', 'ZZZ'])
+    assert mask['BBB'].tolist() == [True, True, False, False]
+    assert mask['CCC'].tolist() == [False, False, True, True]
+    assert not mask['ZZZ'].any()
+
+def test_encoded_symbols_round_trip_through_parquet_and_duckdb(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    df = pd.DataFrame({'date': pd.to_datetime(['2023-01-03'] * 3), 'symbol': ['MSFT', 'AAPL', 'MSFT'], 'r20': [0.1, 0.2, 0.3]})
+    encoded = encode_symbols(df)
+    assert encoded['symbol_id'].dtype == np.int32
+    assert (encoded['symbol'].cat.codes.to_numpy() == encoded['symbol_id'].to_numpy()).all()
+
+    encoded.to_parquet('features.parquet', index=False)
+    rows = duckdb.connect().execute("SELECT symbol, symbol_id FROM 'features.parquet' ORDER BY r20").fetchall()
+    assert rows == [('MSFT', 1), ('AAPL', 0), ('MSFT', 1)]
+
+    # Normalized news carries the same ids
+    os.makedirs('data/lake/news_raw')
+    pd.DataFrame({'ts': pd.to_datetime(['2023-01-03 14:00'], utc=True), 'symbol': ['NVDA'], 'source': ['AP'],
+                  'title': ['Headline'], 'description': ['Summary'], 'url': ['u'], 'content': ['Body']}).to_parquet(
+        'data/lake/news_raw/news_raw.parquet', index=False)
+    normalize_text()
+    rows = duckdb.connect().execute("SELECT symbol, symbol_id FROM 'data/lake/news_norm/news_norm.parquet'").fetchall()
+    assert rows == [('NVDA', 2)]
+
+    # Unloaded universes fall back to the default list
+    assert resolve_universe('sp500', default=['AAPL']) == ['AAPL']
+    with pytest.raises(KeyError):
+        resolve_universe('sp500')
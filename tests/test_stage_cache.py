@@ -0,0 +1,116 @@
+import os
+import sys
+import pandas as pd
+import pytest
+from prefect import flow
+from prefect.testing.utilities import prefect_test_harness
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flows.stage_cache import (StageTimer, cached_stage, count_partition_rows, fingerprint_partitions, make_cache_key_fn,
+                               refresh_if_outputs_missing, stage_cache_key)
+
+@pytest.fixture(scope="module")
+def prefect_harness():
+    with prefect_test_harness():
+        yield
+
+def _write_partition(path, n_rows):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pd.DataFrame({'x': range(n_rows)}).to_parquet(path, index=False)
+
+def test_fingerprint_tracks_partition_changes(tmp_path):
+    pattern = str(tmp_path / 'lake' / '**' / '*.parquet')
+    _write_partition(str(tmp_path / 'lake' / '2023-01-02' / 'AAPL.parquet'), 3)
+    first = fingerprint_partitions([pattern])
+    assert fingerprint_partitions([pattern]) == first
+
+    _write_partition(str(tmp_path / 'lake' / '2023-01-03' / 'AAPL.parquet'), 2)
+    assert fingerprint_partitions([pattern]) != first
+    assert count_partition_rows([pattern]) == 5
+
+    assert stage_cache_key("features", {"a": 1}, [pattern]) != stage_cache_key("features", {"a": 2}, [pattern])
+
+def test_cache_key_fn_skip_if():
+    key_fn = make_cache_key_fn("execution", skip_if=lambda p: p.get("mode") == "paper")
+    assert key_fn(None, {"mode": "backtest"}).startswith("execution-")
+    assert key_fn(None, {"mode": "paper"}) is None
+
+def test_unchanged_stage_is_skipped(tmp_path, prefect_harness):
+    inputs = str(tmp_path / 'in' / '*.parquet')
+    outputs = str(tmp_path / 'out' / '*.parquet')
+    _write_partition(str(tmp_path / 'in' / 'a.parquet'), 4)
+    calls = []
+
+    @cached_stage("toy", input_globs=[inputs], output_globs=[outputs], result_dir=str(tmp_path / 'results'))
+    def toy_stage(scale: int):
+        calls.append(scale)
+        _write_partition(str(tmp_path / 'out' / 'b.parquet'), count_partition_rows([inputs]) * scale)
+        return {"rows": count_partition_rows([outputs])}
+
+    @flow
+    def toy_flow(scale: int = 1):
+        stages = StageTimer(run_id=f"run-{len(calls)}")
+        stages.run("toy", toy_stage, scale=scale)
+        return stages.to_frame()
+
+    first = toy_flow()   # no outputs yet -> runs
+    second = toy_flow()  # same inputs and params -> cache hit
+    _write_partition(str(tmp_path / 'in' / 'c.parquet'), 1)
+    third = toy_flow()   # new input partition -> runs again
+    os.remove(str(tmp_path / 'out' / 'b.parquet'))
+    fourth = toy_flow()  # key matches but the output is gone -> runs again
+
+    assert calls == [1, 1, 1]
+    assert first['cached'].tolist() == [False]
+    assert second['cached'].tolist() == [True]
+    assert second['rows'].tolist() == [4]
+    assert third['rows'].tolist() == [5]
+    assert fourth['cached'].tolist() == [False]
+
+
+def test_mapped_stage_refreshes_when_outputs_are_missing(tmp_path, prefect_harness):
+    outputs = str(tmp_path / 'out' / '*.parquet')
+    calls = []
+
+    @cached_stage("toy_chunk", output_globs=[outputs], result_dir=str(tmp_path / 'results'))
+    def toy_chunk(symbol: str):
+        calls.append(symbol)
+        _write_partition(str(tmp_path / 'out' / f'{symbol}.parquet'), 1)
+
+    @flow
+    def toy_flow():
+        # Mapped calls do not go through StageTimer.run
+        refresh_if_outputs_missing("toy_chunk", toy_chunk).map(['a', 'b'])
+
+    toy_flow()
+    toy_flow()  # outputs present -> both chunks are cache hits
+    for name in ('a', 'b'):
+        os.remove(str(tmp_path / 'out' / f'{name}.parquet'))
+    toy_flow()  # keys match but the outputs are gone -> both chunks run again
+
+    assert sorted(calls) == ['a', 'a', 'b', 'b']
+
+def test_call_that_wrote_nothing_is_not_reused(tmp_path, prefect_harness):
+    outputs = str(tmp_path / 'out')
+    calls = []
+
+    @cached_stage("toy_download", outputs_written=lambda p: os.path.exists(os.path.join(outputs, f"{p['symbol']}.parquet")),
+                  result_dir=str(tmp_path / 'results'))
+    def toy_download(symbol: str):
+        calls.append(symbol)
+        if len(calls) > 1:  # the first download fails into an empty frame and writes nothing
+            _write_partition(os.path.join(outputs, f'{symbol}.parquet'), 1)
+
+    @flow
+    def toy_flow():
+        stages = StageTimer()
+        stages.run("toy_download", toy_download, symbol='a')
+        return stages.to_frame()
+
+    first = toy_flow()
+    second = toy_flow()  # same key, but this call's output was never written -> runs again
+    third = toy_flow()
+
+    assert calls == ['a', 'a']
+    assert [f['cached'].item() for f in (first, second, third)] == [False, False, True]
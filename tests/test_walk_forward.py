@@ -0,0 +1,65 @@
+import os
+import sys
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from eval.walk_forward import make_folds, run_walk_forward, stitch_equity_curves
+
+@pytest.fixture
+def walk_forward_db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data', exist_ok=True)
+
+    rng = np.random.default_rng(7)
+    dates = pd.bdate_range('2022-01-03', periods=60)
+    rows, feature_rows = [], []
+    for symbol in ['AAA', 'BBB', 'CCC']:
+        close = 50 * np.exp(np.cumsum(rng.normal(0.001, 0.01, len(dates))))
+        for d, c in zip(dates, close):
+            rows.append({'date': d.date(), 'symbol': symbol, 'open': c, 'high': c * 1.01, 'low': c * 0.99, 'close': c, 'volume': 1000})
+            feature_rows.append({'date': d.date(), 'symbol': symbol, 'r20': rng.normal(0.5, 0.5), 'news_sent': rng.normal(0.3, 0.5)})
+
+    df_ohlcv, df_features = pd.DataFrame(rows), pd.DataFrame(feature_rows)
+    conn = duckdb.connect('./data/trading.duckdb')
+    conn.execute("CREATE TABLE ohlcv_daily AS SELECT * FROM df_ohlcv")
+    conn.execute("CREATE TABLE features_daily AS SELECT * FROM df_features")
+    conn.close()
+    return dates
+
+def test_make_folds_rolling_and_expanding():
+    dates = pd.bdate_range('2023-01-02', periods=10)
+
+    rolling = make_folds(dates, train_size=4, test_size=2)
+    assert len(rolling) == 3
+    assert rolling[0] == (dates[0], dates[3], dates[4], dates[5])
+    assert rolling[1][0] == dates[2]
+
+    expanding = make_folds(dates, train_size=4, test_size=2, expanding=True)
+    assert all(fold[0] == dates[0] for fold in expanding)
+    assert make_folds(dates, train_size=9, test_size=2) == []
+
+def test_stitch_equity_curves_compounds_returns():
+    first = pd.Series([100.0, 110.0], index=pd.to_datetime(['2023-01-02', '2023-01-03']))
+    second = pd.Series([100.0, 90.0], index=pd.to_datetime(['2023-01-04', '2023-01-05']))
+    stitched = stitch_equity_curves([first, second], initial_value=1000.0)
+    assert stitched.tolist() == pytest.approx([1000.0, 1100.0, 1100.0, 990.0])
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_run_walk_forward_writes_outputs(walk_forward_db, max_workers):
+    oos_equity, fold_metrics = run_walk_forward(
+        symbols=['AAA', 'BBB', 'CCC'], start_date='2022-01-01', end_date='2022-12-31',
+        train_size=30, test_size=10, min_alpha_buy_grid=(0.2, 0.5), max_alpha_sell_grid=(-0.3, -0.5),
+        max_workers=max_workers, max_weight=0.3)
+
+    assert len(fold_metrics) == 3
+    # Long-only: the sell threshold is not searched or reported
+    assert fold_metrics['max_alpha_sell'].isna().all()
+    assert {'min_alpha_buy', 'test_sharpe_ratio', 'test_max_drawdown'} <= set(fold_metrics.columns)
+    assert len(oos_equity) == 30
+    assert oos_equity.index.min() == walk_forward_db[30]
+    assert os.path.exists('data/lake/walk_forward/oos_equity.parquet')
+    assert os.path.exists('data/lake/walk_forward/fold_metrics.parquet')
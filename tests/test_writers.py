@@ -0,0 +1,89 @@
+import os
+import sys
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ingestion.writers import DATASETS, to_table, upsert_parquet, write_parquet, write_partitions
+
+def _bars(dates, symbols, close=1.0):
+    return pd.DataFrame([{'date': d, 'symbol': s, 'open': close, 'high': close, 'low': close, 'close': close, 'volume': 10}
+                         for d in dates for s in symbols])
+
+def test_write_enforces_schema_sorts_and_compresses(tmp_path):
+    path = str(tmp_path / 'ohlcv.parquet')
+    # Date-major like ingestion, with string dates
+    assert write_parquet(_bars(['2024-01-03', '2024-01-02'], ['MSFT', 'AAPL']), path, 'ohlcv', row_group_size=2) == 4
+
+    parquet_file = pq.ParquetFile(path)
+    assert parquet_file.schema_arrow.field('date').type == pa.date32()
+    metadata = parquet_file.metadata
+    assert metadata.num_row_groups == 2
+    column = metadata.row_group(0).column(metadata.schema.names.index('symbol'))
+    assert column.compression == 'ZSTD'
+    assert (column.statistics.min, column.statistics.max) == ('AAPL', 'AAPL')
+    df = pd.read_parquet(path)
+    assert list(df['symbol']) == ['AAPL', 'AAPL', 'MSFT', 'MSFT']
+    assert [str(d) for d in df['date']] == ['2024-01-02', '2024-01-03'] * 2
+    assert os.listdir(tmp_path) == ['ohlcv.parquet']
+
+    with pytest.raises(ValueError, match="missing=\\['volume'\\]"):
+        write_parquet(_bars(['2024-01-04'], ['AAPL']).drop(columns='volume'), path, 'ohlcv')
+    with pytest.raises(ValueError, match="unexpected=\\['vwap'\\]"):
+        write_parquet(_bars(['2024-01-04'], ['AAPL']).assign(vwap=1.0), path, 'ohlcv')
+    # A failed write leaves the previous file in place
+    assert len(pd.read_parquet(path)) == 4
+
+def test_categorical_symbols_sort_by_name():
+    df = pd.DataFrame({'date': '2024-01-02', 'symbol': pd.Categorical(['AAPL', 'ZZZ'], categories=['ZZZ', 'AAPL']),
+                       'alpha': 0.0, 'reason': '', 'side': 'HOLD', 'conf': 0.0, 'meta_version': None, 'symbol_id': [1, 0]})
+    table = to_table(df, 'aggregated_signals', sort_by=['symbol', 'date'])
+    assert table.column('symbol').to_pylist() == ['AAPL', 'ZZZ']
+    assert pa.types.is_dictionary(table.schema.field('symbol').type)
+
+def test_partition_appends_replace_rows_by_key(tmp_path):
+    root = str(tmp_path / 'ohlcv')
+    paths = write_partitions(_bars(['2024-01-02', '2024-01-03'], ['AAPL']), root, 'ohlcv', filename='AAPL.parquet')
+    assert paths == [os.path.join(root, '2024-01-02', 'AAPL.parquet'), os.path.join(root, '2024-01-03', 'AAPL.parquet')]
+
+    # Re-ingesting one day replaces that bar; the other partition is untouched
+    write_partitions(_bars([pd.Timestamp('2024-01-03')], ['AAPL'], close=2.0), root, 'ohlcv', filename='AAPL.parquet')
+    assert pd.read_parquet(paths[1])['close'].tolist() == [2.0]
+    assert pd.read_parquet(paths[0])['close'].tolist() == [1.0]
+
+def test_upsert_reads_older_files_on_the_current_schema(tmp_path):
+    path = str(tmp_path / 'fundamentals.parquet')
+    pd.DataFrame({'symbol': ['AAPL'], 'date': pd.to_datetime(['2023-12-31']), 'revenue': [1.0]}).to_parquet(path)
+    df_new = pd.DataFrame({'symbol': ['AAPL'], 'date': pd.to_datetime(['2024-03-31']), 'filing_date': pd.NaT,
+                           'accepted_at': pd.to_datetime(['2024-05-01 16:05']), 'available_at': pd.to_datetime(['2024-05-01 16:05']),
+                           'revenue': 2.0, 'netIncome': None, 'eps': None, 'totalAssets': None, 'totalLiabilities': None,
+                           'cashFlowFromOperatingActivities': None})
+
+    df = upsert_parquet(df_new, path, 'fundamentals')
+    assert len(df) == 2
+    assert pd.read_parquet(path)['revenue'].tolist() == [1.0, 2.0]
+
+def test_side_tables_go_through_the_lake_writer(tmp_path):
+    from features.news_sentiment import write_news_sentiment
+    from flows.stage_cache import StageTimer
+    from ingestion.security_master import SecurityMaster
+
+    write_news_sentiment(pd.DataFrame({'ts': ['2024-01-02 15:00', '2024-01-02 14:00'], 'symbol': ['MSFT', 'AAPL'],
+                                       'news_sent': [0.5, -0.5], 'news_conf': [0.9, 0.8]}), str(tmp_path / 'news'))
+    timer = StageTimer(run_id='run')
+    timer.records.append({'run_id': 'run', 'stage': 'features', 'started_at': pd.Timestamp.now(tz='UTC'),
+                          'duration_s': 1.5, 'cached': False, 'rows': None})
+    master = SecurityMaster()
+    master.assign(['MSFT', 'AAPL'], first_seen='2024-01-02')
+    master.save(str(tmp_path / 'master'))
+
+    for path, dataset in [(tmp_path / 'news' / '2024-01-02' / 'sentiment.parquet', 'news_sentiment'),
+                          (timer.write(str(tmp_path / 'metrics')), 'pipeline_metrics'),
+                          (tmp_path / 'master' / 'securities.parquet', 'securities')]:
+        meta = pq.ParquetFile(str(path)).metadata
+        assert meta.row_group(0).column(0).compression == 'ZSTD'
+        assert pq.read_schema(str(path)).remove_metadata().equals(DATASETS[dataset]['schema'])
+    assert pd.read_parquet(tmp_path / 'news')['symbol'].tolist() == ['AAPL', 'MSFT']